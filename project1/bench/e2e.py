@@ -0,0 +1,192 @@
+import json
+import os
+import platform
+import resource
+import sys
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
+from time import perf_counter, strftime
+from typing import Callable, Dict, Iterable, List, NamedTuple
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+import schema  # noqa: E402
+from app import App  # noqa: E402
+from db import DbApi  # noqa: E402
+from parser import SqlParserInjector  # noqa: E402
+from sink import NullSink  # noqa: E402
+
+
+class Workload(NamedTuple):
+    """Statements to time one by one, and the number of the rows each of them processes to compute rows/s."""
+
+    name: str
+    statements: Callable[[int, int, str], List[str]]  # scale, ops and the csv file
+    rows: Callable[[int], int]  # per statement, of the scale
+
+
+def range_bounds(scale: int, ops: int, width: int) -> Iterable[int]:
+    """Lower bounds spread over the students, the same for every run."""
+
+    return (i * 7919 % max(scale - width, 1) for i in range(ops))
+
+
+# In order, as each of them runs on what the previous ones have left. Load comes first to fill the students, and drop
+# comes last.
+WORKLOADS = [
+    Workload('load', lambda scale, ops, path: [f"load data from '{path}' into student header"],
+             lambda scale: scale),
+    Workload('insert', lambda scale, ops, path: [
+        f"insert into student values ({scale + i}, 'new{i}', 2000-01-01, {i % schema.NUM_DEPTS})" for i in range(ops)],
+             lambda scale: 1),
+    Workload('point_select', lambda scale, ops, path: [
+        f"select * from student where id = {lower}" for lower in range_bounds(scale, ops, 1)],
+             lambda scale: scale),
+    Workload('range_select', lambda scale, ops, path: [
+        f"select id, name from student where id >= {lower} and id < {lower + 100}"
+        for lower in range_bounds(scale, ops, 100)],
+             lambda scale: scale),
+    Workload('join2', lambda scale, ops, path: [
+        f"select student.name, dept.name from student, dept where student.dept_id = dept.id and student.id >= {lower}"
+        f" and student.id < {lower + 100}" for lower in range_bounds(scale, max(ops // 10, 1), 100)],
+             lambda scale: scale * schema.NUM_DEPTS),
+    Workload('join3', lambda scale, ops, path: [
+        f"select student.name, course.title from student, dept, course where student.dept_id = dept.id and "
+        f"course.dept_id = dept.id and student.id >= {lower} and student.id < {lower + 100}"
+        for lower in range_bounds(scale, max(ops // 100, 1), 100)],
+             lambda scale: scale * schema.NUM_DEPTS * schema.NUM_COURSES),
+    Workload('delete', lambda scale, ops, path: [
+        f"delete from student where id >= {scale * i // 100} and id < {scale * (i + 1) // 100}"
+        for i in range(min(ops, 10))],  # 1% each
+             lambda scale: scale),
+    Workload('drop', lambda scale, ops, path: ["drop table student"], lambda scale: scale),
+]
+
+
+def percentile(latencies: List[float], q: float) -> float:
+    """Nearest-rank percentile of the sorted latencies."""
+
+    return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process so far, which never decreases."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)  # bytes on macOS, KiB on Linux
+
+
+def measure(app: App, workload: Workload, scale: int, ops: int, path: str) -> Dict:
+    statements = workload.statements(scale, ops, path)
+    latencies = []
+    for statement in statements:
+        start = perf_counter()
+        app.run(statement)
+        latencies.append(perf_counter() - start)
+
+    seconds = sum(latencies)
+    latencies.sort()
+    return {
+        'workload': workload.name,
+        'scale': scale,
+        'statements': len(statements),
+        'seconds': seconds,
+        'statements_per_s': len(statements) / seconds if seconds > 0 else 0.0,
+        'rows_per_s': len(statements) * workload.rows(scale) / seconds if seconds > 0 else 0.0,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run(scales: List[int], ops: int, names: List[str], buffer_pool_size: int = 0) -> List[Dict]:
+    """Run the workloads on a fresh database of each scale. Load and drop always run, to prepare and clean up."""
+
+    parser = SqlParserInjector.create(os.path.join(SRC, 'grammar.lark'))
+    results = []
+    for scale in scales:
+        with TemporaryDirectory() as home, open(os.devnull, 'w') as null:
+            db = DbApi(os.path.join(home, 'bench.db'), buffer_pool_size=buffer_pool_size)
+            app = App(db, parser, sink=NullSink())
+            with redirect_stdout(null):
+                for ddl in schema.DDL:
+                    app.run(ddl)
+            schema.populate(db)
+
+            path = os.path.join(home, 'student.csv')
+            schema.write_csv(path, scale)
+
+            for workload in WORKLOADS:
+                if workload.name not in names and workload.name not in ('load', 'drop'):
+                    continue
+
+                with redirect_stdout(null):
+                    result = measure(app, workload, scale, ops, path)
+                if workload.name in names:
+                    results.append(result)
+                    print(f"{result['workload']:<13} scale={scale:<8} {result['statements_per_s']:12.1f} stmt/s "
+                          f"{result['rows_per_s']:14.0f} rows/s  p50={result['p50_ms']:10.2f}ms  "
+                          f"p99={result['p99_ms']:10.2f}ms  rss={result['peak_rss_mb']:.0f}MB", file=sys.stderr)
+
+    return results
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> int:
+    """
+    Print the changes from the baseline of the same workload and scale.
+
+    :return: number of the regressions, which are the drops of the throughput or the rises of p99 over the tolerance
+    """
+
+    base = {(result['workload'], result['scale']): result for result in baseline}
+    num_regressions = 0
+    for result in results:
+        old = base.get((result['workload'], result['scale']))
+        if old is None:
+            continue
+
+        throughput = result['statements_per_s'] / old['statements_per_s'] - 1 if old['statements_per_s'] else 0.0
+        p99 = result['p99_ms'] / old['p99_ms'] - 1 if old['p99_ms'] else 0.0
+        regressed = throughput < -tolerance or p99 > tolerance
+        num_regressions += regressed
+        print(f"{result['workload']:<13} scale={result['scale']:<8} throughput {throughput:+8.1%}  p99 {p99:+8.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+
+    return num_regressions
+
+
+if __name__ == "__main__":
+    arg_parser = ArgumentParser(description='End-to-end workloads of the SQL engine, at each scale.')
+    arg_parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000],
+                            help='numbers of the students, from 1000 up to 1000000 (default: 1000 10000)')
+    arg_parser.add_argument('--ops', type=int, default=100,
+                            help='statements per workload; joins run 1/10 and 1/100 of them (default: 100)')
+    arg_parser.add_argument('--workloads', nargs='+', choices=[workload.name for workload in WORKLOADS],
+                            default=[workload.name for workload in WORKLOADS],
+                            help='workloads to report (default: all)')
+    arg_parser.add_argument('--buffer-pool', type=int, default=0, metavar='MB',
+                            help='memory of the records kept decoded (default: 0, disabled)')
+    arg_parser.add_argument('--output', metavar='FILE', help='write the results as JSON to the file')
+    arg_parser.add_argument('--baseline', metavar='FILE', help='compare with the results saved before')
+    arg_parser.add_argument('--tolerance', type=float, default=0.1,
+                            help='relative change tolerated by the comparison (default: 0.1)')
+    args = arg_parser.parse_args()
+
+    report = {
+        'time': strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'ops': args.ops,
+        'buffer_pool_mb': args.buffer_pool,
+        'results': run(args.scales, args.ops, args.workloads, args.buffer_pool << 20),
+    }
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            exit(1 if compare(report['results'], json.load(file)['results'], args.tolerance) else 0)
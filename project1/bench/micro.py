@@ -0,0 +1,189 @@
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from timeit import Timer
+from typing import Callable, Dict, List
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from app import App  # noqa: E402
+from datatype import Column, CompOp, Record, Row, TableColumn, date  # noqa: E402
+from db import DbApi  # noqa: E402
+from encoder import RecordEncoder  # noqa: E402
+from parser import SqlParserInjector  # noqa: E402
+from util import Bytes  # noqa: E402
+
+GRAMMAR = os.path.join(SRC, 'grammar.lark')
+
+STATEMENTS = {
+    'select': "select student.name, dept.name from student, dept where student.dept_id = dept.id and "
+              "student.id >= 100 and student.id < 200",
+    'insert': "insert into student values (1, 'name1', 2000-01-01, 3)",
+    'create': "create table student (id int not null, name char(16), dob date, dept_id int, primary key (id), "
+              "foreign key (dept_id) references dept (id))",
+}
+
+PREDICATES = {
+    'simple': "id = 5",
+    'complex': "(name > 'name5' and dob < 2010-01-01) or (id > 10 and name < 'name3' and dob > 1990-06-15) or "
+               "(id >= 50 and id < 60 and name != 'name42' and dob != 2000-01-01)",
+}
+
+
+# Columns of the student table, as in schema.py.
+COLUMNS = {col.name: col for col in [Column('id', Column.Type.INT, null=Column.Null.NOT_NULL),
+                                     Column('name', Column.Type.CHAR, 16), Column('dob', Column.Type.DATE),
+                                     Column('dept_id', Column.Type.INT)]}
+
+
+def record() -> Record:
+    return Record.from_dict('student', {'id': 42, 'name': 'name42', 'dob': date(2000, 1, 2), 'dept_id': 3})
+
+
+def predicate(condition: str) -> Callable[[Row], object]:
+    """Closure folded from the where clause compiled by App, as a filter on the student table would evaluate it."""
+
+    parser = SqlParserInjector.create(GRAMMAR)
+    where_clause = next(parser.parse(f"select * from student where {condition}").find_data('where_clause'))
+    with TemporaryDirectory() as home:  # empty database, only to compile the clause
+        condition = App(DbApi(os.path.join(home, 'bench.db')), parser).transform(where_clause)
+    condition.resolve(lambda table_column: (('student', table_column.col_name), COLUMNS[table_column.col_name]))
+    return condition.fold()
+
+
+def benchmarks() -> Dict[str, Callable[[], object]]:
+    """Operation of each benchmark, whose inputs are prepared in advance."""
+
+    encoded = Bytes.from_obj(record())
+    row = Row.from_record(record(), 0)
+    other = Row.from_dict({'id': {'dept': 3}, 'name': {'dept': 'dept3'}})
+    merged = Row.merge(row, other)
+    d1, d2 = date(2000, 1, 2), date(2000, 3, 1)
+    parser = SqlParserInjector.create(GRAMMAR)
+    simple, complex_ = predicate(PREDICATES['simple']), predicate(PREDICATES['complex'])
+    qualified, unqualified = TableColumn('name', 'dept'), TableColumn('dob')
+    encoder, values = RecordEncoder(list(COLUMNS.values())), list(record().values())
+
+    return {
+        'bytes.from_obj': lambda: Bytes.from_obj(row),
+        'bytes.to_obj': lambda: Bytes.to_obj(encoded),
+        'encoder.encode': lambda: encoder.encode(values),
+        'date.lt': lambda: d1 < d2,
+        'date.eq': lambda: d1 == d2,
+        'compop.eval.int': lambda: CompOp.GE.eval(42, 7),
+        'compop.eval.str': lambda: CompOp.EQ.eval('name42', 'name7'),
+        'compop.eval.date': lambda: CompOp.LT.eval(d1, d2),
+        'compop.comparator.int': (lambda ge: lambda: ge(42, 7))(CompOp.GE.comparator(Column.Type.INT, False)),
+        'compop.comparator.date': (lambda lt: lambda: lt(d1, d2))(CompOp.LT.comparator(Column.Type.DATE, True)),
+        'row.from_record': lambda: Row.from_record(record(), 0),
+        'row.merge': lambda: Row.merge(row, other),
+        'row.search.qualified': lambda: merged.search(qualified),
+        'row.search.unqualified': lambda: merged.search(unqualified),
+        'predicate.simple': lambda: simple(row),
+        'predicate.complex': lambda: complex_(row),
+        'parser.create': lambda: SqlParserInjector.create(GRAMMAR),
+        **{f'parser.parse.{name}': (lambda statement: lambda: parser.parse(statement))(statement)
+           for name, statement in STATEMENTS.items()},
+    }
+
+
+def ns_per_op(op: Callable[[], object], repeat: int) -> float:
+    """Best of the repetitions, each of which runs for at least 0.2 seconds."""
+
+    timer = Timer(op)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+def allocs_per_op(op: Callable[[], object], number: int = 1000) -> float:
+    """
+    Memory blocks allocated per operation and kept by its result.
+
+    Results are kept alive and the collector is stopped, so that the count is not hidden by the frees. Temporaries
+    freed within the operation are not counted, which are in the peak bytes instead.
+    """
+
+    results = [None] * number
+    gc.disable()
+    try:
+        before = sys.getallocatedblocks()
+        for i in range(number):
+            results[i] = op()
+        return (sys.getallocatedblocks() - before) / number
+    finally:
+        gc.enable()
+
+
+def peak_bytes_per_op(op: Callable[[], object], number: int = 100) -> float:
+    """Highest memory traced during an operation, including the temporaries, on average."""
+
+    total = 0
+    tracemalloc.start()
+    try:
+        for _ in range(number):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            result = op()  # noqa: F841, kept until the peak is read
+            total += tracemalloc.get_traced_memory()[1] - current
+            del result
+    finally:
+        tracemalloc.stop()
+    return total / number
+
+
+def run(ops: Dict[str, Callable[[], object]], repeat: int) -> List[Dict]:
+    results = []
+    for name, op in ops.items():
+        result = {'benchmark': name, 'ns_per_op': ns_per_op(op, repeat), 'allocs_per_op': allocs_per_op(op),
+                  'peak_bytes_per_op': peak_bytes_per_op(op)}
+        results.append(result)
+        print(f"{name:<24} {result['ns_per_op']:14.1f} ns/op {result['allocs_per_op']:8.1f} allocs/op "
+              f"{result['peak_bytes_per_op']:10.0f} peak B/op", file=sys.stderr)
+
+    return results
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> int:
+    """:return: number of the regressions, which are the rises of ns/op or allocs/op over the tolerance"""
+
+    base = {result['benchmark']: result for result in baseline}
+    num_regressions = 0
+    for result in results:
+        old = base.get(result['benchmark'])
+        if old is None:
+            continue
+
+        time = result['ns_per_op'] / old['ns_per_op'] - 1 if old['ns_per_op'] else 0.0
+        allocs = result['allocs_per_op'] - old['allocs_per_op']
+        regressed = time > tolerance or allocs > 0.5
+        num_regressions += regressed
+        print(f"{result['benchmark']:<24} time {time:+8.1%}  allocs {allocs:+6.1f}"
+              f"{'  REGRESSION' if regressed else ''}")
+
+    return num_regressions
+
+
+if __name__ == "__main__":
+    arg_parser = ArgumentParser(description='Micro-benchmarks of the per-row primitives and the parser.')
+    arg_parser.add_argument('--filter', default='', help='run the benchmarks whose names contain the text')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='best of the repetitions (default: 5)')
+    arg_parser.add_argument('--output', metavar='FILE', help='write the results as JSON to the file')
+    arg_parser.add_argument('--baseline', metavar='FILE', help='compare with the results saved before')
+    arg_parser.add_argument('--tolerance', type=float, default=0.1,
+                            help='relative change of ns/op tolerated by the comparison (default: 0.1)')
+    args = arg_parser.parse_args()
+
+    report = {'results': run({name: op for name, op in benchmarks().items() if args.filter in name}, args.repeat)}
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            exit(1 if compare(report['results'], json.load(file)['results'], args.tolerance) else 0)
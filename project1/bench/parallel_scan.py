@@ -0,0 +1,57 @@
+import os
+import sys
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from app import App  # noqa: E402
+from datatype import Column, Record, date  # noqa: E402
+from db import DbApi  # noqa: E402
+from parser import SqlParserInjector  # noqa: E402
+from sink import NullSink  # noqa: E402
+
+# Full scan with a predicate of many comparisons, which is evaluated for every record.
+QUERY = "select id, name from bench where (name > 'name5' and dob < 2010-01-01) or (id > 10 and name < 'name3' and " \
+        "dob > 1990-06-15) or (score >= 50 and score < 60 and name != 'name42' and dob != 2000-01-01)"
+
+
+def generate(db: DbApi, num_records: int, batch_size: int = 10000):
+    db.create_table('bench', [Column('id', Column.Type.INT), Column('name', Column.Type.CHAR, 16),
+                              Column('dob', Column.Type.DATE), Column('score', Column.Type.INT)], [], [])
+    for start in range(0, num_records, batch_size):
+        db.insert_records('bench', [Record.from_dict('bench', {
+            'id': i, 'name': f'name{i % 100}', 'dob': date(1980 + i % 40, 1 + i % 12, 1 + i % 28), 'score': i % 100,
+        }) for i in range(start, min(start + batch_size, num_records))])
+
+
+if __name__ == "__main__":
+    arg_parser = ArgumentParser(description='Scaling of the parallel scan from 1 to N processes.')
+    arg_parser.add_argument('--records', type=int, default=200000, help='number of the records (default: 200000)')
+    arg_parser.add_argument('--max-workers', type=int, default=os.cpu_count(), help='N (default: number of cores)')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='best of the repetitions (default: 3)')
+    args = arg_parser.parse_args()
+
+    with TemporaryDirectory() as home:
+        db = DbApi(os.path.join(home, 'bench.db'))
+        start = perf_counter()
+        generate(db, args.records)
+        print(f'generated {args.records} records in {perf_counter() - start:.2f}s')
+
+        parser = SqlParserInjector.create(os.path.join(SRC, 'grammar.lark'))
+        baseline = None
+        for workers in range(1, args.max_workers + 1):
+            app = App(db, parser, plan_cache_size=0, sink=NullSink(), parallel_workers=workers)
+            app.PARALLEL_THRESHOLD = 0
+
+            elapsed = float('inf')
+            for _ in range(args.repeat):
+                start = perf_counter()
+                app.run(QUERY)
+                elapsed = min(elapsed, perf_counter() - start)
+
+            baseline = baseline or elapsed
+            print(f'workers={workers:<3} {elapsed:8.3f}s  {args.records / elapsed:12.0f} records/s  '
+                  f'speedup={baseline / elapsed:.2f}x')
@@ -0,0 +1,51 @@
+"""
+Synthetic schema of the benchmarks, and its data.
+
+Foreign keys chain as in test.sql: course and student reference dept, thus student is dropped before dept. Sizes of
+dept and course are fixed, so that joins with them grow linearly with the scale, which is the number of students.
+"""
+
+import csv
+from typing import Iterator, List
+
+from datatype import Record, date
+from db import DbApi
+
+NUM_DEPTS = 10
+NUM_COURSES = 10
+
+DDL = [
+    "create table dept (id int not null, name char(16), primary key (id))",
+    "create table course (id int not null, title char(32), dept_id int, primary key (id), "
+    "foreign key (dept_id) references dept (id))",
+    "create table student (id int not null, name char(16), dob date, dept_id int, primary key (id), "
+    "foreign key (dept_id) references dept (id))",
+]
+
+
+def student(i: int) -> List:
+    """Fields of the i-th student. Names repeat every 1000 students, and dates every 40 years."""
+
+    return [i, f'name{i % 1000}', date(1980 + i % 40, 1 + i % 12, 1 + i % 28), i % NUM_DEPTS]
+
+
+def students(start: int, stop: int) -> Iterator[List]:
+    return (student(i) for i in range(start, stop))
+
+
+def populate(db: DbApi):
+    """Fill the fixed-size tables, whose schema must be created."""
+
+    db.insert_records('dept', [Record.from_dict('dept', {'id': i, 'name': f'dept{i}'}) for i in range(NUM_DEPTS)])
+    db.insert_records('course', [Record.from_dict('course', {'id': i, 'title': f'course{i}', 'dept_id': i % NUM_DEPTS})
+                                 for i in range(NUM_COURSES)])
+
+
+def write_csv(path: str, scale: int):
+    """Write the students to load, with the header."""
+
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['id', 'name', 'dob', 'dept_id'])
+        for fields in students(0, scale):
+            writer.writerow(str(field) for field in fields)
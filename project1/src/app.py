@@ -1,17 +1,47 @@
+import csv
+import os
 from enum import Enum
-from functools import reduce
-from typing import List, Optional, Tuple, Dict, Set, Union, Callable
+from time import perf_counter
+from typing import List, Optional, Tuple, Dict, Union, Callable, Sequence, Iterable
 
-from lark import Transformer, Token
+from lark import Transformer, Token, Tree, Lark
+from lark.exceptions import VisitError
 
-from datatype import date, CompOp, Value, TableColumn, ForeignKey, Key, Column, boolean, Row, Predicate, Record
-from db import DbApi
+from datatype import date, CompOp, Value, TableColumn, ForeignKey, Key, Column, Param, Params, Aggregate
+from db import DbApi, IoStats
+from encoder import RecordEncoder
 from error import *
-from util import Print
+from expression import Condition, Expression, Comparison, IsNull, And, Or, Operand
+from executor import QueryPlan, Scan, NestedLoopJoin, Filter, Project, Delete, Update, Operator, HashAggregate, \
+    CountRecords, Sort, Limit, ParallelScan, ReadCsv, Convert, Encode, BulkInsert, MemoryBudget
+from parser import SqlParserInjector
+from sink import ResultSink, TableSink, SINKS
+from slowlog import SlowLog
+from util import Print, LruCache, Stopwatch
 
 
-def trivial(_: Row) -> boolean:
-    return boolean.true
+Plan = Callable[[], None]
+
+
+class Statement:
+    """
+    Compiled statement.
+
+    Parsing, validation and metadata resolution are done on compile.
+    Executing the statement only binds the values to its placeholders and runs the plan.
+    """
+
+    __slots__ = 'plan', 'params', 'tree', 'catalog_version'
+
+    def __init__(self, plan: Plan, params: Params, tree: Tree, catalog_version: int):
+        self.plan = plan
+        self.params = params
+        self.tree = tree
+        self.catalog_version = catalog_version  # catalog version on compile
+
+    def __call__(self, values: Sequence[Value] = ()):
+        self.params.bind(values)
+        self.plan()
 
 
 class TableElementTag(Enum):
@@ -24,11 +54,210 @@ class TableElementTag(Enum):
 
 # noinspection PyMethodMayBeStatic,PyUnusedLocal
 class App(Transformer):
-    """Interactive SQL application."""
+    """
+    Interactive SQL application.
+
+    Transforming a parse tree compiles it into a plan, which is executed later by the statement.
+    """
+
+    # Default number of statements in the plan cache.
+    PLAN_CACHE_SIZE = 128
+    # Queries starting with these keywords are cached.
+    CACHEABLE = {'SELECT', 'DELETE', 'INSERT', 'UPDATE', 'EXECUTE'}
+    # Literals replaced by placeholders on normalization.
+    LITERALS = {'INT', 'STR', 'DATE'}
+    # Keywords followed by the literal which is not allowed to be a placeholder, thus kept in the normalized query.
+    NOT_PARAMETERIZED = {'OUTFILE'}
+    # Formats of the files to export.
+    EXPORT_FORMATS = {'csv', 'tsv', 'jsonl'}
+    # Buffer size of the file to export.
+    EXPORT_BUFFER_SIZE = 1 << 20
+    # Dialects of the files to load.
+    LOAD_FORMATS = {'csv': csv.excel, 'tsv': csv.excel_tab}
+    # Number of records from which a table is scanned in parallel.
+    PARALLEL_THRESHOLD = 100000
+    # Queries starting with these keywords never modify the database.
+    READ_ONLY = {'SELECT', 'EXPLAIN', 'DESCRIBE', 'DESC', 'SHOW', 'PREPARE', 'EXIT', 'BACKUP'}
+
+    def __init__(self, db: DbApi, parser: Lark = None, plan_cache_size: int = PLAN_CACHE_SIZE,
+                 sink: ResultSink = None, parallel_workers: int = 0, dump_stats: bool = False,
+                 slow_log: Optional[SlowLog] = None, memory_limit: Optional[int] = None):
+        """
+        :param parallel_workers: number of processes scanning a large table of a select, 0 to disable
+        :param dump_stats: print the io of each table after every statement
+        :param slow_log: log of the statements slower than its threshold
+        :param memory_limit: bytes of the rows held by the operators of a statement, unlimited if None
+        """
 
-    def __init__(self, db: DbApi):
         super().__init__()
         self.db = db
+        self.parallel_workers = parallel_workers
+        self.dump_stats = dump_stats
+        self.slow_log = slow_log
+        self.budget = MemoryBudget(memory_limit)  # shared by the operators, thus by the cached plans as well
+        self.parser = parser if parser is not None else SqlParserInjector.create()
+        self.sink = sink if sink is not None else TableSink()  # writer of the select results
+        self.params = Params()  # placeholders of the statement being compiled
+        self.prepared: Dict[str, Statement] = dict()
+        self.plan_cache = LruCache(plan_cache_size)
+        self.plan_cache_version = db.catalog_version  # catalog version of the cached statements
+        self.stopwatch = Stopwatch()  # phases of the last query
+
+    ################################################################################################
+    # Statement API
+    ################################################################################################
+
+    def run(self, query: str):
+        """
+        Parse, compile and execute the query.
+
+        DML statements are cached by the normalized query, so the statements of the same shape skip both parsing and
+        compiling. Read-only queries run concurrently with each other, and the others run exclusively.
+        """
+
+        with self.db.reading() if self.is_read_only(query) else self.db.writing():
+            if not self.dump_stats:
+                self.__run(query)
+                return
+
+            before = self.db.stats()
+            self.__run(query)
+            for table_name, io in self.db.stats().items():
+                io = io - before.get(table_name, IoStats())
+                if io != IoStats():
+                    Print.with_prompt(f'{self.__stats_label(table_name)}: {io}')
+
+    def __run(self, query: str):
+        stopwatch = self.stopwatch = Stopwatch()
+        slow_log = self.slow_log
+        io = self.db.io.copy() if slow_log is not None else None
+        self.budget.reset()
+
+        statement, values = self.__statement(query)
+        stopwatch.lap('plan')
+        statement(values)
+
+        if slow_log is not None:
+            stopwatch.lap('execute')
+            slow_log.record(query, values, stopwatch.phases, statement.plan, self.db.io - io)
+
+    def __statement(self, query: str) -> Tuple[Statement, List[Value]]:
+        """Parse and compile the query, or take the cached statement of the same shape and the literals to bind."""
+
+        normalized = self.normalize(query)
+        if normalized is None:
+            tree = self.parser.parse(query)
+            self.stopwatch.lap('parse')
+            return self.compile(tree), []
+
+        key, values = normalized
+        self.stopwatch.lap('parse')
+        if self.plan_cache_version != self.db.catalog_version:  # catalog has changed, invalidate all
+            self.plan_cache.clear()
+            self.plan_cache_version = self.db.catalog_version
+
+        statement = self.plan_cache.get(key)
+        if statement is None:
+            try:
+                statement = self.compile(self.parser.parse(key))
+            except SqlSyntaxError:  # the literal is not allowed to be a placeholder, do not cache
+                return self.compile(self.parser.parse(query)), []
+
+            self.plan_cache.put(key, statement)
+
+        return statement, values
+
+    def normalize(self, query: str) -> Optional[Tuple[str, List[Value]]]:
+        """
+        Normalize the query by replacing the literals with placeholders.
+
+        :return: normalized query and the literals, or None if the query is not cacheable
+        """
+
+        tokens = list(self.parser.lex(query))
+        if len(tokens) == 0 or tokens[0].type not in self.CACHEABLE:
+            return None
+
+        words, values = [], []
+        for previous, token in zip([None] + tokens, tokens):
+            if previous is not None and previous.type in self.NOT_PARAMETERIZED:
+                words.append(str(token))  # as it is, not even in lowercase
+            elif token.type in self.LITERALS:
+                words.append('?')
+                values.append(getattr(self, token.type)(token))
+            elif token.type == 'PARAM':  # explicit placeholder is never bound by the literal
+                return None
+            else:
+                words.append(token.lower())
+
+        return ' '.join(words), values
+
+    def compile(self, tree: Tree) -> Statement:
+        """
+        Compile the parse tree into a statement.
+
+        :raise SqlSyntaxError, SqlSemanticsError: invalid query
+        """
+
+        if tree.data == 'prepare_query':  # the query to prepare is compiled on its own
+            return self.__compile_prepare_query(tree)
+
+        self.params = Params()
+        try:
+            plan = self.transform(tree)
+        except VisitError as e:
+            # Since every exception raised by Transformer is wrapped with 'VisitError'
+            # so here we unwrap it.
+            raise e.orig_exc
+
+        return Statement(plan, self.params, tree, self.db.catalog_version)
+
+    def prepare(self, name: str, query: Union[str, Tree]):
+        """Compile the query, which may contain placeholders, and register it as a prepared statement."""
+
+        tree = self.parser.parse(query) if isinstance(query, str) else query
+        self.prepared[name] = self.compile(tree)
+
+    def execute(self, name: str, values: Sequence[Value] = ()):
+        """
+        Execute the prepared statement with the values bound to its placeholders.
+
+        :raise NoSuchPreparedStatementError: statement is not prepared
+        :raise ParameterCountError: number of values does not match number of placeholders
+        """
+
+        statement = self.prepared.get(name)
+        if statement is None:
+            raise NoSuchPreparedStatementError(name)
+
+        if statement.catalog_version != self.db.catalog_version:  # catalog has changed, resolve metadata again
+            statement = self.prepared[name] = self.compile(statement.tree)
+
+        statement(values)
+
+    def is_read_only(self, query: str) -> bool:
+        """
+        Whether the query never modifies the database, judged by its leading keywords without parsing.
+
+        Profiling and executing a prepared statement are judged by the statement to run.
+        """
+
+        tokens = iter(self.parser.lex(query))
+        token = next(tokens, None)
+        if token is not None and token.type == 'EXPLAIN':
+            token = next(tokens, None)
+            if token is None or token.type != 'ANALYZE':  # explain table
+                return True
+
+        if token is not None and token.type in ('PROFILE', 'ANALYZE'):
+            token = next(tokens, None)
+
+        if token is not None and token.type == 'EXECUTE':
+            name = next(tokens, None)
+            statement = self.prepared.get(name.lower()) if name is not None else None
+            return statement is None or statement.tree.data == 'select_query'
+
+        return token is None or token.type in self.READ_ONLY
 
     ################################################################################################
     # Tokens
@@ -49,6 +278,9 @@ class App(Transformer):
     def NULL(self, token: Token) -> None:
         return None
 
+    def PARAM(self, token: Token) -> Param:
+        return self.params.new_param()
+
     ################################################################################################
     # Operators
     ################################################################################################
@@ -102,57 +334,52 @@ class App(Transformer):
         return items[0]  # just single comparison operator
 
     ################################################################################################
-    # Where Clause (Returns lambda corresponding to the boolean expression)
+    # Where Clause (Returns the expression tree, which is folded into the predicate on execution)
     ################################################################################################
 
-    def where_clause(self, items: list) -> Predicate:
-        return items[1]  # remove 'WHERE' keyword
+    def where_clause(self, items: list) -> Condition:
+        return Condition(items[1], self.params)  # remove 'WHERE' keyword
 
-    def boolean_expr(self, items: List[Predicate]) -> Predicate:
-        return lambda row: reduce(lambda b, f: b | f(row), items, boolean.false)  # disjunction of boolean terms
+    def boolean_expr(self, items: List[Expression]) -> Expression:
+        return items[0] if len(items) == 1 else Or(items)  # disjunction of boolean terms
 
-    def or_boolean_term(self, items: list) -> Predicate:
+    def or_boolean_term(self, items: list) -> Expression:
         return items[1]  # remove 'OR' keyword
 
-    def boolean_term(self, items: List[Predicate]) -> Predicate:
-        return lambda row: reduce(lambda b, f: b & f(row), items, boolean.true)  # conjunction of boolean factors
+    def boolean_term(self, items: List[Expression]) -> Expression:
+        return items[0] if len(items) == 1 else And(items)  # conjunction of boolean factors
 
-    def and_boolean_factor(self, items: list) -> Predicate:
+    def and_boolean_factor(self, items: list) -> Expression:
         return items[1]  # remove 'AND' keyword
 
-    def boolean_factor(self, items: list) -> Predicate:
+    def boolean_factor(self, items: list) -> Expression:
         negate: bool = items[0] is not None
-        boolean_test: Predicate = items[1]
-        return lambda row: -boolean_test(row) if negate else boolean_test(row)  # (maybe) negate boolean test
+        boolean_test: Expression = items[1]
+        return boolean_test.negate() if negate else boolean_test  # (maybe) push NOT down to the predicates
 
-    def boolean_test(self, items: List[Predicate]) -> Predicate:
+    def boolean_test(self, items: List[Expression]) -> Expression:
         return items[0]  # parenthesized_boolean_expr or predicate
 
-    def parenthesized_boolean_expr(self, items: list) -> Predicate:
+    def parenthesized_boolean_expr(self, items: list) -> Expression:
         return items[1]  # remove parenthesis
 
-    def predicate(self, items: List[Predicate]) -> Predicate:
+    def predicate(self, items: List[Expression]) -> Expression:
         return items[0]  # comparison_predicate or null_predicate
 
-    def comparison_predicate(self, items: list) -> Predicate:
-        operand1: Callable[[Row], Value] = items[0]
-        comp_op: CompOp = items[1]
-        operand2: Callable[[Row], Value] = items[2]
-        return lambda row: comp_op.eval(operand1(row), operand2(row))  # evaluate comparison
+    def comparison_predicate(self, items: list) -> Expression:
+        return Comparison(items[1], items[0], items[2])  # operator and the operands
 
-    def null_predicate(self, items: list) -> Predicate:
-        operand: Callable[[Row], Value] = items[0]
-        require_null: bool = items[2] is None
-        return lambda row: boolean(operand(row) is None) if require_null else boolean(operand(row) is not None)
+    def null_predicate(self, items: list) -> Expression:
+        return IsNull(items[0], items[2] is None)
 
-    def operand(self, items: List[Union[TableColumn, Value]]) -> Callable[[Row], Value]:
-        return lambda row: row.search(items[0]) if isinstance(items[0], TableColumn) else items[0]
+    def operand(self, items: List[Operand]) -> Operand:
+        return items[0]  # table_column or value, which may be a placeholder
 
     ################################################################################################
     # 2.1 Create Table
     ################################################################################################
 
-    def create_table_query(self, items: list):
+    def create_table_query(self, items: list) -> Plan:
         table_name, table_elements = items[2], items[3]
         if table_name in self.db.table_names():
             raise TableExistenceError
@@ -197,10 +424,13 @@ class App(Transformer):
 
         self.__verify_create_table_query(table_name, col_name_idx, cols, pk, fks, ref_pks)
 
-        # Ok, we are good.
-        self.db.create_table(table_name, cols, pk, fks)
+        def plan():
+            # Ok, we are good.
+            self.db.create_table(table_name, cols, pk, fks)
+
+            Print.with_prompt(f"'{table_name}' table is created")
 
-        Print.with_prompt(f"'{table_name}' table is created")
+        return plan
 
     def __verify_create_table_query(self, table_name: str, col_name_idx: Dict[str, int], cols: List[Column],
                                     pk: Key, fks: List[ForeignKey], ref_pks: List[Key]):
@@ -284,7 +514,7 @@ class App(Transformer):
     # 2.2 Drop Table
     ################################################################################################
 
-    def drop_table_query(self, items: List[str]):
+    def drop_table_query(self, items: List[str]) -> Plan:
         table_name = items[2]
 
         ref_cnt = self.db.ref_cnt(table_name)
@@ -293,212 +523,405 @@ class App(Transformer):
         elif ref_cnt != 0:  # ref cnt check
             raise DropReferencedTableError(table_name)
 
-        # Ok, we are good.
-        self.db.drop_table(table_name)
+        def plan():
+            # Ok, we are good.
+            self.db.drop_table(table_name)
 
-        Print.with_prompt(f"'{table_name}' table is dropped")
+            Print.with_prompt(f"'{table_name}' table is dropped")
+
+        return plan
 
     ################################################################################################
     # 2.3 Explain / Describe / Desc
     ################################################################################################
 
-    @Print.Line()
-    def explain_query(self, items: List[str]):
+    def explain_query(self, items: List[str]) -> Plan:
         table_name = items[1]
 
         cols = self.db.cols(table_name)
         if cols is None:  # table existence check
             raise NoSuchTableError
 
-        # Ok, we are good.
-        print('table_name', f'[{table_name}]')
-        Print.with_padding('column_name', 'type', 'null', 'key')
+        @Print.Line()
+        def plan():
+            # Ok, we are good.
+            print('table_name', f'[{table_name}]')
+            Print.with_padding('column_name', 'type', 'null', 'key')
+
+            for col in cols:
+                data_type = col.type.value
+                if data_type is Column.Type.CHAR:
+                    data_type = f"char({col.length})"
 
-        for col in cols:
-            data_type = col.type.value
-            if data_type is Column.Type.CHAR:
-                data_type = f"char({col.length})"
+                Print.with_padding(col.name, data_type, col.null.value, col.key.value)
 
-            Print.with_padding(col.name, data_type, col.null.value, col.key.value)
+        return plan
 
-    def describe_query(self, items: List[str]):
-        self.explain_query(items)  # identical to explain
+    def describe_query(self, items: List[str]) -> Plan:
+        return self.explain_query(items)  # identical to explain
 
-    def desc_query(self, items: List[str]):
-        self.explain_query(items)  # identical to explain
+    def desc_query(self, items: List[str]) -> Plan:
+        return self.explain_query(items)  # identical to explain
 
     ################################################################################################
     # 2.4 Insert
     ################################################################################################
 
-    def insert_query(self, items: list):
+    def insert_query(self, items: list) -> Plan:
         table_name: str = items[2]
         target_col_names: List[str] = items[3]
         values = items[5]
 
-        col_name_idx = self.db.col_name_idx(table_name)
+        encoder = self.__encoder(table_name, target_col_names)
+        params = self.params
+
+        def plan():
+            # Validate and encode the record to insert, by the checks compiled for the columns.
+            encoded = encoder.encode([params.resolve(value) for value in values])
+
+            # Ok, we are good.
+            self.db.insert_encoded(table_name, encoded)
+
+            Print.with_prompt('The row is inserted')
+
+        return plan
+
+    def insert_select_query(self, items: list) -> QueryPlan:
+        table_name: str = items[2]
+        target_col_names: Optional[List[str]] = items[3]
+        table_names: List[str] = items[7]
+
+        encoder = self.__encoder(table_name, target_col_names)
+        # Not in parallel, as the workers would wait for the writing block to end, which waits for them.
+        root, selected_columns = self.__select(items[4:], parallel=False)
+
+        # Verify the selected columns match the target columns, once for all rows.
         cols = self.db.cols(table_name)
-        if cols is None:  # table existence check
-            raise NoSuchTableError
+        if target_col_names is not None:
+            col_name_idx = self.db.col_name_idx(table_name)
+            cols = [cols[col_name_idx[col_name]] for col_name in target_col_names]
+        if len(cols) != len(selected_columns):
+            raise InsertTypeMismatchError
+        for col, selected in zip(cols, selected_columns):
+            if self.__selected_type(table_names, selected) is not col.type:
+                raise InsertTypeMismatchError
 
-        # Identify target columns and null columns.
-        if target_col_names is None:
-            null_col_names = set()
-            target_col_names = [col.name for col in cols]
-        else:
-            null_col_names = set(col.name for col in cols)
+        def output(rows):
+            for num_inserted in rows:
+                Print.with_prompt(f'{num_inserted} row(s) are inserted')
+                return num_inserted
 
-            for col_name in target_col_names:
-                if col_name not in null_col_names:
-                    raise InsertColumnExistenceError(col_name)
+        # Rows are validated and encoded as they are selected, and inserted in batches.
+        return QueryPlan(BulkInsert(Encode(root, encoder.encode), self.db, table_name), output)
 
-                null_col_names.remove(col_name)
+    def __selected_type(self, table_names: List[str], selected: Union[TableColumn, Aggregate]) -> Optional[Column.Type]:
+        """
+        Type of the values of the selected column, or None if they are of no column type.
 
-        # Create record to insert.
-        record = self.__create_record(table_name, col_name_idx, cols, target_col_names, null_col_names, values)
+        :raise SelectColumnResolveError: no such column, or ambiguous reference
+        """
 
-        # Ok, we are good.
-        self.db.insert_record(record)
+        if isinstance(selected, Aggregate):
+            if selected.function is Aggregate.Function.COUNT:
+                return Column.Type.INT
+            elif selected.function is Aggregate.Function.AVG:  # float
+                return None
+            selected = selected.table_column
 
-        Print.with_prompt('The row is inserted')
+        return self.__resolve_column(table_names, selected)[1].type
 
-    def __create_record(self, table_name: str, col_name_idx: Dict[str, int], cols: List[Column],
-                        target_col_names: List[str], null_col_names: Set[str], values: List[Value]) -> Record:
-        record = Record(table_name)
+    def __encoder(self, table_name: str, target_col_names: Optional[List[str]]) -> RecordEncoder:
+        """
+        Encoder of the records given the values of the columns, all if None. It is cached along with the catalog.
 
-        # Verify number of values matches target columns.
-        if len(target_col_names) != len(values):
-            raise InsertTypeMismatchError
+        :raise NoSuchTableError: no such table
+        :raise InsertColumnExistenceError: no such column
+        """
 
-        # Verify value types and then add to the record.
-        for col_name, value in zip(target_col_names, values):
-            target_col = cols[col_name_idx[col_name]]
-
-            if value is None:
-                if target_col.null is Column.Null.NOT_NULL:
-                    raise InsertColumnNonNullableError(col_name)
-            elif target_col.type is Column.Type.INT:
-                if not isinstance(value, int):
-                    raise InsertTypeMismatchError
-            elif target_col.type is Column.Type.DATE:
-                if not isinstance(value, date):
-                    raise InsertTypeMismatchError
-            else:
-                if not isinstance(value, str):
-                    raise InsertTypeMismatchError
+        cols = self.db.cols(table_name)
+        if cols is None:  # table existence check
+            raise NoSuchTableError
 
-                # Truncate if string is longer that max size.
-                length = target_col.length
-                if len(value) > length:
-                    value = value[:length]
+        kind = ('encoder', tuple(target_col_names) if target_col_names is not None else None)
+        return self.db.derived(kind, table_name, lambda: RecordEncoder(cols, target_col_names))
 
-            record[col_name] = value
+    def __verify_value(self, col: Column, value: Value) -> Value:
+        """
+        Verify the value fits the column.
 
-        # Verify null columns are nullable and add to the record.
-        for col_name in null_col_names:
-            if cols[col_name_idx[col_name]].null is Column.Null.NOT_NULL:
-                raise InsertColumnNonNullableError(col_name)
+        :return: the value, truncated if it is longer than the char column
+        :raise InsertColumnNonNullableError: null for the not null column
+        :raise InsertTypeMismatchError: types are not matched
+        """
 
-            record[col_name] = None
+        if value is None:
+            if col.null is Column.Null.NOT_NULL:
+                raise InsertColumnNonNullableError(col.name)
+        elif col.type is Column.Type.INT:
+            if not isinstance(value, int):
+                raise InsertTypeMismatchError
+        elif col.type is Column.Type.DATE:
+            if not isinstance(value, date):
+                raise InsertTypeMismatchError
+        else:
+            if not isinstance(value, str):
+                raise InsertTypeMismatchError
 
-        return record
+            # Truncate if string is longer that max size.
+            length = col.length
+            if len(value) > length:
+                value = value[:length]
+
+        return value
 
     ################################################################################################
     # 2.5 Delete
     ################################################################################################
 
-    def delete_query(self, items: list):
+    def delete_query(self, items: list) -> QueryPlan:
         table_name: str = items[2]
-        predicate: Predicate = items[3]
-        if predicate is None:  # default where predicate is true
-            predicate = trivial
+        predicate: Optional[Condition] = items[3]
 
-        # Retrieve records from database.
-        records = self.db.select_all_records(table_name)
-        if records is None:  # table existence check
+        if self.db.cols(table_name) is None:  # table existence check
             raise NoSuchTableError
 
+        # Retrieve records from database.
+        root: Operator = Scan(self.db, table_name)
+
         # Where clause - filter records
-        filtered_rows = filter(lambda record: predicate(Row.from_record(record[1])), records)
-        idx_to_delete = [idx for idx, _ in filtered_rows]
+        if predicate is not None:
+            self.__resolve_condition(predicate, [table_name])
+            root = Filter(root, predicate)
 
-        # Ok, we are good.
-        self.db.delete_records(table_name, idx_to_delete)
+        def output(rows):
+            for num_deleted in rows:
+                Print.with_prompt(f'{num_deleted} row(s) are deleted')
+                return num_deleted
 
-        Print.with_prompt(f'{len(idx_to_delete)} row(s) are deleted')
+        return QueryPlan(Delete(root, self.db, table_name), output)
 
     ################################################################################################
     # 2.6 Select
     ################################################################################################
 
-    def select_query(self, items: list):
-        selected_columns: List[TableColumn] = items[1]
-        table_names: List[str] = items[3]
-        predicate: Predicate = items[4]
-        if predicate is None:  # default where predicate is true
-            predicate = trivial
+    def select_query(self, items: list) -> QueryPlan:
+        outfile: Optional[Tuple[str, Optional[str]]] = items[8]
+        root, selected_columns = self.__select(items)
+        col_names = [str(table_column) for table_column in selected_columns]
+
+        # Into outfile clause - export the rows to the file instead
+        if outfile is not None:
+            return QueryPlan(root, self.__export(col_names, *outfile))
 
-        # From clause - join tables
-        rows = self.__join(table_names)
+        def output(rows):
+            # Rows are written as they are produced.
+            return self.sink.write(col_names, rows)
 
-        # Where clause - filter rows
-        rows = filter(predicate, rows)
+        return QueryPlan(root, output)
 
-        # Select clause - select columns
-        num_cols = len(selected_columns)
-        if num_cols == 0:  # wildcard
+    def __select(self, items: list, parallel: bool = True) -> Tuple[Operator, List[Union[TableColumn, Aggregate]]]:
+        """
+        Compile the clauses of the select into the operator tree.
+
+        :param items: from the select keyword up to the limit clause
+        :param parallel: scan in the worker processes if enabled, which must be false in a writing block
+        :return: the tree producing the values of the selected columns, and the selected columns
+        """
+
+        selected_columns: List[Union[TableColumn, Aggregate]] = items[1]
+        table_names: List[str] = items[3]
+        predicate: Optional[Condition] = items[4]
+        group_by: Optional[List[TableColumn]] = items[5]
+        order_by: Optional[List[Tuple[Union[TableColumn, Aggregate], bool]]] = items[6]
+        limit: Optional[Tuple[Union[int, Param], Union[int, Param]]] = items[7]
+
+        for table_name in table_names:
+            if self.db.cols(table_name) is None:  # table existence check
+                raise SelectTableExistenceError(table_name)
+
+        if len(selected_columns) == 0:  # wildcard
             selected_columns = self.__transform_wildcard(table_names)
-            num_cols = len(selected_columns)
 
-        rows_values = []
-        for row in rows:
-            row_values = []
-            for table_column in selected_columns:
-                try:
-                    value = row.search(table_column)
-                except (WhereTableNotSpecified, WhereColumnNotExist, WhereAmbiguousReference):
-                    raise SelectColumnResolveError(table_column)
+        if predicate is not None:
+            self.__resolve_condition(predicate, table_names)
+
+        aggregated = group_by is not None or any(isinstance(selected, Aggregate) for selected in selected_columns)
+        count_only = all(isinstance(selected, Aggregate) and selected.function is Aggregate.Function.COUNT and
+                         selected.table_column is None for selected in selected_columns)
+
+        # Order by clause - resolve the sort keys against the selected columns
+        sort_keys, sort_columns = [], []
+        if order_by is not None:
+            sort_keys, sort_columns = self.__sort_keys(table_names, selected_columns, order_by, aggregated)
+
+        if aggregated and count_only and len(table_names) == 1 and predicate is None and group_by is None:
+            # Count(*) of a table - count from the record index
+            root: Operator = CountRecords(self.db, table_names[0], len(selected_columns))
+        elif parallel and self.parallel_workers > 1 and len(table_names) == 1:
+            # From, where and select clause - scan, filter and select columns in parallel if the table is large
+            # Order of the rows does not matter if they are sorted or aggregated.
+            ordered = order_by is None and not aggregated
+            root: Operator = ParallelScan(self.db, table_names[0], predicate,
+                                          None if aggregated else selected_columns + sort_columns,
+                                          self.parallel_workers, self.PARALLEL_THRESHOLD, ordered)
+            if aggregated:
+                root = self.__aggregate(root, table_names, selected_columns, group_by if group_by is not None else [])
+        else:
+            # From clause - join tables
+            root: Operator = Scan(self.db, table_names[0])
+            for table_name in table_names[1:]:
+                root = NestedLoopJoin(root, Scan(self.db, table_name), self.budget)
+
+            # Where clause - filter rows
+            if predicate is not None:
+                root = Filter(root, predicate)
+
+            # Select clause - aggregate or select columns
+            if aggregated:
+                root = self.__aggregate(root, table_names, selected_columns, group_by if group_by is not None else [])
+            else:
+                root = Project(root, selected_columns + sort_columns)
 
-                row_values.append(value)
+        params = self.params
 
-            rows_values.append(row_values)
+        def bounds() -> Tuple[Optional[int], int]:
+            if limit is None:
+                return None, 0
+            return params.resolve(limit[0]), params.resolve(limit[1])
 
-        # Ok, we are good.
-        Print.table_horizontal_line(num_cols)
-        Print.with_padding(*selected_columns, sep='|')
-        Print.table_horizontal_line(num_cols)
+        def top() -> Optional[int]:
+            count, offset = bounds()
+            return None if count is None else count + offset
 
-        for row_values in rows_values:
-            for i in range(num_cols):
-                if row_values[i] is None:  # null
-                    row_values[i] = 'null'
+        if order_by is not None:
+            root = Sort(root, sort_keys, len(selected_columns) if len(sort_columns) != 0 else None, top, self.budget)
 
-            Print.with_padding(*row_values, sep='|')
+        # Limit clause - stop once the rows are produced
+        if limit is not None:
+            root = Limit(root, bounds)
 
-        Print.table_horizontal_line(num_cols)
+        return root, selected_columns
 
-    def __join(self, table_names: List[str]) -> List[Row]:
-        """Join the records from tables recursively."""
+    def __export(self, col_names: List[str], path: str, file_format: Optional[str]) -> Callable[[Iterable], int]:
+        """Output writing the rows to the file in the format, which is guessed by the extension if not given."""
 
-        if len(table_names) == 0:
-            return [Row()]
+        if file_format is None:
+            extension = os.path.splitext(path)[1].lower()[1:]
+            file_format = extension if extension in self.EXPORT_FORMATS else 'csv'
+        if file_format not in self.EXPORT_FORMATS:
+            raise SelectFormatError(file_format)
 
-        table_name = table_names[-1]
+        sink_class = SINKS[file_format]
 
-        records = self.db.select_all_records(table_name)
-        if records is None:  # table existence check
-            raise SelectTableExistenceError(table_name)
+        def output(rows):
+            try:
+                file = open(path, 'w', newline='', buffering=self.EXPORT_BUFFER_SIZE)
+            except OSError:
+                raise SelectFileError(path)
 
-        rows = [Row.from_record(record[1]) for record in records]
-        col_names = [col.name for col in self.db.cols(table_name)]
+            with file:
+                num_rows = sink_class(file).write(col_names, rows)
 
-        ret = []
-        left_rows = self.__join(table_names[:-1])  # recursive call
-        for left_row in left_rows:
-            for row in rows:
-                ret.append(Row.merge(left_row, row))
+            Print.with_prompt(f"{num_rows} row(s) are exported to '{path}'")
+            return num_rows
 
-        return ret
+        return output
+
+    def __aggregate(self, root: Operator, table_names: List[str], selected_columns: List[Union[TableColumn, Aggregate]],
+                    group_by: List[TableColumn]) -> HashAggregate:
+        """Verify the columns are grouped or aggregated, and aggregate the rows."""
+
+        group_by_keys = [self.__resolve_column(table_names, table_column)[0] for table_column in group_by]
+
+        outputs = []
+        for selected in selected_columns:
+            if isinstance(selected, Aggregate):
+                if selected.table_column is not None:
+                    _, col = self.__resolve_column(table_names, selected.table_column)
+                    if selected.function in (Aggregate.Function.SUM, Aggregate.Function.AVG) and \
+                            col.type is not Column.Type.INT:
+                        raise SelectAggregateTypeError(selected)
+
+                outputs.append(selected)
+            else:
+                key, _ = self.__resolve_column(table_names, selected)
+                if key not in group_by_keys:
+                    raise SelectGroupByError(selected)
+
+                outputs.append(group_by_keys.index(key))
+
+        return HashAggregate(root, group_by, outputs, self.budget)
+
+    def __sort_keys(self, table_names: List[str], selected_columns: List[Union[TableColumn, Aggregate]],
+                    order_by: List[Tuple[Union[TableColumn, Aggregate], bool]], aggregated: bool) \
+            -> Tuple[List[Tuple[int, bool]], List[TableColumn]]:
+        """
+        Find the selected column of each sort key. If it is not selected, it is appended to the selected columns
+        only for sorting, which is not possible if the rows are aggregated.
+
+        :return: index of the value and whether it is descending, and the columns appended
+        """
+
+        selected_keys = [str(selected) if isinstance(selected, Aggregate) else
+                         self.__resolve_column(table_names, selected)[0] for selected in selected_columns]
+
+        sort_keys, sort_columns = [], []
+        for item, descending in order_by:
+            if isinstance(item, Aggregate):
+                key = str(item)
+            else:
+                key, _ = self.__resolve_column(table_names, item)
+
+            if key in selected_keys:
+                sort_keys.append((selected_keys.index(key), descending))
+            elif aggregated or isinstance(item, Aggregate):
+                raise SelectOrderByError(item)
+            else:
+                sort_keys.append((len(selected_keys), descending))
+                selected_keys.append(key)
+                sort_columns.append(item)
+
+        return sort_keys, sort_columns
+
+    def __resolve_column(self, table_names: List[str], table_column: TableColumn) -> Tuple[Tuple[str, str], Column]:
+        """
+        Resolve the column against the tables. It is guaranteed that the tables exist.
+
+        :return: (table name, column name) and the column definition
+        :raise SelectColumnResolveError: no such column, or ambiguous reference
+        """
+
+        matches = [((table_name, col.name), col) for table_name in table_names
+                   if table_column.table_name is None or table_column.table_name == table_name
+                   for col in self.db.cols(table_name) if col.name == table_column.col_name]
+        if len(matches) != 1:
+            raise SelectColumnResolveError(table_column)
+
+        return matches[0]
+
+    def __resolve_condition(self, condition: Condition, table_names: List[str]):
+        """
+        Resolve the columns of the where clause against the tables, so that they are compared by their types. Every
+        column is resolved on compile, thus the errors are raised even if the table is empty or the clause is constant.
+
+        :raise WhereTableNotSpecified: table not specified
+        :raise WhereColumnNotExist: no such column
+        :raise WhereAmbiguousReference: more than one column
+        :raise WhereIncomparableError: comparison of the columns of different types
+        """
+
+        def resolve(table_column: TableColumn) -> Tuple[Tuple[str, str], Column]:
+            if table_column.table_name is not None and table_column.table_name not in table_names:
+                raise WhereTableNotSpecified
+
+            try:
+                return self.__resolve_column(table_names, table_column)
+            except SelectColumnResolveError:
+                found = any(table_column.table_name in (None, table_name) and col.name == table_column.col_name
+                            for table_name in table_names for col in self.db.cols(table_name))
+                raise WhereAmbiguousReference if found else WhereColumnNotExist  # found more than one
+
+        condition.resolve(resolve)
 
     def __transform_wildcard(self, table_names: List[str]) -> List[TableColumn]:
         """Retrieve a list of columns of joined table. It is guaranteed that the tables exist."""
@@ -520,21 +943,288 @@ class App(Transformer):
 
         return table_columns
 
-    def select_list(self, items: List[TableColumn]) -> List[TableColumn]:
-        return items  # list of TableColumn, empty iff wildcard
+    def select_list(self, items: List[Union[TableColumn, Aggregate]]) -> List[Union[TableColumn, Aggregate]]:
+        return items  # list of TableColumn or Aggregate, empty iff wildcard
+
+    def aggregate(self, items: list) -> Aggregate:
+        function: Aggregate.Function = items[0]
+        table_column: TableColumn = items[2]
+        return Aggregate(function, table_column)
+
+    def count_star(self, items: List[Token]) -> Aggregate:
+        return Aggregate(Aggregate.Function.COUNT)  # count rows
+
+    def aggregate_function(self, items: List[Token]) -> Aggregate.Function:
+        return Aggregate.Function(items[0].lower())
+
+    def into_outfile(self, items: list) -> Tuple[str, Optional[str]]:
+        return items[2], items[3]  # path and format
+
+    def group_by_clause(self, items: list) -> List[TableColumn]:
+        return items[2:]  # remove 'GROUP BY' keywords
+
+    def order_by_clause(self, items: list) -> List[Tuple[Union[TableColumn, Aggregate], bool]]:
+        return items[2:]  # remove 'ORDER BY' keywords
+
+    def sort_key(self, items: list) -> Tuple[Union[TableColumn, Aggregate], bool]:
+        return items[0], items[1] is not None and items[1].lower() == 'desc'  # ascending by default
+
+    def limit_clause(self, items: list) -> Tuple[Union[int, Param], Union[int, Param]]:
+        return items[1], items[3] if items[3] is not None else 0  # limit and offset
 
     ################################################################################################
     # 2.7 Show Tables
     ################################################################################################
 
-    @Print.Line()
-    def show_tables_query(self, items: List[Token]):
-        for table_name in self.db.table_names():
-            print(table_name)
+    def show_tables_query(self, items: List[Token]) -> Plan:
+        @Print.Line()
+        def plan():
+            for table_name in self.db.table_names():
+                print(table_name)
+
+        return plan
+
+    ################################################################################################
+    # 2.8 Update
+    ################################################################################################
+
+    def update_query(self, items: list) -> QueryPlan:
+        table_name: str = items[1]
+        col_name, value = items[2]
+        predicate: Optional[Condition] = items[3]
+
+        col_name_idx = self.db.col_name_idx(table_name)
+        cols = self.db.cols(table_name)
+        if cols is None:  # table existence check
+            raise NoSuchTableError
+
+        if col_name not in col_name_idx:  # column existence check
+            raise UpdateColumnExistenceError(col_name)
+
+        col = cols[col_name_idx[col_name]]
+        params = self.params
+
+        def resolve_value() -> Value:
+            try:
+                return self.__verify_value(col, params.resolve(value))
+            except InsertTypeMismatchError:
+                raise UpdateTypeMismatchError
+            except InsertColumnNonNullableError:
+                raise UpdateColumnNonNullableError(col_name)
+
+        # Retrieve records from database.
+        root: Operator = Scan(self.db, table_name)
+
+        # Where clause - filter records
+        if predicate is not None:
+            self.__resolve_condition(predicate, [table_name])
+            root = Filter(root, predicate)
+
+        def output(rows):
+            for num_updated in rows:
+                Print.with_prompt(f'{num_updated} row(s) are updated')
+                return num_updated
+
+        return QueryPlan(Update(root, self.db, table_name, col_name, resolve_value), output)
+
+    def set_clause(self, items: list) -> Tuple[str, Union[Param, Value]]:
+        return items[1], items[3]  # column name and value
 
     ################################################################################################
     # 2.9 Exit
     ################################################################################################
 
-    def exit_cmd(self, items: List[Token]):
-        exit(0)  # Exit with status code 0 (OK)
+    def exit_cmd(self, items: List[Token]) -> Plan:
+        def plan():
+            raise SystemExit(0)  # Exit with status code 0 (OK), without the builtin of the site module
+
+        return plan
+
+    ################################################################################################
+    # 2.10 Profile / Explain Analyze
+    ################################################################################################
+
+    def profile_query(self, items: list) -> Plan:
+        query_plan: QueryPlan = items[-1]
+        stopwatch = self.stopwatch
+
+        budget = self.budget
+
+        @Print.Line()
+        def print_profile(phases: Dict[str, float]):
+            for line in query_plan.explain():
+                print(line)
+            print(' '.join(f'{phase}={elapsed * 1000:.3f}ms' for phase, elapsed in phases.items()),
+                  f'peak_memory={budget.peak / 1024:.1f}KiB')
+
+        def plan():
+            tracking, budget.tracking = budget.tracking, True  # estimated only when profiled, unless limited
+            try:
+                total = query_plan.profile(self.db.io)
+            finally:
+                budget.tracking = tracking
+            execute = query_plan.root.stats.time
+
+            print_profile({
+                'parse': stopwatch.phases.get('parse', 0.0),
+                'plan': stopwatch.phases.get('plan', 0.0),
+                'execute': execute,
+                'print': total - execute,
+            })
+
+        return plan
+
+    ################################################################################################
+    # 3.1 Prepare
+    ################################################################################################
+
+    def __compile_prepare_query(self, tree: Tree) -> Statement:
+        name: str = self.transform(tree.children[1])
+        query: Tree = tree.children[3]
+
+        def plan():
+            self.prepare(name, query)
+
+            Print.with_prompt(f"'{name}' statement is prepared")
+
+        return Statement(plan, Params(), tree, self.db.catalog_version)
+
+    def statement_name(self, items: List[str]) -> str:
+        return items[0]  # just identifier
+
+    ################################################################################################
+    # 3.2 Execute
+    ################################################################################################
+
+    def execute_query(self, items: list) -> Plan:
+        name: str = items[1]
+        values: List[Union[Param, Value]] = items[2] if items[2] is not None else []
+        params = self.params
+
+        return lambda: self.execute(name, [params.resolve(value) for value in values])
+
+    ################################################################################################
+    # 3.3 Load Data
+    ################################################################################################
+
+    def load_query(self, items: list) -> QueryPlan:
+        path: str = items[3]
+        table_name: str = items[5]
+        file_format: Optional[str] = items[6]
+        header = items[7] is not None
+        reject_limit: int = items[8] if items[8] is not None else 0
+
+        encoder = self.__encoder(table_name, None)
+        cols = self.db.cols(table_name)
+
+        if file_format is None:  # by extension
+            file_format = 'tsv' if path.lower().endswith('.tsv') else 'csv'
+        if file_format not in self.LOAD_FORMATS:
+            raise LoadFormatError(file_format)
+
+        def convert(fields: List[str]) -> bytes:
+            if len(fields) != len(cols):
+                raise InsertTypeMismatchError
+            return encoder.encode([self.__parse_field(col, field) for col, field in zip(cols, fields)])
+
+        def on_reject(row_number: int, e: SqlSemanticsError):
+            Print.with_prompt(f'Row {row_number} is rejected: {e}')
+
+        converted = Convert(ReadCsv(path, self.LOAD_FORMATS[file_format], header), convert, reject_limit, on_reject)
+
+        def output(rows):
+            start = perf_counter()
+            for num_loaded in rows:
+                elapsed = perf_counter() - start
+                throughput = num_loaded / elapsed if elapsed > 0 else 0.0
+                Print.with_prompt(f'{num_loaded} row(s) are loaded, {converted.num_rejected} rejected in '
+                                  f'{elapsed:.3f}s ({throughput:.1f} rows/s)')
+                return num_loaded
+
+        return QueryPlan(BulkInsert(converted, self.db, table_name), output)
+
+    @staticmethod
+    def __parse_field(col: Column, field: str) -> Value:
+        """
+        Parse the field of the file as the value of the column. Empty field is null.
+
+        :raise InsertTypeMismatchError: the field is not a value of the type
+        """
+
+        if field == '':
+            return None
+
+        try:
+            if col.type is Column.Type.INT:
+                return int(field)
+            elif col.type is Column.Type.DATE:
+                return date.fromisoformat(field.strip())
+            else:
+                return field
+        except (ValueError, SqlSyntaxError):
+            raise InsertTypeMismatchError
+
+    def file_format(self, items: List[str]) -> str:
+        return items[1]  # remove 'FORMAT' keyword
+
+    def reject_limit(self, items: list) -> int:
+        return items[2]  # remove 'REJECT LIMIT' keywords
+
+    ################################################################################################
+    # 3.4 Backup
+    ################################################################################################
+
+    def backup_query(self, items: list) -> Plan:
+        path: str = items[2]
+        incremental = items[3] is not None
+
+        if os.path.exists(path) and os.path.samefile(path, self.db.filename):
+            raise BackupFileError(path)
+
+        def plan():
+            # Backup runs in a reading block, thus readers keep running while writers of every process wait.
+            start = perf_counter()
+            try:
+                num_written, num_deleted = self.db.backup(path, incremental)
+            except OSError:
+                raise BackupFileError(path)
+            elapsed = perf_counter() - start
+
+            Print.with_prompt(f"Backup to '{path}' is done: {num_written} key(s) are written, {num_deleted} deleted in "
+                              f"{elapsed:.3f}s")
+
+        return plan
+
+    ################################################################################################
+    # 3.5 Show Stats / Reset Stats
+    ################################################################################################
+
+    STATS_COLUMNS = ['table', 'gets', 'puts', 'deletes', 'bytes_read', 'bytes_written', 'decode_ms']
+
+    def show_stats_query(self, items: List[Token]) -> Plan:
+        def plan():
+            stats = self.db.stats()
+            table_names = sorted(table_name for table_name in stats if table_name is not None)
+            if None in stats:
+                table_names.append(None)
+
+            rows = [self.__stats_row(table_name, stats[table_name]) for table_name in table_names]
+            rows.append(self.__stats_row('(total)', self.db.io))
+            self.sink.write(self.STATS_COLUMNS, rows)
+
+        return plan
+
+    def reset_stats_query(self, items: List[Token]) -> Plan:
+        def plan():
+            self.db.reset_stats()
+            Print.with_prompt('Stats are reset')
+
+        return plan
+
+    def __stats_row(self, table_name: Optional[str], io: IoStats) -> List[Value]:
+        return [self.__stats_label(table_name), io.gets, io.puts, io.deletes, io.bytes_read, io.bytes_written,
+                round(io.decode_time * 1000, 3)]
+
+    @staticmethod
+    def __stats_label(table_name: Optional[str]) -> str:
+        return table_name if table_name is not None else '(global)'
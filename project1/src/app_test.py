@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from app import App
+from db import DbApi
+from db_test import MockDbApi
+from error import WhereColumnNotExist, WhereAmbiguousReference, WhereTableNotSpecified, SelectTableExistenceError
+from sink import CsvSink
+from util import ExpectException
+
+
+class TestApp(TestCase):
+    def setUp(self):
+        self.db = MockDbApi()
+        self.output = StringIO()
+        self.app = App(self.db, sink=CsvSink(self.output))
+        self.execute('create table foo (id int, name char(10))')
+        self.execute('create table bar (id int)')
+        self.execute("insert into foo values (1, 'a')")
+
+    def execute(self, query: str):
+        with redirect_stdout(StringIO()):
+            self.app.run(query)
+
+    def select(self, query: str) -> str:
+        self.output.seek(0)
+        self.output.truncate()
+        self.execute(query)
+        return self.output.getvalue()
+
+    def count_parses(self) -> list:
+        parses, parse = [], self.app.parser.parse
+        self.app.parser.parse = lambda *args, **kwargs: parses.append(args[0]) or parse(*args, **kwargs)
+        return parses
+
+    def test_plan_cache(self):
+        parses = self.count_parses()
+        cache = self.app.plan_cache
+        cache.hits = cache.misses = 0
+        assert '1,a\n' in self.select('select * from foo where id = 1')
+        assert '1,a\n' not in self.select('select * from foo where id = 2')
+        assert 1 == len(parses)  # parsed once, with the placeholder
+        assert (1, 1) == (cache.hits, cache.misses)
+
+    def test_plan_cache_catalog(self):
+        self.select('select * from foo')
+        self.execute('drop table foo')
+        self.execute('create table foo (name char(10))')
+        self.execute("insert into foo values ('b')")
+
+        parses = self.count_parses()
+        assert 'name\nb\n' in self.select('select * from foo')  # compiled again against the new catalog
+        assert 1 == len(parses)
+
+    def test_plan_cache_outfile(self):
+        parses = self.count_parses()
+        cache = self.app.plan_cache
+        cache.hits = cache.misses = 0
+        with TemporaryDirectory() as home:
+            paths = [os.path.join(home, name) for name in ('foo.csv', 'Foo.csv')]
+            for path in paths + paths[:1]:
+                self.execute(f"select * from foo where id = 1 into outfile '{path}'")
+
+            assert 2 == len(parses)  # once per path, which is kept in the cached query
+            assert (1, 2) == (cache.hits, cache.misses)
+            for path in paths:
+                with open(path) as file:
+                    assert 'id,name\n1,a\n' == file.read()
+
+    @ExpectException(WhereColumnNotExist)
+    def test_where_column_null(self):
+        self.select('select * from foo where nosuch = null')
+
+    @ExpectException(WhereColumnNotExist)
+    def test_where_column_false(self):
+        self.select('select * from foo where 1 = 2 and nosuch > 3')
+
+    @ExpectException(WhereColumnNotExist)
+    def test_where_column_true(self):
+        self.select('select * from foo where 1 = 1 or nosuch = 3')
+
+    @ExpectException(WhereColumnNotExist)
+    def test_where_column_empty(self):
+        self.select('select * from bar where nosuch = 3')
+
+    @ExpectException(WhereAmbiguousReference)
+    def test_where_ambiguous(self):
+        self.select('select * from foo, bar where id = 1')
+
+    @ExpectException(WhereTableNotSpecified)
+    def test_where_table(self):
+        self.execute('delete from foo where bar.id = 1')
+
+    def test_insert_select_parallel(self):
+        app = self.app = App(self.db, sink=CsvSink(self.output), parallel_workers=2)
+        app.PARALLEL_THRESHOLD = 0  # every table is large
+        profile = StringIO()
+        with redirect_stdout(profile):
+            app.run('profile insert into bar select id from foo')  # scanned in this process, in the writing block
+        assert 'Scan foo' in profile.getvalue() and 'ParallelScan' not in profile.getvalue()
+        assert [{'id': 1}] == [record for _, record in self.db.select_all_records('bar')]
+
+    def test_parallel_limit(self):
+        with TemporaryDirectory() as home:
+            self.db = DbApi(os.path.join(home, 'test.db'))
+            app = self.app = App(self.db, sink=CsvSink(self.output), parallel_workers=2)
+            app.PARALLEL_THRESHOLD = 0  # every table is large
+            self.execute('create table foo (id int)')
+            for i in range(10):
+                self.execute(f'insert into foo values ({i})')
+            assert 'id\n0\n' == self.select('select id from foo limit 1')
+            assert [] == multiprocessing.active_children()  # stopped early, and the workers are gone
+
+    def test_show_stats_no_such_table(self):
+        with self.assertRaises(SelectTableExistenceError):
+            self.execute('select * from nosuch')
+        assert 'nosuch' not in self.select('show stats')
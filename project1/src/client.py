@@ -0,0 +1,75 @@
+import socket
+import sys
+from argparse import ArgumentParser
+
+from parser import split_queries
+from protocol import ProtocolError, send_frame, recv_frame
+
+
+class QueryError(Exception):
+    """The server failed a query. Output of the queries before the failed one is kept."""
+
+    def __init__(self, msg: str, output: str):
+        super().__init__(msg)
+        self.output = output
+
+
+class Client:
+    """Connection to the SQL server. Queries are executed in order, in the session of the connection."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+
+    @classmethod
+    def tcp(cls, host: str = 'localhost', port: int = 8023) -> 'Client':
+        return cls(socket.create_connection((host, port)))
+
+    @classmethod
+    def unix(cls, path: str) -> 'Client':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        return cls(sock)
+
+    def query(self, script: str) -> str:
+        """
+        Execute the queries of the script, until an error occurs.
+
+        :return: what the queries have printed
+        :raise QueryError: a query has failed
+        """
+
+        send_frame(self.sock, {'query': script})
+        response = recv_frame(self.sock)
+        if response is None:
+            raise ProtocolError('connection is closed by the server')
+
+        if response['error'] is not None:
+            raise QueryError(response['error'], response['output'])
+        return response['output']
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self) -> 'Client':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    arg_parser = ArgumentParser(description='Execute the queries of stdin on the SQL server.')
+    arg_parser.add_argument('--host', default='localhost', help='TCP host (default: localhost)')
+    arg_parser.add_argument('--port', type=int, default=8023, help='TCP port (default: 8023)')
+    arg_parser.add_argument('--unix', metavar='PATH', help='connect to the Unix socket instead of TCP')
+    args = arg_parser.parse_args()
+
+    with Client.unix(args.unix) if args.unix is not None else Client.tcp(args.host, args.port) as client:
+        for query in split_queries(sys.stdin):
+            try:
+                print(client.query(query), end='')
+            except QueryError as e:
+                print(e.output, end='')
+                print(e, file=sys.stderr)
+            except ProtocolError:  # exit command closes the session
+                break
@@ -1,9 +1,10 @@
 import datetime
+import operator
 from enum import Enum
-from typing import List, Union, Callable, Dict
+from typing import List, Union, Callable, Dict, Sequence, Optional
 
 from error import SqlSyntaxError, WhereIncomparableError, WhereColumnNotExist, WhereAmbiguousReference, \
-    WhereTableNotSpecified
+    WhereTableNotSpecified, ParameterCountError
 
 
 ####################################################################################################
@@ -141,6 +142,87 @@ class CompOp(Enum):
         elif self is self.NE:
             return boolean(operand1 != operand2)
 
+    def negate(self) -> 'CompOp':
+        """Operator of NOT of the comparison, which is the same under the three valued logic as NULL is unknown."""
+
+        return {CompOp.LT: CompOp.GE, CompOp.GT: CompOp.LE, CompOp.LE: CompOp.GT, CompOp.GE: CompOp.LT,
+                CompOp.EQ: CompOp.NE, CompOp.NE: CompOp.EQ}[self]
+
+    def comparator(self, data_type: 'Column.Type', nullable: bool) -> Callable[[Value, Value], boolean]:
+        """
+        Same as eval, for the values of the type only. The type is not checked, and NULL is not unless nullable.
+
+        Dates are compared as (year, month, day), rather than by the methods of date.
+        """
+
+        op, truth = _OPERATORS[self], _TRUTH
+        if data_type is Column.Type.DATE:
+            def compare(operand1: date, operand2: date) -> boolean:
+                return truth[op((operand1.year, operand1.month, operand1.day),
+                                (operand2.year, operand2.month, operand2.day))]
+        else:
+            def compare(operand1: Value, operand2: Value) -> boolean:
+                return truth[op(operand1, operand2)]
+
+        if not nullable:
+            return compare
+        return lambda operand1, operand2: \
+            boolean.unknown if operand1 is None or operand2 is None else compare(operand1, operand2)
+
+
+_OPERATORS = {CompOp.LT: operator.lt, CompOp.GT: operator.gt, CompOp.LE: operator.le, CompOp.GE: operator.ge,
+              CompOp.EQ: operator.eq, CompOp.NE: operator.ne}
+_TRUTH = (boolean.false, boolean.true)  # indexed by bool
+
+
+class Param:
+    """Parameter placeholder ('?'). It is substituted by the bound value on execution."""
+
+    __slots__ = 'idx'
+
+    def __init__(self, idx: int):
+        self.idx = idx
+
+    def __str__(self):
+        return '?'
+
+    def __format__(self, format_spec):
+        return str(self).__format__(format_spec)
+
+
+class Params:
+    """Values bound to the parameter placeholders of a statement."""
+
+    __slots__ = 'values', 'num_params'
+
+    def __init__(self):
+        self.values = []
+        self.num_params = 0
+
+    def new_param(self) -> Param:
+        """Create a new placeholder. Placeholders are numbered from left to right."""
+
+        param = Param(self.num_params)
+        self.num_params += 1
+        return param
+
+    def bind(self, values: Sequence[Value]):
+        """
+        Bind values to the placeholders.
+
+        :raise ParameterCountError: number of values does not match number of placeholders
+        """
+
+        if len(values) != self.num_params:
+            raise ParameterCountError(self.num_params, len(values))
+
+        self.values = list(values)
+
+    def resolve(self, value: Union[Value, Param]) -> Value:
+        """Substitute the placeholder by the bound value."""
+
+        return self.values[value.idx] if isinstance(value, Param) else value
+
 
 ####################################################################################################
 # Metadata
@@ -265,6 +347,30 @@ class TableColumn:
         return str(self).__format__(format_spec)
 
 
+class Aggregate:
+    """Aggregate function applied to a column, or to rows if the column is None (count(*))."""
+
+    class Function(Enum):
+        COUNT = 'count'
+        SUM = 'sum'
+        MIN = 'min'
+        MAX = 'max'
+        AVG = 'avg'
+
+    __slots__ = 'function', 'table_column'
+
+    def __init__(self, function: Function, table_column: TableColumn = None):
+        self.function = function
+        self.table_column = table_column
+
+    def __str__(self):
+        arg = '*' if self.table_column is None else str(self.table_column)
+        return f'{self.function.value}({arg})'
+
+    def __format__(self, format_spec):
+        return str(self).__format__(format_spec)
+
+
 ####################################################################################################
 # Data
 ####################################################################################################
@@ -290,11 +396,12 @@ class Record(dict):
 class Row(dict):
     """Row. It's structure is: {'col1': {'table1' : value, ...}, ...}."""
 
-    __slots__ = 'table_names'
+    __slots__ = 'table_names', 'rec_idx'
 
     def __init__(self):
         super().__init__()
         self.table_names = set()
+        self.rec_idx = None  # index of the record read from the table, None for the joined row
 
     @classmethod
     def from_dict(cls, inner: Dict[str, Dict[str, Value]]):
@@ -306,11 +413,12 @@ class Row(dict):
         return ret
 
     @classmethod
-    def from_record(cls, record: Record):
+    def from_record(cls, record: Record, rec_idx: Optional[int] = None):
         ret = Row()
         for col_name in record:
             ret.add_value(col_name, record.table_name, record[col_name])
 
+        ret.rec_idx = rec_idx
         return ret
 
     @classmethod
@@ -324,6 +432,17 @@ class Row(dict):
 
         return ret
 
+    def to_record(self, table_name: str) -> Record:
+        """Collect the values of the table into the record."""
+
+        ret = Record(table_name)
+        for col_name in self:
+            values = self[col_name]
+            if table_name in values:
+                ret[col_name] = values[table_name]
+
+        return ret
+
     def add_value(self, col_name: str, table_name: str, value: Value):
         if table_name not in self.table_names:
             self.table_names.add(table_name)
@@ -1,7 +1,8 @@
 from unittest import TestCase
 
-from datatype import Column, ForeignKey, date, CompOp, boolean, Row, TableColumn, Record
-from error import SqlSyntaxError, WhereColumnNotExist, WhereAmbiguousReference, WhereTableNotSpecified
+from datatype import Column, ForeignKey, date, CompOp, boolean, Row, TableColumn, Record, Params, Aggregate
+from error import SqlSyntaxError, WhereColumnNotExist, WhereAmbiguousReference, WhereTableNotSpecified, \
+    ParameterCountError
 from util import ExpectException
 
 
@@ -234,6 +235,52 @@ class TestCompOp(TestCase):
         assert op.eval(d2, d1) is boolean.true
         assert op.eval(n, d1) is boolean.unknown
 
+    def test_comparator(self):
+        operands = {Column.Type.INT: [3, 4], Column.Type.CHAR: ['b', 'a'],
+                    Column.Type.DATE: [date(2022, 1, 2), date(2021, 12, 31), date(2022, 1, 2)]}
+        for op in CompOp:
+            for data_type, values in operands.items():
+                compare = op.comparator(data_type, False)
+                for operand1 in values:
+                    for operand2 in values:
+                        assert op.eval(operand1, operand2) is compare(operand1, operand2)
+
+                compare = op.comparator(data_type, True)
+                assert boolean.unknown is compare(values[0], None)
+                assert boolean.unknown is compare(None, values[0])
+                assert op.eval(values[0], values[1]) is compare(values[0], values[1])
+
+    def test_negate(self):
+        for op in CompOp:
+            assert op is op.negate().negate()
+            for operand1, operand2 in [(3, 4), (4, 4), ('b', 'a'), (3, None)]:
+                assert -op.eval(operand1, operand2) is op.negate().eval(operand1, operand2)
+
+
+class TestParams(TestCase):
+    def test_bind(self):
+        params = Params()
+        p0 = params.new_param()
+        p1 = params.new_param()
+        assert (p0.idx, p1.idx) == (0, 1)
+        assert params.num_params == 2
+
+        params.bind([3, 'a'])
+        assert params.resolve(p0) == 3
+        assert params.resolve(p1) == 'a'
+        assert params.resolve(4) == 4
+        assert params.resolve(None) is None
+
+        params.bind([None, 'b'])
+        assert params.resolve(p0) is None
+        assert params.resolve(p1) == 'b'
+
+    @ExpectException(ParameterCountError)
+    def test_bind_fail(self):
+        params = Params()
+        params.new_param()
+        params.bind([])
+
 
 ####################################################################################################
 # Metadata
@@ -291,6 +338,12 @@ class TestTableColumn(TestCase):
         assert f'{col}' == 'id'
 
 
+class TestAggregate(TestCase):
+    def test(self):
+        assert str(Aggregate(Aggregate.Function.COUNT)) == 'count(*)'
+        assert f'{Aggregate(Aggregate.Function.SUM, TableColumn("id", "foo"))}' == 'sum(foo.id)'
+
+
 ####################################################################################################
 # Data
 ####################################################################################################
@@ -310,6 +363,11 @@ class TestRow(TestCase):
         row = Row.from_record(Record.from_dict('foo', {'id': 3, 'name': 'Jiho'}))
         assert row == {'id': {'foo': 3}, 'name': {'foo': 'Jiho'}}
 
+    def test_to_record(self):
+        row = Row.from_dict({'id': {'foo': 3, 'bar': 4}, 'name': {'foo': 'Jiho'}, 'city': {'bar': 'Seoul'}})
+        assert row.to_record('foo') == {'id': 3, 'name': 'Jiho'}
+        assert row.to_record('bar').table_name == 'bar'
+
     def test_merge(self):
         left = Row.from_record(Record.from_dict('foo', {'id': 3, 'name': 'Jiho'}))
         right = Row.from_record(Record.from_dict('bar', {'id': 4, 'city': 'Seoul'}))
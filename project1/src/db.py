@@ -1,9 +1,131 @@
-from typing import Optional, List, Dict, Tuple
+import os
+import shutil
+import sys
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from threading import local, Lock
+from time import perf_counter
+from typing import Optional, List, Dict, Tuple, Iterator, Iterable, Callable, Hashable
 
 from berkeleydb import db
 
 from datatype import Column, Key, ForeignKey, Record, date
-from util import Bytes
+from util import Bytes, ReadWriteLock, FileLock
+
+
+class IoStats:
+    """Counters of BerkeleyDB calls, and the time decoding what is read in seconds."""
+
+    __slots__ = 'gets', 'puts', 'deletes', 'bytes_read', 'bytes_written', 'decode_time'
+
+    def __init__(self, gets=0, puts=0, deletes=0, bytes_read=0, bytes_written=0, decode_time=0.0):
+        self.gets = gets
+        self.puts = puts
+        self.deletes = deletes
+        self.bytes_read = bytes_read
+        self.bytes_written = bytes_written
+        self.decode_time = decode_time
+
+    def __iter__(self):
+        return iter((self.gets, self.puts, self.deletes, self.bytes_read, self.bytes_written, self.decode_time))
+
+    def __add__(self, other):
+        return IoStats(*(a + b for a, b in zip(self, other)))
+
+    def __sub__(self, other):
+        return IoStats(*(a - b for a, b in zip(self, other)))
+
+    def __eq__(self, other):
+        """Counters are compared, but not the time."""
+
+        return tuple(self)[:-1] == tuple(other)[:-1]
+
+    def __str__(self):
+        return f'gets={self.gets} puts={self.puts} deletes={self.deletes} bytes_read={self.bytes_read} ' \
+               f'bytes_written={self.bytes_written} decode={self.decode_time * 1000:.3f}ms'
+
+    def copy(self):
+        return IoStats(*self)
+
+
+class BufferPool:
+    """
+    Least recently used records decoded from the database, within the budget of their estimated bytes.
+
+    Records are keyed by the table name and the record index. Indexes are never reused in a table until it is dropped,
+    so a record cached is stale only once it is deleted or updated. It counts hits and misses, and is shared by the
+    threads.
+    """
+
+    __slots__ = 'size', 'used', 'entries', 'hits', 'misses', 'lock'
+
+    def __init__(self, size: int):
+        """:param size: in bytes, 0 to disable"""
+
+        self.size = size
+        self.used = 0
+        self.entries: OrderedDict = OrderedDict()  # (table name, record index) to the record and its bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, table_name: str, idx: int) -> Optional[Record]:
+        """Return the cached record, or None if it is not cached."""
+
+        key = (table_name, idx)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, record: Record, idx: int):
+        """Cache the record. Least recently used records are evicted until it fits, and it is not cached if larger."""
+
+        size = self.estimate_size(record)
+        if size > self.size:
+            return
+
+        key = (record.table_name, idx)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.used -= old[1]
+            while self.used + size > self.size:
+                self.used -= self.entries.popitem(last=False)[1][1]
+
+            self.entries[key] = (record, size)
+            self.used += size
+
+    def discard(self, table_name: str, rec_idx: Iterable[int]):
+        """Invalidate the records of the table."""
+
+        with self.lock:
+            for idx in rec_idx:
+                entry = self.entries.pop((table_name, idx), None)
+                if entry is not None:
+                    self.used -= entry[1]
+
+    def clear(self):
+        """Invalidate all records. Counters are not reset."""
+
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+    @staticmethod
+    def estimate_size(record: Record) -> int:
+        """Estimated bytes of the record, which are of the column names and values and the record holding them."""
+
+        getsizeof = sys.getsizeof
+        return getsizeof(record) + sum(getsizeof(col_name) + getsizeof(value) for col_name, value in record.items())
 
 
 class DbApi:
@@ -16,19 +138,245 @@ class DbApi:
     Note that both are not valid identifiers.
 
     Arguments for the API are not validated here. It must be checked on higher abstraction.
+
+    The file is opened in a Concurrent Data Store environment, whose region files are created next to it.
+    Every process opening the file shares the environment, which locks each call: many readers or a single writer at a
+    time, with no isolation of a series of calls. Statements access the database in **reading** or **writing** block,
+    which isolate them from the threads of the process by the ReadWriteLock, and from the other processes by the lock
+    file next to the database.
+
+    Records read may be kept decoded in the buffer pool. Records deleted or updated are evicted from it, and the
+    whole pool is invalidated when the catalog changes, or the other process has written the records. The file notes
+    once that a buffer pool has opened it, and only then the writing blocks note their writes for the other processes.
     """
 
-    def __init__(self, filename: str):
-        self.db = db.DB()
+    # Incremented whenever the catalog (table metadata) changes, which is persisted to notice the other processes.
+    catalog_version = 0
+    # Random token stored by each writing block which has written the records, only to notice the buffer pools.
+    data_version: Optional[bytes] = None
+
+    def __init__(self, filename: str, read_only: bool = False, buffer_pool_size: int = 0):
+        """
+        :param read_only: open the existing file only to read
+        :param buffer_pool_size: bytes of the decoded records kept, 0 to decode every record read, ignored if read only
+            since the file cannot note the buffer pool for the writers
+        """
+
+        self.filename = os.path.abspath(filename)
+        self.io = IoStats()
+        self.table_io: Dict[Optional[str], IoStats] = dict()  # breakdown of io, None for the keys of no table
+        self.catalog: Dict[Tuple[str, str], object] = dict()  # decoded table metadata, cleared on catalog change
+        self.buffer_pool = BufferPool(0 if read_only else buffer_pool_size)
+        self.lock = ReadWriteLock()
+        self.file_lock: Optional[FileLock] = None if read_only else FileLock(self.filename + '.lock')
+        self.local = local()  # CDS group of the thread in writing block, and whether it has written the records
+
+        home, filename = os.path.split(self.filename)
+        self.env = db.DBEnv()
+        self.env.set_flags(db.DB_CDB_ALLDB, 1)  # a writer locks every database of the environment
+        self.env.open(home, db.DB_CREATE | db.DB_INIT_CDB | db.DB_INIT_MPOOL | db.DB_THREAD)
+
+        self.db = db.DB(self.env)
+        if read_only:
+            self.db.open(filename, dbtype=db.DB_HASH, flags=db.DB_RDONLY | db.DB_THREAD)
+            return
+
         try:
-            with open(filename):
-                self.db.open(filename, dbtype=db.DB_HASH)
+            with open(os.path.join(home, filename)):
+                self.db.open(filename, dbtype=db.DB_HASH, flags=db.DB_THREAD)
         except FileNotFoundError:
-            self.db.open(filename, dbtype=db.DB_HASH, flags=db.DB_CREATE)
-            self.db.put(self.__key_table_names(), b'[]')
+            self.db.open(filename, dbtype=db.DB_HASH, flags=db.DB_CREATE | db.DB_THREAD)
+            self.__put(self.__key_table_names(), b'[]')
+        self.__note_buffer_pool()
 
     def __del__(self):
         self.db.close()
+        self.env.close()
+        if self.file_lock is not None:
+            self.file_lock.close()
+
+    def sync(self):
+        """Flush the cached pages to the file."""
+
+        self.db.sync()
+
+    def stats(self) -> Dict[Optional[str], IoStats]:
+        """Copy of the io of each table, None for the keys of no table."""
+
+        return {table_name: io.copy() for table_name, io in self.table_io.items()}
+
+    def reset_stats(self):
+        self.io = IoStats()
+        self.table_io.clear()
+
+    ################################################################################################
+    # Concurrency
+    ################################################################################################
+
+    @contextmanager
+    def reading(self):
+        """
+        Block which only reads. Readers run concurrently, while no writer runs, of this or the other processes.
+
+        The database opened read only takes no lock file, thus its blocks are not isolated from the other processes.
+        """
+
+        with self.lock.read(), self.file_lock.read() if self.file_lock is not None else nullcontext():
+            self.__sync_catalog()
+            self.__sync_data()
+            yield
+
+    @contextmanager
+    def writing(self):
+        """
+        Block which may write. Writers run one at a time, excluding the readers, of this and the other processes.
+
+        Reads and writes of the block, such as the record counter fetched and added, are not interleaved with the other
+        blocks. Calls of the block are also grouped in the environment, which is locked from the first write until the
+        block ends, so a reader of the block must not wait for the other processes. Nothing is rolled back if the block
+        fails.
+        """
+
+        with self.lock.write(), self.file_lock.write() if self.file_lock is not None else nullcontext():
+            group = self.env.cdsgroup_begin() if self.env is not None else None
+            self.local.group = group
+            self.local.written = False
+            try:
+                self.__sync_catalog()
+                self.__sync_data()
+                yield
+            finally:
+                if self.local.written and (self.buffer_pool.size > 0 or self.__buffer_pool_noted()):
+                    self.data_version = os.urandom(8)
+                    self.__put(self.__key_data_version(), self.data_version)
+                self.local.group = None
+                self.local.written = False
+                if group is not None:
+                    group.commit()  # release the locks
+
+    def __note_buffer_pool(self):
+        """
+        Note in the file that a buffer pool has opened it, once for the file, which the other processes see as a
+        catalog change. Writers note their writes from then on. Nothing is written if the buffer pool is disabled.
+        """
+
+        if self.buffer_pool.size <= 0:
+            return
+
+        with self.writing():
+            if not self.__buffer_pool_noted():
+                self.__put(self.__key_buffer_pool(), b'1')
+                self.catalog.clear()
+                self.catalog_version += 1
+                self.__put(self.__key_catalog_version(), Bytes.from_int(self.catalog_version))
+
+    def __buffer_pool_noted(self) -> bool:
+        return self.__cached('buffer_pool', None, lambda: self.__get(self.__key_buffer_pool()) is not None)
+
+    def __sync_catalog(self):
+        """Invalidate the catalog cache if the other process has changed the catalog."""
+
+        catalog_version = Bytes.to_int(self.__get(self.__key_catalog_version())) or 0
+        if catalog_version != self.catalog_version:
+            self.catalog.clear()
+            self.buffer_pool.clear()
+            self.catalog_version = catalog_version
+
+    def __sync_data(self):
+        """Invalidate the buffer pool if the other process has written the records. Nothing is read if disabled."""
+
+        if self.buffer_pool.size <= 0:
+            return
+
+        data_version = self.__get(self.__key_data_version())
+        if data_version != self.data_version:
+            self.buffer_pool.clear()
+            self.data_version = data_version
+
+    def __written(self, table_name: str, rec_idx: Iterable[int]):
+        """Evict the records written, and note it for the other processes at the end of the writing block."""
+
+        self.local.written = True
+        self.buffer_pool.discard(table_name, rec_idx)
+
+    ################################################################################################
+    # Instrumented BerkeleyDB calls
+    ################################################################################################
+
+    def __group(self) -> dict:
+        group = getattr(self.local, 'group', None)
+        return {'txn': group} if group is not None else {}
+
+    def __table_io(self, table_name: Optional[str], found: bool = True) -> IoStats:
+        """
+        Io of the table, which is added once a key of the table is found. Keys not found before are counted for no
+        table, so that looking up a table which does not exist adds none.
+        """
+
+        io = self.table_io.get(table_name)
+        if io is None:
+            if not found:
+                table_name = None
+                io = self.table_io.get(None)
+            if io is None:
+                io = self.table_io[table_name] = IoStats()
+        return io
+
+    def __get(self, key: bytes, table_name: Optional[str] = None) -> Optional[bytes]:
+        value = self.db.get(key, **self.__group())
+        io, table_io = self.io, self.__table_io(table_name, value is not None)
+        io.gets += 1
+        table_io.gets += 1
+        if value is not None:
+            io.bytes_read += len(value)
+            table_io.bytes_read += len(value)
+        return value
+
+    def __get_obj(self, key: bytes, table_name: Optional[str] = None):
+        """Get the value decoded from JSON."""
+
+        value = self.__get(key, table_name)
+        if value is None:
+            return None
+
+        start = perf_counter()
+        obj = Bytes.to_obj(value)
+        self.__add_decode_time(table_name, perf_counter() - start)
+        return obj
+
+    def __add_decode_time(self, table_name: Optional[str], elapsed: float):
+        self.io.decode_time += elapsed
+        self.__table_io(table_name).decode_time += elapsed
+
+    def __put(self, key: bytes, value: bytes, table_name: Optional[str] = None):
+        self.db.put(key, value, **self.__group())
+        io, table_io = self.io, self.__table_io(table_name)
+        io.puts += 1
+        table_io.puts += 1
+        io.bytes_written += len(value)
+        table_io.bytes_written += len(value)
+
+    def __delete(self, key: bytes, table_name: Optional[str] = None):
+        self.db.delete(key, **self.__group())
+        self.io.deletes += 1
+        self.__table_io(table_name).deletes += 1
+
+    def __pairs(self) -> Iterator[Tuple[bytes, bytes]]:
+        """Every key and value of the database, in the order of the pages."""
+
+        cursor = self.db.cursor()
+        try:
+            pair = cursor.first()
+            while pair is not None:
+                io, table_io = self.io, self.__table_io(None)
+                io.gets += 1
+                table_io.gets += 1
+                io.bytes_read += len(pair[1])
+                table_io.bytes_read += len(pair[1])
+                yield pair
+                pair = cursor.next()
+        finally:
+            cursor.close()
 
     ################################################################################################
     # Internal key generators
@@ -38,6 +386,18 @@ class DbApi:
     def __key_table_names() -> bytes:
         return b'_table_names'
 
+    @staticmethod
+    def __key_catalog_version() -> bytes:
+        return b'_catalog_version'
+
+    @staticmethod
+    def __key_data_version() -> bytes:
+        return b'_data_version'
+
+    @staticmethod
+    def __key_buffer_pool() -> bytes:
+        return b'_buffer_pool'
+
     @staticmethod
     def __key_col_name_idx(table_name: str) -> bytes:
         return Bytes.from_str(f'_{table_name}_col_name_idx')
@@ -74,41 +434,69 @@ class DbApi:
     # Table Metadata Operations
     ################################################################################################
 
+    def __cached(self, kind: str, table_name: str, load: Callable[[], object]):
+        """
+        Table metadata which does not change until the table is dropped, decoded once. Cached objects are shared by
+        the callers, thus they must not be modified.
+        """
+
+        key = (kind, table_name)
+        try:
+            return self.catalog[key]
+        except KeyError:
+            metadata = self.catalog[key] = load()
+            return metadata
+
+    def derived(self, kind: Hashable, table_name: str, build: Callable[[], object]):
+        """
+        Object the caller derives from the metadata of the table, built once and cached along with the metadata until
+        the catalog changes.
+        """
+
+        return self.__cached(kind, table_name, build)
+
     def table_names(self) -> List[str]:
-        return Bytes.to_obj(self.db.get(self.__key_table_names()))
+        return self.__get_obj(self.__key_table_names())
 
     def __add_table_name(self, table_name: str):
         table_names = self.table_names()
         table_names.append(table_name)
-        self.db.put(self.__key_table_names(), Bytes.from_obj(table_names))
+        self.__put(self.__key_table_names(), Bytes.from_obj(table_names))
 
     def __rm_table_name(self, table_name: str):
         table_names = self.table_names()
         table_names.remove(table_name)
-        self.db.put(self.__key_table_names(), Bytes.from_obj(table_names))
+        self.__put(self.__key_table_names(), Bytes.from_obj(table_names))
 
     def col_name_idx(self, table_name: str) -> Optional[Dict[str, int]]:
-        return Bytes.to_obj(self.db.get(self.__key_col_name_idx(table_name)))
+        return self.__cached('col_name_idx', table_name,
+                             lambda: self.__get_obj(self.__key_col_name_idx(table_name), table_name))
 
     def cols(self, table_name: str) -> Optional[List[Column]]:
-        cols = Bytes.to_obj(self.db.get(self.__key_cols(table_name)))
-        if cols is not None:
-            return [Column.from_dict(col) for col in cols]
+        def load():
+            cols = self.__get_obj(self.__key_cols(table_name), table_name)
+            if cols is not None:
+                return [Column.from_dict(col) for col in cols]
+
+        return self.__cached('cols', table_name, load)
 
     def pk(self, table_name: str) -> Optional[Key]:
-        return Bytes.to_obj(self.db.get(self.__key_pk(table_name)))
+        return self.__cached('pk', table_name, lambda: self.__get_obj(self.__key_pk(table_name), table_name))
 
     def fks(self, table_name: str) -> Optional[List[ForeignKey]]:
-        fks = Bytes.to_obj(self.db.get(self.__key_fks(table_name)))
-        if fks is not None:
-            return [ForeignKey.from_dict(fk) for fk in fks]
+        def load():
+            fks = self.__get_obj(self.__key_fks(table_name), table_name)
+            if fks is not None:
+                return [ForeignKey.from_dict(fk) for fk in fks]
+
+        return self.__cached('fks', table_name, load)
 
     def ref_cnt(self, table_name: str) -> Optional[int]:
-        return Bytes.to_int(self.db.get(self.__key_ref_cnt(table_name)))
+        return Bytes.to_int(self.__get(self.__key_ref_cnt(table_name), table_name))
 
     def __update_ref_cnt(self, table_name: str, delta: int):
         ref_cnt = self.ref_cnt(table_name) + delta
-        self.db.put(self.__key_ref_cnt(table_name), Bytes.from_int(ref_cnt))
+        self.__put(self.__key_ref_cnt(table_name), Bytes.from_int(ref_cnt), table_name)
 
     def __incr_ref_cnt(self, table_name: str):
         self.__update_ref_cnt(table_name, 1)
@@ -120,23 +508,23 @@ class DbApi:
     # Record Metadata Operations
     ################################################################################################
 
-    def __fetch_add_rec_counter(self, table_name: str) -> int:
+    def __fetch_add_rec_counter(self, table_name: str, n: int = 1) -> int:
         key_rec_counter = self.__key_rec_counter(table_name)
-        rec_counter = Bytes.to_int(self.db.get(key_rec_counter))
-        self.db.put(key_rec_counter, Bytes.from_int(rec_counter + 1))
+        rec_counter = Bytes.to_int(self.__get(key_rec_counter, table_name))
+        self.__put(key_rec_counter, Bytes.from_int(rec_counter + n), table_name)
         return rec_counter
 
     def rec_idx(self, table_name: str) -> Optional[List[int]]:
-        return Bytes.to_obj(self.db.get(self.__key_rec_idx(table_name)))
+        return self.__get_obj(self.__key_rec_idx(table_name), table_name)
 
-    def __insert_rec_idx(self, table_name: str, idx: int):
+    def __insert_rec_idx(self, table_name: str, *idx: int):
         rec_idx = self.rec_idx(table_name)
-        rec_idx.append(idx)
-        self.db.put(self.__key_rec_idx(table_name), Bytes.from_obj(rec_idx))
+        rec_idx.extend(idx)
+        self.__put(self.__key_rec_idx(table_name), Bytes.from_obj(rec_idx), table_name)
 
     def __delete_rec_idx(self, table_name: str, idx_to_delete: List[int]):
         rec_idx = list(filter(lambda idx: idx not in idx_to_delete, self.rec_idx(table_name)))
-        self.db.put(self.__key_rec_idx(table_name), Bytes.from_obj(rec_idx))
+        self.__put(self.__key_rec_idx(table_name), Bytes.from_obj(rec_idx), table_name)
 
     ################################################################################################
     # Table API
@@ -147,23 +535,28 @@ class DbApi:
 
         # Create metadata
         self.__add_table_name(table_name)
-        self.db.put(self.__key_col_name_idx(table_name), Bytes.from_obj(col_name_idx))
-        self.db.put(self.__key_cols(table_name), Bytes.from_obj(cols))
-        self.db.put(self.__key_pk(table_name), Bytes.from_obj(pk))
-        self.db.put(self.__key_fks(table_name), Bytes.from_obj(fks))
-        self.db.put(self.__key_ref_cnt(table_name), Bytes.from_int(0))
-        self.db.put(self.__key_rec_counter(table_name), Bytes.from_int(0))
-        self.db.put(self.__key_rec_idx(table_name), Bytes.from_obj([]))
+        self.__put(self.__key_col_name_idx(table_name), Bytes.from_obj(col_name_idx), table_name)
+        self.__put(self.__key_cols(table_name), Bytes.from_obj(cols), table_name)
+        self.__put(self.__key_pk(table_name), Bytes.from_obj(pk), table_name)
+        self.__put(self.__key_fks(table_name), Bytes.from_obj(fks), table_name)
+        self.__put(self.__key_ref_cnt(table_name), Bytes.from_int(0), table_name)
+        self.__put(self.__key_rec_counter(table_name), Bytes.from_int(0), table_name)
+        self.__put(self.__key_rec_idx(table_name), Bytes.from_obj([]), table_name)
 
         # Increment ref cnt
         for fk in fks:
             if fk.ref_table != table_name:
                 self.__incr_ref_cnt(fk.ref_table)
 
+        self.catalog.clear()
+        self.buffer_pool.clear()
+        self.catalog_version += 1
+        self.__put(self.__key_catalog_version(), Bytes.from_int(self.catalog_version))
+
     def drop_table(self, table_name: str):
         # Delete records
         for idx in self.rec_idx(table_name):
-            self.db.delete(self.__key_rec(table_name, idx))
+            self.__delete(self.__key_rec(table_name, idx), table_name)
 
         # Decrement ref cnt
         for fk in self.fks(table_name):
@@ -171,41 +564,204 @@ class DbApi:
                 self.__decr_ref_cnt(fk.ref_table)
 
         # Delete metadata
-        self.db.delete(self.__key_rec_idx(table_name))
-        self.db.delete(self.__key_rec_counter(table_name))
-        self.db.delete(self.__key_ref_cnt(table_name))
-        self.db.delete(self.__key_fks(table_name))
-        self.db.delete(self.__key_pk(table_name))
-        self.db.delete(self.__key_cols(table_name))
-        self.db.delete(self.__key_col_name_idx(table_name))
+        self.__delete(self.__key_rec_idx(table_name), table_name)
+        self.__delete(self.__key_rec_counter(table_name), table_name)
+        self.__delete(self.__key_ref_cnt(table_name), table_name)
+        self.__delete(self.__key_fks(table_name), table_name)
+        self.__delete(self.__key_pk(table_name), table_name)
+        self.__delete(self.__key_cols(table_name), table_name)
+        self.__delete(self.__key_col_name_idx(table_name), table_name)
         self.__rm_table_name(table_name)
 
+        self.catalog.clear()
+        self.buffer_pool.clear()
+        self.catalog_version += 1
+        self.__put(self.__key_catalog_version(), Bytes.from_int(self.catalog_version))
+
     ################################################################################################
     # Record API
     ################################################################################################
 
     def insert_record(self, record: Record):
-        table_name = record.table_name
+        self.insert_encoded(record.table_name, Bytes.from_obj(record))
+
+    def insert_encoded(self, table_name: str, encoded: bytes):
+        """Insert the record encoded by the caller, as Bytes.from_obj would encode it."""
+
         idx = self.__fetch_add_rec_counter(table_name)
 
-        self.db.put(self.__key_rec(table_name, idx), Bytes.from_obj(record))
+        self.__put(self.__key_rec(table_name, idx), encoded, table_name)
         self.__insert_rec_idx(table_name, idx)
+        self.local.written = True
+
+    def insert_records(self, table_name: str, records: List[Record]):
+        """Insert the records at once. Record counter and index are written once, instead of once per record."""
+
+        self.index_records(table_name, self.write_records(table_name, records))
+
+    def write_records(self, table_name: str, records: List[Record]) -> List[int]:
+        """
+        Write the records without adding them to the record index, thus they are not visible yet.
+
+        :return: indexes of the records, to be indexed or discarded
+        """
+
+        return self.write_encoded(table_name, [Bytes.from_obj(record) for record in records])
+
+    def write_encoded(self, table_name: str, encoded: List[bytes]) -> List[int]:
+        """Same as write_records, for the records encoded by the caller."""
+
+        if len(encoded) == 0:
+            return []
+
+        first_idx = self.__fetch_add_rec_counter(table_name, len(encoded))
+        for idx, value in enumerate(encoded, first_idx):
+            self.__put(self.__key_rec(table_name, idx), value, table_name)
+        self.local.written = True
+        return list(range(first_idx, first_idx + len(encoded)))
+
+    def index_records(self, table_name: str, rec_idx: List[int]):
+        """Add the written records to the record index at once."""
+
+        if len(rec_idx) != 0:
+            self.__insert_rec_idx(table_name, *rec_idx)
+
+    def discard_records(self, table_name: str, rec_idx: List[int]):
+        """Delete the written records, which are not indexed."""
+
+        for idx in rec_idx:
+            self.__delete(self.__key_rec(table_name, idx), table_name)
+        self.__written(table_name, rec_idx)
 
     def delete_records(self, table_name: str, idx_to_delete: List[int]):
         self.__delete_rec_idx(table_name, idx_to_delete)
         for idx in idx_to_delete:
-            self.db.delete(self.__key_rec(table_name, idx))
+            self.__delete(self.__key_rec(table_name, idx), table_name)
+        self.__written(table_name, idx_to_delete)
 
-    def select_all_records(self, table_name: str) -> Optional[List[Tuple[int, Record]]]:
+    def update_records(self, table_name: str, records: List[Tuple[int, Record]]):
+        """Overwrite the records in place. Record indexes are not changed."""
+
+        for idx, record in records:
+            self.__put(self.__key_rec(table_name, idx), Bytes.from_obj(record), table_name)
+        self.__written(table_name, (idx for idx, _ in records))
+
+    def count_records(self, table_name: str) -> Optional[int]:
         rec_idx = self.rec_idx(table_name)
         if rec_idx is not None:
-            return [(idx, self.__select_record(table_name, idx)) for idx in rec_idx]
+            return len(rec_idx)
+
+    def select_all_records(self, table_name: str) -> Optional[List[Tuple[int, Record]]]:
+        records = self.iter_records(table_name)
+        if records is not None:
+            return list(records)
+
+    def iter_records(self, table_name: str, rec_idx: Optional[Iterable[int]] = None) \
+            -> Optional[Iterator[Tuple[int, Record]]]:
+        """
+        Read the records lazily, one at a time. Records not iterated are never read, and ones deleted are skipped.
+
+        :param rec_idx: indexes of the records to read, every record if None
+        """
+
+        if rec_idx is None:
+            rec_idx = self.rec_idx(table_name)
+        if rec_idx is not None:
+            records = ((idx, self.__select_record(table_name, idx)) for idx in rec_idx)
+            return ((idx, record) for idx, record in records if record is not None)  # deleted since read outside blocks
+
+    ################################################################################################
+    # Backup API
+    ################################################################################################
+
+    def backup(self, filename: str, incremental: bool = False) -> Tuple[int, int]:
+        """
+        Copy the database to the file, which is a database by itself and restored by opening it in place of this.
+
+        Keys are copied through the cache, so that the pages not flushed yet are included, in a single pass of the
+        cursor. The copy is a snapshot only if it is taken in a reading block, which keeps the writers of this and other
+        processes waiting until it is done; a read-only instance takes no file lock, thus its copy is not isolated from
+        the writers of other processes. The backup is written to a temporary file, which replaces the file once it is
+        complete.
+
+        :param incremental: update a copy of the existing backup, writing only the keys which have changed
+        :return: numbers of the keys written and deleted
+        :raise OSError: the file cannot be written
+        """
+
+        incremental = incremental and os.path.exists(filename)
+        path = filename + '.tmp'
+        if incremental:
+            shutil.copyfile(filename, path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+        target = db.DB()
+        try:
+            target.open(path, dbtype=db.DB_HASH, flags=db.DB_CREATE)
+        except db.DBError as e:
+            if os.path.exists(path):
+                os.remove(path)
+            raise OSError(f"'{filename}' cannot be written") from e
+
+        num_written, num_deleted = 0, 0
+        keys = set()
+        try:
+            for key, value in self.__pairs():
+                if incremental:
+                    keys.add(key)
+                if not incremental or target.get(key) != value:
+                    target.put(key, value)
+                    num_written += 1
+
+            if incremental:  # keys deleted since the last backup
+                cursor = target.cursor()
+                pair = cursor.first()
+                while pair is not None:
+                    if pair[0] not in keys:
+                        cursor.delete()
+                        num_deleted += 1
+                    pair = cursor.next()
+                cursor.close()
+
+            target.sync()
+        except BaseException:
+            target.close()
+            os.remove(path)  # partial copy
+            raise
+
+        target.close()
+        os.replace(path, filename)
+        return num_written, num_deleted
+
+    @staticmethod
+    def restore(backup: str, filename: str):
+        """Replace the database file with the backup. The database must not be open, by any process."""
+
+        shutil.copyfile(backup, filename + '.tmp')
+        os.replace(filename + '.tmp', filename)
 
     def __select_record(self, table_name, idx: int) -> Optional[Record]:
-        record = Bytes.to_obj(self.db.get(self.__key_rec(table_name, idx)))
-        if record is not None:
-            for col_name in record:
-                if isinstance(record[col_name], dict):  # date
-                    record[col_name] = date.from_dict(record[col_name])
+        """Record of the buffer pool if it is cached, which is shared by the callers, thus must not be modified."""
+
+        buffer_pool = self.buffer_pool
+        if buffer_pool.size > 0:
+            record = buffer_pool.get(table_name, idx)
+            if record is not None:
+                return record
 
-            return Record.from_dict(table_name, record)
+        value = self.__get(self.__key_rec(table_name, idx), table_name)
+        start = perf_counter()
+        try:
+            record = Bytes.to_obj(value)
+            if record is not None:
+                for col_name in record:
+                    if isinstance(record[col_name], dict):  # date
+                        record[col_name] = date.from_dict(record[col_name])
+
+                record = Record.from_dict(table_name, record)
+                if buffer_pool.size > 0:
+                    buffer_pool.put(record, idx)
+                return record
+        finally:
+            self.__add_decode_time(table_name, perf_counter() - start)
@@ -1,7 +1,12 @@
+import multiprocessing
+import os
+from tempfile import TemporaryDirectory
+from threading import local
 from unittest import TestCase
 
 from datatype import Column, ForeignKey, Record
-from db import DbApi
+from db import DbApi, IoStats, BufferPool
+from util import ReadWriteLock
 
 
 class MockDb(dict):
@@ -17,6 +22,9 @@ class MockDb(dict):
         except KeyError:
             pass
 
+    def sync(self):
+        pass
+
     def delete(self, key: bytes):
         try:
             del self[key]
@@ -25,10 +33,19 @@ class MockDb(dict):
 
 
 class MockDbApi(DbApi):
-    def __init__(self):
+    def __init__(self, buffer_pool_size: int = 0):
         object().__init__()
+        self.io = IoStats()
+        self.table_io = dict()
+        self.catalog = dict()
+        self.buffer_pool = BufferPool(buffer_pool_size)
+        self.lock = ReadWriteLock()
+        self.file_lock = None
+        self.local = local()
+        self.env = None
         self.db = MockDb()
         self.db.put(b'_table_names', b'[]')
+        self._DbApi__note_buffer_pool()
 
     def __del__(self):
         pass
@@ -92,7 +109,7 @@ class TestDbApi(TestCase):
         assert foo_fks == db.fks('foo')
         assert 0 == db.ref_cnt('foo')
         assert [] == db.rec_idx('foo')
-        assert self.FOO == dict(db.db)
+        assert {**self.FOO, b'_catalog_version': b'1'} == dict(db.db)
 
         # Create bar
         bar_cols = [Column.from_dict({'name': 'id', 'type': 'int', 'null': 'Y', 'key': 'FOR'})]
@@ -108,7 +125,7 @@ class TestDbApi(TestCase):
         assert 1 == db.ref_cnt('foo')
         assert 0 == db.ref_cnt('bar')
         assert [] == db.rec_idx('bar')
-        assert self.FOOBAR == dict(db.db)
+        assert {**self.FOOBAR, b'_catalog_version': b'2'} == dict(db.db)
 
         # Drop bar
         db.drop_table('bar')
@@ -120,12 +137,12 @@ class TestDbApi(TestCase):
         assert foo_fks == db.fks('foo')
         assert 0 == db.ref_cnt('foo')
         assert [] == db.rec_idx('foo')
-        assert self.FOO == dict(db.db)
+        assert {**self.FOO, b'_catalog_version': b'3'} == dict(db.db)
 
         # Drop foo
         db.drop_table('foo')
         assert [] == db.table_names()
-        assert self.EMPTY == dict(db.db)
+        assert {**self.EMPTY, b'_catalog_version': b'4'} == dict(db.db)
 
     def test_record_api(self):
         db = MockDbApi()
@@ -169,4 +186,226 @@ class TestDbApi(TestCase):
 
         assert [1, 3] == db.rec_idx('foo')
         assert [(1, record2), (3, record4)] == db.select_all_records('foo')
-        assert self.FOORECS == dict(db.db)
+        assert {**self.FOORECS, b'_catalog_version': b'1'} == dict(db.db)
+
+        # Update record - 4 to 5
+        record5 = Record.from_dict('foo', {'id': 5})
+        db.update_records('foo', [(3, record5)])
+
+        assert [1, 3] == db.rec_idx('foo')
+        assert [(1, record2), (3, record5)] == db.select_all_records('foo')
+
+    def test_io_stats(self):
+        db = MockDbApi()
+        db.db.put(b'_foo_rec_idx', b'[]')
+        db.io = IoStats()
+
+        assert [] == db.rec_idx('foo')
+        assert IoStats(gets=1, bytes_read=2) == db.io
+
+        db.rec_idx('bar')
+        assert IoStats(gets=2, bytes_read=2) == db.io
+
+        db.delete_records('foo', [])
+        assert IoStats(gets=3, puts=1, bytes_read=4, bytes_written=2) == db.io
+        assert IoStats(gets=1, puts=1, bytes_read=2, bytes_written=2) == db.io - IoStats(gets=2, bytes_read=2)
+
+    def test_table_io_stats(self):
+        db = MockDbApi()
+        db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+        db.create_table('bar', [Column('id', Column.Type.INT)], [], [])
+        db.insert_records('foo', [Record.from_dict('foo', {'id': i}) for i in range(3)])
+        db.reset_stats()
+
+        db.select_all_records('foo')
+        db.rec_idx('bar')
+        stats = db.stats()
+        assert IoStats(gets=4, bytes_read=len(b'[0, 1, 2]') + 3 * len(b'{"id": 0}')) == stats['foo']
+        assert stats['foo'].decode_time > 0
+        assert IoStats(gets=1, bytes_read=2) == stats['bar']
+        assert IoStats(gets=5, bytes_read=stats['foo'].bytes_read + 2) == db.io
+
+        db.reset_stats()
+        assert {} == db.stats()
+
+        assert None is db.cols('nosuch')
+        assert [None] == list(db.stats())  # looked up for no table, rather than adding the table
+
+    def test_insert_records(self):
+        db = MockDbApi()
+        db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+        db.insert_record(Record.from_dict('foo', {'id': 0}))
+
+        puts = db.io.puts
+        db.insert_records('foo', [Record.from_dict('foo', {'id': i}) for i in range(1, 4)])
+        assert [(i, {'id': i}) for i in range(4)] == db.select_all_records('foo')
+        assert 3 + 2 == db.io.puts - puts  # records, counter and index
+        assert [(2, {'id': 2})] == list(db.iter_records('foo', [2]))
+
+    def test_concurrent_inserts(self):
+        num_records = 200
+
+        def insert(filename: str, first: int):
+            db = DbApi(filename)
+            for i in range(first, first + num_records):
+                with db.writing():
+                    db.insert_record(Record.from_dict('foo', {'id': i}))
+                    db.delete_records('foo', [])  # rec_idx read and written again
+            db.sync()
+
+        with TemporaryDirectory() as home:
+            filename = os.path.join(home, 'test.db')
+            db = DbApi(filename)
+            with db.writing():
+                db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+
+            context = multiprocessing.get_context('fork')
+            processes = [context.Process(target=insert, args=(filename, first)) for first in (0, num_records)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+                assert 0 == process.exitcode
+
+            with db.reading():
+                assert list(range(2 * num_records)) == sorted(db.rec_idx('foo'))  # none lost or duplicated
+                records = db.select_all_records('foo')
+                assert list(range(2 * num_records)) == sorted(record['id'] for _, record in records)
+
+    def test_backup(self):
+        with TemporaryDirectory() as home:
+            db = DbApi(os.path.join(home, 'test.db'))
+            db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+            db.insert_records('foo', [Record.from_dict('foo', {'id': i}) for i in range(3)])
+
+            backup = os.path.join(home, 'backup.db')
+            with db.reading():
+                assert (12, 0) == db.backup(backup)  # 9 keys of metadata and 3 records
+
+            db.delete_records('foo', [0])
+            db.insert_record(Record.from_dict('foo', {'id': 3}))
+            with db.reading():
+                assert (3, 1) == db.backup(backup, incremental=True)  # counter, index and record 3, record 0
+
+            restored = os.path.join(home, 'restored.db')
+            DbApi.restore(backup, restored)
+            assert [(1, {'id': 1}), (2, {'id': 2}), (3, {'id': 3})] == DbApi(restored).select_all_records('foo')
+
+    def test_backup_interrupted(self):
+        with TemporaryDirectory() as home:
+            db = DbApi(os.path.join(home, 'test.db'))
+            db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+            backup = os.path.join(home, 'backup.db')
+            db.backup(backup)
+            with open(backup, 'rb') as file:
+                content = file.read()
+
+            db.insert_records('foo', [Record.from_dict('foo', {'id': i}) for i in range(3)])
+            pairs = db._DbApi__pairs
+
+            def interrupted():
+                yield from pairs()
+                raise KeyboardInterrupt
+
+            db._DbApi__pairs = interrupted
+            with self.assertRaises(KeyboardInterrupt):
+                db.backup(backup, incremental=True)
+            assert not os.path.exists(backup + '.tmp')  # without a partial copy
+            with open(backup, 'rb') as file:
+                assert content == file.read()
+
+    def test_catalog_cache(self):
+        db = MockDbApi()
+        db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+
+        gets = db.io.gets
+        assert db.cols('foo') is db.cols('foo')
+        assert 1 == db.io.gets - gets  # decoded once
+
+        db.drop_table('foo')
+        assert None is db.cols('foo')
+
+        other = MockDbApi()  # other process
+        other.db = db.db
+        other.create_table('foo', [Column('name', Column.Type.CHAR, 10)], [], [])
+        with db.reading():
+            assert [Column('name', Column.Type.CHAR, 10)] == db.cols('foo')
+
+    def test_derived(self):
+        db = MockDbApi()
+        db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+
+        built = []
+        assert db.derived('kind', 'foo', lambda: built.append(1) or len(built)) is \
+               db.derived('kind', 'foo', lambda: built.append(1) or len(built))
+        assert [1] == built  # built once
+
+        db.create_table('bar', [Column('id', Column.Type.INT)], [], [])
+        assert 2 == db.derived('kind', 'foo', lambda: built.append(1) or len(built))  # built again on catalog change
+
+    def test_buffer_pool(self):
+        db = MockDbApi(buffer_pool_size=1 << 20)
+        db.create_table('foo', [Column('id', Column.Type.INT), Column('name', Column.Type.CHAR, 10)], [], [])
+        db.insert_records('foo', [Record.from_dict('foo', {'id': i, 'name': f'n{i}'}) for i in range(3)])
+
+        assert [(i, {'id': i, 'name': f'n{i}'}) for i in range(3)] == db.select_all_records('foo')
+        gets = db.io.gets
+        records = db.select_all_records('foo')
+        assert 1 == db.io.gets - gets  # rec_idx only
+        assert records[0][1] is db.select_all_records('foo')[0][1]
+
+        db.update_records('foo', [(1, Record.from_dict('foo', {'id': 1, 'name': 'updated'}))])
+        db.delete_records('foo', [2])
+        gets = db.io.gets
+        assert [(0, {'id': 0, 'name': 'n0'}), (1, {'id': 1, 'name': 'updated'})] == db.select_all_records('foo')
+        assert 1 + 1 == db.io.gets - gets  # rec_idx and the updated record
+
+        other = MockDbApi()  # other process, without the buffer pool
+        other.db = db.db
+        with other.writing():
+            other.update_records('foo', [(0, Record.from_dict('foo', {'id': 0, 'name': 'other'}))])
+        assert db.data_version != db.db.get(b'_data_version')  # noted since the buffer pool has opened the file
+        with db.reading():
+            assert {'id': 0, 'name': 'other'} == db.select_all_records('foo')[0][1]
+            assert 2 == len(db.buffer_pool)  # read again
+
+        db.drop_table('foo')
+        assert 0 == len(db.buffer_pool)
+
+    def test_data_version(self):
+        db = MockDbApi()
+        db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+        with db.writing():
+            db.insert_record(Record.from_dict('foo', {'id': 0}))
+        assert None is db.db.get(b'_data_version')  # no buffer pool to notice
+
+        pooled = MockDbApi(buffer_pool_size=1 << 20)  # other process, which opens the file later
+        pooled.db = db.db
+        pooled._DbApi__note_buffer_pool()
+        with pooled.reading():
+            assert [(0, {'id': 0})] == pooled.select_all_records('foo')
+
+        with db.writing():  # catalog changed, thus the buffer pool is noticed
+            db.update_records('foo', [(0, Record.from_dict('foo', {'id': 1}))])
+        with pooled.reading():
+            assert [(0, {'id': 1})] == pooled.select_all_records('foo')
+
+    def test_buffer_pool_eviction(self):
+        records = [Record.from_dict('foo', {'id': i}) for i in range(3)]
+        size = BufferPool.estimate_size(records[0])
+        pool = BufferPool(2 * size)
+
+        pool.put(records[0], 0)
+        pool.put(records[1], 1)
+        assert records[0] is pool.get('foo', 0)
+        pool.put(records[2], 2)  # evicts the least recently used
+        assert [records[0], None, records[2]] == [pool.get('foo', i) for i in range(3)]
+        assert (3, 1) == (pool.hits, pool.misses)
+        assert 2 * size == pool.used
+
+        pool.discard('foo', [0, 1])
+        assert (1, size) == (len(pool), pool.used)
+        pool.put(Record.from_dict('foo', {'id': 0, 'name': 'x' * size}), 0)
+        assert None is pool.get('foo', 0)
+
+        assert 0 == len(BufferPool(0)) + BufferPool(0).used
@@ -0,0 +1,85 @@
+from typing import List, Optional, Sequence, Callable
+
+from datatype import Column, Value, date
+from error import InsertTypeMismatchError, InsertColumnNonNullableError, InsertColumnExistenceError
+from util import Bytes
+
+
+class RecordEncoder:
+    """
+    Validator and encoder of the records of a table, compiled for the columns given the values.
+
+    Each column has its own check and encoding of the value, so the values are turned into the record in one pass
+    without looking up the columns. Columns not given are null. The encoded record is the same as the one encoded by
+    Bytes.from_obj.
+    """
+
+    def __init__(self, cols: List[Column], target_col_names: Optional[List[str]] = None):
+        """
+        :param target_col_names: columns given the values, all in order if None
+        :raise InsertColumnExistenceError: no such column
+        """
+
+        col_by_name = {col.name: col for col in cols}
+        if target_col_names is None:
+            target_col_names = [col.name for col in cols]
+
+        for col_name in target_col_names:
+            if col_name not in col_by_name:
+                raise InsertColumnExistenceError(col_name)
+
+        null_cols = [col for col in cols if col.name not in target_col_names]
+        self.encoders = [self.__encoder(col_by_name[col_name]) for col_name in target_col_names]
+        self.nulls = ''.join(f', {Bytes.encoder.encode(col.name)}: null' for col in null_cols)
+        # The first of the not null columns not given, which fails every record.
+        self.non_nullable = next((col.name for col in null_cols if col.null is Column.Null.NOT_NULL), None)
+
+    def encode(self, values: Sequence[Value]) -> bytes:
+        """
+        :raise InsertTypeMismatchError: number of values does not match, or types are not matched
+        :raise InsertColumnNonNullableError: null for the not null column
+        """
+
+        encoders = self.encoders
+        if len(values) != len(encoders):
+            raise InsertTypeMismatchError
+
+        fields = ', '.join([encode(value) for encode, value in zip(encoders, values)])
+        if self.non_nullable is not None:
+            raise InsertColumnNonNullableError(self.non_nullable)
+        return Bytes.from_str('{' + fields + self.nulls + '}')
+
+    @staticmethod
+    def __encoder(col: Column) -> Callable[[Value], str]:
+        """Check and encoding of the value of the column, along with the column name."""
+
+        prefix = f'{Bytes.encoder.encode(col.name)}: '
+        null = prefix + 'null'
+        nullable = col.null is Column.Null.NULL
+        col_name = col.name
+
+        if col.type is Column.Type.INT:
+            def encode(value: Value) -> str:
+                if type(value) is int:
+                    return prefix + repr(value)
+                elif value is None and nullable:
+                    return null
+                raise InsertColumnNonNullableError(col_name) if value is None else InsertTypeMismatchError
+        elif col.type is Column.Type.DATE:
+            def encode(value: Value) -> str:
+                if isinstance(value, date):
+                    return f'{prefix}{{"year": {value.year}, "month": {value.month}, "day": {value.day}}}'
+                elif value is None and nullable:
+                    return null
+                raise InsertColumnNonNullableError(col_name) if value is None else InsertTypeMismatchError
+        else:
+            length, encode_str = col.length, Bytes.encoder.encode
+
+            def encode(value: Value) -> str:
+                if type(value) is str:
+                    return prefix + encode_str(value[:length])  # truncated if longer than the length
+                elif value is None and nullable:
+                    return null
+                raise InsertColumnNonNullableError(col_name) if value is None else InsertTypeMismatchError
+
+        return encode
@@ -0,0 +1,44 @@
+from unittest import TestCase
+
+from datatype import Column, Record, date
+from encoder import RecordEncoder
+from error import InsertTypeMismatchError, InsertColumnNonNullableError, InsertColumnExistenceError
+from util import Bytes, ExpectException
+
+
+class TestRecordEncoder(TestCase):
+    COLS = [Column('id', Column.Type.INT, null=Column.Null.NOT_NULL), Column('name', Column.Type.CHAR, 4),
+            Column('dob', Column.Type.DATE)]
+
+    def test_encode(self):
+        encoder = RecordEncoder(self.COLS)
+        expected = Record.from_dict('foo', {'id': 1, 'name': 'ab"é', 'dob': date(2000, 1, 2)})
+        assert Bytes.from_obj(expected) == encoder.encode([1, 'ab"éxyz', date(2000, 1, 2)])  # truncated
+
+        expected = Record.from_dict('foo', {'id': -3, 'name': None, 'dob': None})
+        assert Bytes.from_obj(expected) == encoder.encode([-3, None, None])
+
+    def test_encode_target(self):
+        encoder = RecordEncoder(self.COLS, ['dob', 'id'])
+        expected = Record.from_dict('foo', {'dob': date(2000, 1, 2), 'id': 1, 'name': None})
+        assert Bytes.from_obj(expected) == encoder.encode([date(2000, 1, 2), 1])
+
+    @ExpectException(InsertTypeMismatchError)
+    def test_type_mismatch(self):
+        RecordEncoder(self.COLS).encode([1, 'a', '2000-01-02'])
+
+    @ExpectException(InsertTypeMismatchError)
+    def test_count_mismatch(self):
+        RecordEncoder(self.COLS, ['id']).encode([1, 'a'])
+
+    @ExpectException(InsertColumnNonNullableError)
+    def test_non_nullable(self):
+        RecordEncoder(self.COLS).encode([None, 'a', None])
+
+    @ExpectException(InsertColumnNonNullableError)
+    def test_non_nullable_not_given(self):
+        RecordEncoder(self.COLS, ['name']).encode(['a'])
+
+    @ExpectException(InsertColumnExistenceError)
+    def test_column_existence(self):
+        RecordEncoder(self.COLS, ['id', 'nothere'])
@@ -36,6 +36,26 @@ class SelectError(SqlSemanticsError, metaclass=ABCMeta):
         return 'Selection has failed: ' + self.msg()
 
 
+class UpdateError(SqlSemanticsError, metaclass=ABCMeta):
+    def __str__(self):
+        return 'Update has failed: ' + self.msg()
+
+
+class ExecuteError(SqlSemanticsError, metaclass=ABCMeta):
+    def __str__(self):
+        return 'Execution has failed: ' + self.msg()
+
+
+class LoadError(SqlSemanticsError, metaclass=ABCMeta):
+    def __str__(self):
+        return 'Load has failed: ' + self.msg()
+
+
+class BackupError(SqlSemanticsError, metaclass=ABCMeta):
+    def __str__(self):
+        return 'Backup has failed: ' + self.msg()
+
+
 class CharLengthError(SqlSemanticsError):
     @staticmethod
     def msg():
@@ -48,6 +68,14 @@ class NoSuchTableError(SqlSemanticsError):
         return 'No such table'
 
 
+class MemoryLimitError(SqlSemanticsError):
+    def __init__(self, limit):
+        self.limit = limit
+
+    def msg(self):
+        return f'Statement has exceeded the memory limit of {self.limit} bytes'
+
+
 class WhereIncomparableError(SqlSemanticsError):
     @staticmethod
     def msg():
@@ -166,3 +194,121 @@ class SelectColumnResolveError(SelectError):
 
     def msg(self):
         return f"fail to resolve '{self.col_name}'"
+
+
+class SelectAggregateTypeError(SelectError):
+    def __init__(self, aggregate):
+        self.aggregate = aggregate
+
+    def msg(self):
+        return f"'{self.aggregate}' is applied to non int column"
+
+
+class SelectGroupByError(SelectError):
+    def __init__(self, col_name):
+        self.col_name = col_name
+
+    def msg(self):
+        return f"'{self.col_name}' is neither grouped nor aggregated"
+
+
+class SelectOrderByError(SelectError):
+    def __init__(self, col_name):
+        self.col_name = col_name
+
+    def msg(self):
+        return f"fail to order by '{self.col_name}'"
+
+
+class SelectLimitError(SelectError):
+    @staticmethod
+    def msg():
+        return 'limit and offset should be non-negative integers'
+
+
+class SelectFormatError(SelectError):
+    def __init__(self, file_format):
+        self.file_format = file_format
+
+    def msg(self):
+        return f"'{self.file_format}' is not a supported format"
+
+
+class SelectFileError(SelectError):
+    def __init__(self, path):
+        self.path = path
+
+    def msg(self):
+        return f"'{self.path}' cannot be written"
+
+
+class UpdateTypeMismatchError(UpdateError):
+    @staticmethod
+    def msg():
+        return 'Types are not matched'
+
+
+class UpdateColumnExistenceError(UpdateError):
+    def __init__(self, col_name):
+        self.col_name = col_name
+
+    def msg(self):
+        return f"'{self.col_name}' does not exist"
+
+
+class UpdateColumnNonNullableError(UpdateError):
+    def __init__(self, col_name):
+        self.col_name = col_name
+
+    def msg(self):
+        return f"'{self.col_name}' is not nullable"
+
+
+class NoSuchPreparedStatementError(ExecuteError):
+    def __init__(self, name):
+        self.name = name
+
+    def msg(self):
+        return f"'{self.name}' is not prepared"
+
+
+class ParameterCountError(ExecuteError):
+    def __init__(self, expected, given):
+        self.expected = expected
+        self.given = given
+
+    def msg(self):
+        return f'{self.expected} parameter(s) expected but {self.given} given'
+
+
+class LoadFormatError(LoadError):
+    def __init__(self, file_format):
+        self.file_format = file_format
+
+    def msg(self):
+        return f"'{self.file_format}' is not a supported format"
+
+
+class LoadFileError(LoadError):
+    def __init__(self, path, reason=None):
+        self.path = path
+        self.reason = reason
+
+    def msg(self):
+        return f"'{self.path}' cannot be read" + (f' ({self.reason})' if self.reason is not None else '')
+
+
+class LoadRejectLimitError(LoadError):
+    def __init__(self, reject_limit):
+        self.reject_limit = reject_limit
+
+    def msg(self):
+        return f'more than {self.reject_limit} row(s) are rejected'
+
+
+class BackupFileError(BackupError):
+    def __init__(self, path):
+        self.path = path
+
+    def msg(self):
+        return f"'{self.path}' cannot be written"
@@ -83,3 +83,69 @@ class TestSemanticsError(TestCase):
     def test_select_column_resolve(self):
         msg = str(SelectColumnResolveError('foo'))
         assert msg == "Selection has failed: fail to resolve 'foo'"
+
+    def test_select_aggregate_type(self):
+        msg = str(SelectAggregateTypeError('sum(foo)'))
+        assert msg == "Selection has failed: 'sum(foo)' is applied to non int column"
+
+    def test_select_group_by(self):
+        msg = str(SelectGroupByError('foo'))
+        assert msg == "Selection has failed: 'foo' is neither grouped nor aggregated"
+
+    def test_select_order_by(self):
+        msg = str(SelectOrderByError('foo'))
+        assert msg == "Selection has failed: fail to order by 'foo'"
+
+    def test_select_limit(self):
+        msg = str(SelectLimitError())
+        assert msg == 'Selection has failed: limit and offset should be non-negative integers'
+
+    def test_select_format(self):
+        msg = str(SelectFormatError('xml'))
+        assert msg == "Selection has failed: 'xml' is not a supported format"
+
+    def test_select_file(self):
+        msg = str(SelectFileError('/foo.csv'))
+        assert msg == "Selection has failed: '/foo.csv' cannot be written"
+
+    def test_update_type_mismatch(self):
+        msg = str(UpdateTypeMismatchError())
+        assert msg == 'Update has failed: Types are not matched'
+
+    def test_update_column_existence(self):
+        msg = str(UpdateColumnExistenceError('foo'))
+        assert msg == "Update has failed: 'foo' does not exist"
+
+    def test_update_column_non_nullable(self):
+        msg = str(UpdateColumnNonNullableError('foo'))
+        assert msg == "Update has failed: 'foo' is not nullable"
+
+    def test_no_such_prepared_statement(self):
+        msg = str(NoSuchPreparedStatementError('foo'))
+        assert msg == "Execution has failed: 'foo' is not prepared"
+
+    def test_parameter_count(self):
+        msg = str(ParameterCountError(2, 1))
+        assert msg == 'Execution has failed: 2 parameter(s) expected but 1 given'
+
+    def test_load_format(self):
+        msg = str(LoadFormatError('xml'))
+        assert msg == "Load has failed: 'xml' is not a supported format"
+
+    def test_load_file(self):
+        msg = str(LoadFileError('foo.csv'))
+        assert msg == "Load has failed: 'foo.csv' cannot be read"
+        msg = str(LoadFileError('foo.csv', 'not in UTF-8'))
+        assert msg == "Load has failed: 'foo.csv' cannot be read (not in UTF-8)"
+
+    def test_load_reject_limit(self):
+        msg = str(LoadRejectLimitError(10))
+        assert msg == 'Load has failed: more than 10 row(s) are rejected'
+
+    def test_memory_limit(self):
+        msg = str(MemoryLimitError(1024))
+        assert msg == 'Statement has exceeded the memory limit of 1024 bytes'
+
+    def test_backup_file(self):
+        msg = str(BackupFileError('myDB.db'))
+        assert msg == "Backup has failed: 'myDB.db' cannot be written"
@@ -0,0 +1,938 @@
+import csv
+import heapq
+import multiprocessing
+import multiprocessing.util
+import pickle
+import sys
+from abc import ABCMeta, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain, islice
+from tempfile import TemporaryFile
+from time import perf_counter
+from typing import Iterator, List, Optional, Callable, Iterable, Union, Dict, Tuple, Type
+
+from datatype import Row, Predicate, TableColumn, Value, Aggregate, date, boolean
+from db import DbApi, IoStats
+from error import NoSuchTableError, SelectColumnResolveError, WhereTableNotSpecified, WhereColumnNotExist, \
+    WhereAmbiguousReference, SelectLimitError, SqlSemanticsError, LoadFileError, LoadRejectLimitError, MemoryLimitError
+from expression import Condition
+
+
+####################################################################################################
+# Operator
+####################################################################################################
+
+class OperatorStats:
+    """Runtime statistics of an operator. Time and I/O include those of the children."""
+
+    __slots__ = 'time', 'rows_out', 'io'
+
+    def __init__(self):
+        self.time = 0.0
+        self.rows_out = 0
+        self.io = IoStats()
+
+
+def estimate_size(row: Union[Row, List[Value]]) -> int:
+    """Estimated bytes of the row, which are of the values and the containers holding them."""
+
+    getsizeof = sys.getsizeof
+    if isinstance(row, dict):
+        return getsizeof(row) + sum(getsizeof(values) + sum(map(getsizeof, values.values())) for values in row.values())
+    return getsizeof(row) + sum(map(getsizeof, row))
+
+
+class MemoryBudget:
+    """
+    Estimated bytes of the rows held by the operators of a statement, which must stay within the limit.
+
+    Operators charge the rows they keep and release them once dropped. The ones able to spill, do so rather than
+    exceed the limit. Rows are estimated only if tracking, which is when the limit is set or the plan is profiled.
+    """
+
+    __slots__ = 'limit', 'tracking', 'used', 'peak'
+
+    def __init__(self, limit: Optional[int] = None):
+        """:param limit: in bytes, unlimited if None"""
+
+        self.limit = limit
+        self.tracking = limit is not None
+        self.used = 0
+        self.peak = 0
+
+    def reset(self):
+        self.used = 0
+        self.peak = 0
+
+    def fits(self, size: int) -> bool:
+        return self.limit is None or self.used + size <= self.limit
+
+    def charge(self, size: int):
+        """:raise MemoryLimitError: the limit is exceeded"""
+
+        self.used += size
+        if self.used > self.peak:
+            self.peak = self.used
+        if self.limit is not None and self.used > self.limit:
+            raise MemoryLimitError(self.limit)
+
+    def release(self, size: int):
+        self.used -= size
+
+
+class Operator(metaclass=ABCMeta):
+    """
+    Physical operator.
+
+    Iterating the operator pulls the rows from its children, one at a time.
+    Statistics are collected only if profiling is enabled.
+    """
+
+    # Number of the records read, only by the scans. Reset by the plan on each execution, thus it adds up the passes.
+    scanned = 0
+
+    def __init__(self, *children: 'Operator'):
+        self.children = children
+        self.stats: Optional[OperatorStats] = None
+        self.io: Optional[IoStats] = None
+
+    def __iter__(self) -> Iterator:
+        if self.stats is None:
+            return self.rows()
+        else:
+            return self.__profile(self.rows())
+
+    @abstractmethod
+    def rows(self) -> Iterator:
+        """Produce the rows."""
+
+    @abstractmethod
+    def __str__(self):
+        pass
+
+    def profile(self, io: IoStats):
+        """Enable profiling of the operator tree. Statistics are reset."""
+
+        self.stats = OperatorStats()
+        self.io = io
+        for child in self.children:
+            child.profile(io)
+
+    def rows_in(self) -> int:
+        return sum(child.stats.rows_out for child in self.children)
+
+    def __profile(self, rows: Iterator) -> Iterator:
+        stats, io = self.stats, self.io
+        while True:
+            before = io.copy()
+            start = perf_counter()
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            finally:
+                stats.time += perf_counter() - start
+                stats.io = stats.io + (io - before)
+
+            stats.rows_out += 1
+            yield row
+
+
+class Scan(Operator):
+    """Read every record of the table in record index order. Records are read as the rows are pulled."""
+
+    def __init__(self, db: DbApi, table_name: str):
+        super().__init__()
+        self.db = db
+        self.table_name = table_name
+
+    def rows(self) -> Iterator[Row]:
+        records = self.db.iter_records(self.table_name)
+        if records is None:  # table existence check
+            raise NoSuchTableError
+
+        for idx, record in records:
+            self.scanned += 1
+            yield Row.from_record(record, idx)
+
+    def __str__(self):
+        return f'Scan {self.table_name}'
+
+
+def scan_partition(db: DbApi, table_name: str, rec_idx: List[int], predicate: Optional[Predicate],
+                   table_columns: Optional[List[TableColumn]]) -> Iterator:
+    """
+    Read, filter and project the records of the partition.
+
+    :return: the rows, or the values of the columns if they are given
+    """
+
+    rows = (Row.from_record(record, idx) for idx, record in db.iter_records(table_name, rec_idx))
+    if predicate is not None:
+        rows = filter(predicate, rows)
+    return rows if table_columns is None else Project.project(rows, table_columns)
+
+
+# Database and the scan of the worker process.
+_worker: Optional[tuple] = None
+
+
+def _init_worker(filename: str, table_name: str, predicate: Optional[Predicate],
+                 table_columns: Optional[List[TableColumn]]):
+    global _worker
+    _worker = (DbApi(filename, read_only=True), table_name, predicate, table_columns)
+    # forked workers skip atexit, but run the finalizers of multiprocessing
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=0)
+
+
+def _close_worker():
+    global _worker
+    _worker = None  # closes the database
+
+
+def _scan_partition(rec_idx: List[int]) -> list:
+    db, table_name, predicate, table_columns = _worker
+    return list(scan_partition(db, table_name, rec_idx, predicate, table_columns))
+
+
+class ParallelScan(Operator):
+    """
+    Read, filter and project the records of the table in worker processes.
+
+    The record index is split into partitions, and each worker opens the database read-only and sends back the rows
+    of a partition at once. Workers are forked, so that they inherit the predicate. Partitions are merged in the
+    record index order if ordered, otherwise as they are done. The workers live for one scan, which waits for them
+    to exit, even when it is stopped early.
+
+    Tables smaller than the threshold are scanned in this process.
+    """
+
+    # Number of records of a partition.
+    PARTITION_SIZE = 4096
+
+    def __init__(self, db: DbApi, table_name: str, predicate: Union[Predicate, Condition, None],
+                 table_columns: Optional[List[TableColumn]], workers: int, threshold: int, ordered: bool = True):
+        """
+        :param predicate: folded before the scan, which is skipped if it is always false
+        :param table_columns: columns to project, or None to produce the rows
+        """
+
+        super().__init__()
+        self.db = db
+        self.table_name = table_name
+        self.predicate = predicate
+        self.table_columns = table_columns
+        self.workers = workers
+        self.threshold = threshold
+        self.ordered = ordered
+
+    def rows(self) -> Iterator:
+        table_name, predicate, table_columns = self.table_name, self.predicate, self.table_columns
+        if isinstance(predicate, Condition):
+            predicate = predicate.fold()
+            if predicate is boolean.false:
+                return
+            elif predicate is boolean.true:
+                predicate = None
+
+        rec_idx = self.db.rec_idx(table_name)
+        if rec_idx is None:  # table existence check
+            raise NoSuchTableError
+
+        if self.workers <= 1 or len(rec_idx) < self.threshold or \
+                'fork' not in multiprocessing.get_all_start_methods():
+            yield from scan_partition(self.db, table_name, self.__count(rec_idx), predicate, table_columns)
+            return
+
+        partitions = [rec_idx[i:i + self.PARTITION_SIZE] for i in range(0, len(rec_idx), self.PARTITION_SIZE)]
+        pool = ProcessPoolExecutor(self.workers, multiprocessing.get_context('fork'), _init_worker,
+                                   (self.db.filename, table_name, predicate, table_columns))
+        try:
+            if self.ordered:
+                batches = pool.map(_scan_partition, partitions)
+            else:
+                batches = (future.result() for future in
+                           as_completed([pool.submit(_scan_partition, partition) for partition in partitions]))
+
+            for partition, batch in zip(partitions, batches):
+                self.scanned += len(partition)
+                yield from batch
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)  # stopped by a limit, waits for the running partitions
+
+    def __count(self, rec_idx: List[int]) -> Iterator[int]:
+        for idx in rec_idx:
+            self.scanned += 1
+            yield idx
+
+    def __str__(self):
+        return f'ParallelScan {self.table_name} (workers={self.workers})'
+
+
+class NestedLoopJoin(Operator):
+    """
+    Join every row of the left with every row of the right.
+
+    The right is read once, along with the first row of the left, and kept for the rest. If it does not fit in the
+    memory budget, it is read again for each row of the left instead. Neither is read further than the rows pulled,
+    thus a limit stops both of them.
+    """
+
+    def __init__(self, left: Operator, right: Operator, budget: Optional[MemoryBudget] = None):
+        super().__init__(left, right)
+        self.budget = budget
+
+    def rows(self) -> Iterator[Row]:
+        left, right = self.children
+        budget = self.budget if self.budget is not None and self.budget.tracking else None
+        right_rows: Optional[List[Row]] = None  # kept on the first pass, unless it does not fit
+        first, held = True, 0
+        try:
+            for left_row in left:
+                if first:
+                    first, right_rows = False, []
+                    for right_row in right:
+                        if right_rows is not None and budget is not None:
+                            size = estimate_size(right_row)
+                            if budget.fits(size):
+                                budget.charge(size)
+                                held += size
+                            else:  # read again instead
+                                budget.release(held)
+                                right_rows, held = None, 0
+
+                        if right_rows is not None:
+                            right_rows.append(right_row)
+                        yield Row.merge(left_row, right_row)
+                else:
+                    for right_row in right_rows if right_rows is not None else right:
+                        yield Row.merge(left_row, right_row)
+        finally:
+            if budget is not None:
+                budget.release(held)
+
+    def __str__(self):
+        return 'NestedLoopJoin'
+
+
+class Filter(Operator):
+    """
+    Pass the rows satisfying the predicate.
+
+    The condition of a where clause is folded once the execution starts. If it does not depend on the row, all of the
+    rows are passed or none of them is pulled, thus the child is not even read.
+    """
+
+    def __init__(self, child: Operator, predicate: Union[Predicate, Condition]):
+        super().__init__(child)
+        self.predicate = predicate
+
+    def rows(self) -> Iterator[Row]:
+        predicate = self.predicate
+        if isinstance(predicate, Condition):
+            predicate = predicate.fold()
+            if isinstance(predicate, boolean):
+                return iter(self.children[0]) if predicate is boolean.true else iter(())
+        return filter(predicate, self.children[0])
+
+    def __str__(self):
+        return 'Filter'
+
+
+class Project(Operator):
+    """Select the column values of the rows."""
+
+    def __init__(self, child: Operator, table_columns: List[TableColumn]):
+        super().__init__(child)
+        self.table_columns = table_columns
+
+    def rows(self) -> Iterator[List[Value]]:
+        return self.project(self.children[0], self.table_columns)
+
+    @staticmethod
+    def project(rows: Iterable[Row], table_columns: List[TableColumn]) -> Iterator[List[Value]]:
+        for row in rows:
+            row_values = []
+            for table_column in table_columns:
+                try:
+                    value = row.search(table_column)
+                except (WhereTableNotSpecified, WhereColumnNotExist, WhereAmbiguousReference):
+                    raise SelectColumnResolveError(table_column)
+
+                row_values.append(value)
+
+            yield row_values
+
+    def __str__(self):
+        return f"Project [{', '.join(str(table_column) for table_column in self.table_columns)}]"
+
+
+class HashAggregate(Operator):
+    """
+    Group the rows by the grouping columns in a hash table, and aggregate each group.
+
+    Aggregates ignore nulls and they are null if there is nothing to aggregate, except count which is 0.
+    Without grouping columns, there is exactly one group even if there is no row.
+    """
+
+    def __init__(self, child: Operator, group_by: List[TableColumn], outputs: List[Union[int, Aggregate]],
+                 budget: Optional[MemoryBudget] = None):
+        """
+        :param group_by: grouping columns
+        :param outputs: output columns, each is either the index of the grouping column or the aggregate
+        :param budget: charged for the groups, which are never spilled
+        """
+
+        super().__init__(child)
+        self.group_by = group_by
+        self.outputs = outputs
+        self.budget = budget
+
+    def rows(self) -> Iterator[List[Value]]:
+        group_by = self.group_by
+        aggregates = [output for output in self.outputs if isinstance(output, Aggregate)]
+
+        # Group key -> (grouping column values, [aggregated value, number of aggregated values] of each aggregate)
+        groups: Dict[tuple, Tuple[List[Value], List[list]]] = dict()
+        if len(group_by) == 0:
+            groups[()] = ([], [[None, 0] for _ in aggregates])
+
+        budget = self.budget if self.budget is not None and self.budget.tracking else None
+        held = 0
+        try:
+            for row in self.children[0]:
+                values = [row.search(table_column) for table_column in group_by]
+                key = tuple(str(value) if isinstance(value, date) else value for value in values)  # date is unhashable
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = (values, [[None, 0] for _ in aggregates])
+                    if budget is not None:
+                        size = 2 * estimate_size(values) + sum(map(estimate_size, group[1]))  # key and values
+                        budget.charge(size)
+                        held += size
+
+                for aggregate, acc in zip(aggregates, group[1]):
+                    self.__accumulate(aggregate, acc, row)
+
+            for values, accs in groups.values():
+                results = iter([self.__result(aggregate, acc) for aggregate, acc in zip(aggregates, accs)])
+                yield [values[output] if isinstance(output, int) else next(results) for output in self.outputs]
+        finally:
+            if budget is not None:
+                budget.release(held)
+
+    @staticmethod
+    def __accumulate(aggregate: Aggregate, acc: list, row: Row):
+        if aggregate.table_column is None:  # count(*)
+            acc[1] += 1
+            return
+
+        value = row.search(aggregate.table_column)
+        if value is None:
+            return
+
+        function = aggregate.function
+        if acc[1] == 0:
+            acc[0] = value
+        elif function is Aggregate.Function.SUM or function is Aggregate.Function.AVG:
+            acc[0] += value
+        elif function is Aggregate.Function.MIN:
+            if value < acc[0]:
+                acc[0] = value
+        elif function is Aggregate.Function.MAX:
+            if value > acc[0]:
+                acc[0] = value
+
+        acc[1] += 1
+
+    @staticmethod
+    def __result(aggregate: Aggregate, acc: list) -> Value:
+        if aggregate.function is Aggregate.Function.COUNT:
+            return acc[1]
+        elif acc[1] == 0:
+            return None
+        elif aggregate.function is Aggregate.Function.AVG:
+            return acc[0] / acc[1]
+        else:
+            return acc[0]
+
+    def __str__(self):
+        group_by = ', '.join(str(table_column) for table_column in self.group_by)
+        outputs = ', '.join(str(self.group_by[output]) if isinstance(output, int) else str(output)
+                            for output in self.outputs)
+        return f'HashAggregate [{outputs}] group by [{group_by}]'
+
+
+class CountRecords(Operator):
+    """Count the records of the table from the record index, without reading the records."""
+
+    def __init__(self, db: DbApi, table_name: str, num_cols: int):
+        super().__init__()
+        self.db = db
+        self.table_name = table_name
+        self.num_cols = num_cols
+
+    def rows(self) -> Iterator[List[int]]:
+        yield [self.db.count_records(self.table_name)] * self.num_cols
+
+    def __str__(self):
+        return f'CountRecords {self.table_name}'
+
+
+class Descending:
+    """Sort key component reversing the order of the value."""
+
+    __slots__ = 'value'
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def sort_key(values: List[Value], keys: List[Tuple[int, bool]]) -> tuple:
+    """
+    Key of the row values, ordered as the comparison operators do. Null is larger than any value.
+
+    :param keys: index of the value and whether it is descending, in order of precedence
+    """
+
+    key = []
+    for idx, descending in keys:
+        value = values[idx]
+        if value is None:
+            key.append((0,) if descending else (1,))
+            continue
+
+        if isinstance(value, date):
+            value = (value.year, value.month, value.day)
+        if descending:
+            if isinstance(value, (int, float)):
+                value = -value
+            elif isinstance(value, tuple):
+                value = tuple(-field for field in value)
+            else:
+                value = Descending(value)
+        key.append((1, value) if descending else (0, value))
+
+    return tuple(key)
+
+
+class Sort(Operator):
+    """
+    Sort the row values by the keys. The sort is stable.
+
+    If only the first rows are needed, they are kept in a bounded heap, or within the memory budget if it is tracked,
+    falling back to the external sort if they do not fit. Otherwise, the rows are sorted in runs of bounded size, which
+    are spilled to temporary files and merged if there are more than one. A run also ends early when it does not fit
+    in the memory budget.
+    """
+
+    # Number of rows sorted in memory at once.
+    BUFFER_ROWS = 65536
+
+    def __init__(self, child: Operator, keys: List[Tuple[int, bool]], width: Optional[int],
+                 top: Callable[[], Optional[int]], budget: Optional[MemoryBudget] = None):
+        """
+        :param keys: index of the value and whether it is descending, in order of precedence
+        :param width: number of the leading values produced, which drops the values only for sorting; all if None
+        :param top: number of the first rows needed, resolved once per execution; all if None
+        """
+
+        super().__init__(child)
+        self.keys = keys
+        self.width = width
+        self.top = top
+        self.budget = budget
+
+    def rows(self) -> Iterator[List[Value]]:
+        keys, width = self.keys, self.width
+
+        def key(values: List[Value]) -> tuple:
+            return sort_key(values, keys)
+
+        top = self.top()
+        budget = self.budget if self.budget is not None and self.budget.tracking else None
+        if top is not None and top <= self.BUFFER_ROWS:
+            if budget is None:
+                rows = iter(heapq.nsmallest(top, self.children[0], key=key))
+            else:
+                rows = self.__top(iter(self.children[0]), top, key, budget)
+        else:
+            rows = self.__external_sort(self.children[0], key, budget)
+
+        if width is None:
+            yield from rows
+        else:
+            for values in rows:
+                yield values[:width]
+
+    def __top(self, rows: Iterator[List[Value]], top: int, key: Callable[[List[Value]], tuple],
+              budget: MemoryBudget) -> Iterator[List[Value]]:
+        """
+        First rows, kept up to twice the number and cut back to it by a stable sort, charged to the budget. If the rows
+        kept do not fit even after the cut, they are sorted externally along with the rest.
+        """
+
+        kept: List[Tuple[List[Value], int]] = []  # values and their estimated size
+        held = 0
+
+        def cut():
+            nonlocal held
+            kept.sort(key=lambda pair: key(pair[0]))
+            dropped = sum(size for _, size in kept[top:])
+            del kept[top:]
+            budget.release(dropped)
+            held -= dropped
+
+        try:
+            for values in rows:
+                size = estimate_size(values)
+                if len(kept) >= 2 * top or not budget.fits(size):
+                    cut()
+                    if not budget.fits(size):
+                        budget.release(held)
+                        held = 0
+                        spilled = [values for values, _ in kept]
+                        kept.clear()
+                        # ties keep the order, as the rows kept came before the rest
+                        yield from islice(self.__external_sort(chain(spilled, [values], rows), key, budget), top)
+                        return
+
+                budget.charge(size)
+                held += size
+                kept.append((values, size))
+
+            cut()
+            for values, _ in kept:
+                yield values
+        finally:
+            budget.release(held)
+
+    def __external_sort(self, rows: Iterable[List[Value]], key: Callable[[List[Value]], tuple],
+                        budget: Optional[MemoryBudget]) -> Iterator[List[Value]]:
+        files = []
+        try:
+            for run, held, last in self.__runs(rows, key, budget):
+                try:
+                    if last and len(files) == 0:  # fits in memory
+                        yield from run
+                        return
+
+                    if len(run) != 0:
+                        file = TemporaryFile()
+                        files.append(file)
+                        pickler = pickle.Pickler(file, pickle.HIGHEST_PROTOCOL)
+                        for values in run:
+                            pickler.dump(values)
+                        file.seek(0)
+                finally:
+                    if budget is not None:
+                        budget.release(held)
+
+            # Ties are taken from the earlier run, thus the merge is stable as well.
+            yield from heapq.merge(*(self.__read_run(file) for file in files), key=key)
+        finally:
+            for file in files:
+                file.close()
+
+    def __runs(self, rows: Iterable[List[Value]], key: Callable[[List[Value]], tuple], budget: Optional[MemoryBudget]) \
+            -> Iterator[Tuple[List[List[Value]], int, bool]]:
+        """
+        Sorted runs of the rows, each within the buffer rows and the memory budget.
+
+        :return: each run, the bytes charged for it which must be released before the next, and whether it is the last
+        """
+
+        run, held = [], 0
+        for values in rows:
+            size = estimate_size(values) if budget is not None else 0
+            if len(run) == self.BUFFER_ROWS or (len(run) != 0 and budget is not None and not budget.fits(size)):
+                run.sort(key=key)
+                yield run, held, False
+                run, held = [], 0
+
+            if budget is not None:
+                budget.charge(size)  # exceeds only if a single row does not fit
+                held += size
+            run.append(values)
+
+        run.sort(key=key)
+        yield run, held, True
+
+    @staticmethod
+    def __read_run(file) -> Iterator[List[Value]]:
+        unpickler = pickle.Unpickler(file)
+        while True:
+            try:
+                yield unpickler.load()
+            except EOFError:
+                return
+
+    def __str__(self):
+        keys = ', '.join(f"{idx}{' desc' if descending else ''}" for idx, descending in self.keys)
+        return f'Sort [{keys}]'
+
+
+class Limit(Operator):
+    """Skip the rows of the offset and pass the rows up to the limit. The child stops once the limit is reached."""
+
+    def __init__(self, child: Operator, bounds: Callable[[], Tuple[Optional[int], int]]):
+        """:param bounds: limit and offset, resolved once per execution; no limit if None"""
+
+        super().__init__(child)
+        self.bounds = bounds
+
+    def rows(self) -> Iterator:
+        limit, offset = self.bounds()
+        if any(not isinstance(bound, int) or bound < 0 for bound in (limit or 0, offset)):
+            raise SelectLimitError
+
+        return islice(self.children[0], offset, None if limit is None else offset + limit)
+
+    def __str__(self):
+        return 'Limit'
+
+
+class ReadCsv(Operator):
+    """Read the fields of each line of the file, streamed. The file must be in UTF-8."""
+
+    def __init__(self, path: str, dialect: Type[csv.Dialect], header: bool):
+        """:param header: skip the first line"""
+
+        super().__init__()
+        self.path = path
+        self.dialect = dialect
+        self.header = header
+
+    def rows(self) -> Iterator[List[str]]:
+        try:
+            file = open(self.path, newline='', encoding='utf-8')
+        except OSError:
+            raise LoadFileError(self.path)
+
+        with file:
+            reader = csv.reader(file, self.dialect)
+            try:
+                if self.header:
+                    next(reader, None)
+                yield from reader
+            except csv.Error as e:  # malformed, such as a NUL byte or an oversized field
+                raise LoadFileError(self.path, f'line {reader.line_num}: {e}')
+            except UnicodeDecodeError:  # decoded in chunks, thus the line is not known
+                raise LoadFileError(self.path, 'not in UTF-8')
+
+    def __str__(self):
+        return f'ReadCsv {self.path}'
+
+
+class Convert(Operator):
+    """
+    Convert the values into the encoded records. Rows failing to convert are rejected, up to the limit.
+
+    Rejected rows are reported by their ordinal numbers, from 1.
+    """
+
+    def __init__(self, child: Operator, convert: Callable[[list], bytes], reject_limit: int,
+                 on_reject: Callable[[int, SqlSemanticsError], None]):
+        super().__init__(child)
+        self.convert = convert
+        self.reject_limit = reject_limit
+        self.on_reject = on_reject
+        self.num_rejected = 0
+
+    def rows(self) -> Iterator[bytes]:
+        convert = self.convert
+        self.num_rejected = 0
+        for row_number, values in enumerate(self.children[0], 1):
+            try:
+                yield convert(values)
+            except SqlSemanticsError as e:
+                self.num_rejected += 1
+                self.on_reject(row_number, e)
+                if self.num_rejected > self.reject_limit:
+                    raise LoadRejectLimitError(self.reject_limit)
+
+    def __str__(self):
+        return 'Convert'
+
+
+class Encode(Operator):
+    """Validate and encode the values into the records. Unlike Convert, the first of the invalid values fails."""
+
+    def __init__(self, child: Operator, encode: Callable[[List[Value]], bytes]):
+        super().__init__(child)
+        self.encode = encode
+
+    def rows(self) -> Iterator[bytes]:
+        return map(self.encode, self.children[0])
+
+    def __str__(self):
+        return 'Encode'
+
+
+class BulkInsert(Operator):
+    """
+    Insert the encoded records in batches. It produces the number of inserted records.
+
+    Records are written in batches, but they are added to the record index once after the last batch, so they
+    become visible at once. If it fails in the middle, the records written are discarded. Database is synced once at
+    the end.
+    """
+
+    # Number of records written at once.
+    BATCH_SIZE = 10000
+
+    def __init__(self, child: Operator, db: DbApi, table_name: str):
+        super().__init__(child)
+        self.db = db
+        self.table_name = table_name
+
+    def rows(self) -> Iterator[int]:
+        db, table_name = self.db, self.table_name
+
+        rec_idx = []
+        try:
+            batch = []
+            for encoded in self.children[0]:
+                batch.append(encoded)
+                if len(batch) == self.BATCH_SIZE:
+                    rec_idx.extend(db.write_encoded(table_name, batch))
+                    batch = []
+            rec_idx.extend(db.write_encoded(table_name, batch))
+        except BaseException:
+            db.discard_records(table_name, rec_idx)
+            raise
+
+        db.index_records(table_name, rec_idx)
+        db.sync()
+        yield len(rec_idx)
+
+    def __str__(self):
+        return f'BulkInsert {self.table_name}'
+
+
+class Delete(Operator):
+    """Delete the records of the rows at once. It produces the number of deleted records."""
+
+    def __init__(self, child: Operator, db: DbApi, table_name: str):
+        super().__init__(child)
+        self.db = db
+        self.table_name = table_name
+
+    def rows(self) -> Iterator[int]:
+        idx_to_delete = [row.rec_idx for row in self.children[0]]
+        self.db.delete_records(self.table_name, idx_to_delete)
+        yield len(idx_to_delete)
+
+    def __str__(self):
+        return f'Delete {self.table_name}'
+
+
+class Update(Operator):
+    """
+    Overwrite the column of the records of the rows in place, in batches.
+
+    Records which already have the value are not written. It produces the number of updated records.
+    """
+
+    # Number of records written at once.
+    BATCH_SIZE = 1024
+
+    def __init__(self, child: Operator, db: DbApi, table_name: str, col_name: str, value: Callable[[], Value]):
+        super().__init__(child)
+        self.db = db
+        self.table_name = table_name
+        self.col_name = col_name
+        self.value = value  # resolved once per execution
+
+    def rows(self) -> Iterator[int]:
+        table_name, col_name, value = self.table_name, self.col_name, self.value()
+
+        num_updated = 0
+        batch = []
+        for row in self.children[0]:
+            num_updated += 1
+            record = row.to_record(table_name)
+            old_value = record[col_name]
+            if type(old_value) is type(value) and old_value == value:  # nothing to write
+                continue
+
+            record[col_name] = value
+            batch.append((row.rec_idx, record))
+            if len(batch) == self.BATCH_SIZE:
+                self.db.update_records(table_name, batch)
+                batch = []
+
+        self.db.update_records(table_name, batch)
+        yield num_updated
+
+    def __str__(self):
+        return f'Update {self.table_name}.{self.col_name}'
+
+
+####################################################################################################
+# Plan
+####################################################################################################
+
+class QueryPlan:
+    """Operator tree and the output of the rows produced by it, which returns the number of the rows if it counts."""
+
+    __slots__ = 'root', 'output', 'rows_out'
+
+    def __init__(self, root: Operator, output: Callable[[Iterable], Optional[int]]):
+        self.root = root
+        self.output = output
+        self.rows_out: Optional[int] = None  # of the last execution
+
+    def __call__(self):
+        def reset(operator: Operator):
+            operator.scanned = 0
+            for child in operator.children:
+                reset(child)
+
+        reset(self.root)
+        self.rows_out = self.output(self.root)
+
+    def rows_scanned(self) -> int:
+        """Number of the records read by the scans of the last execution, each time the scan is read again."""
+
+        def scanned(operator: Operator) -> int:
+            return operator.scanned + sum(scanned(child) for child in operator.children)
+
+        return scanned(self.root)
+
+    def profile(self, io: IoStats) -> float:
+        """
+        Execute the plan with profiling enabled.
+
+        :return: elapsed time in seconds
+        """
+
+        self.root.profile(io)
+        start = perf_counter()
+        self()
+        return perf_counter() - start
+
+    def explain(self) -> List[str]:
+        """Describe the operator tree with the statistics, one line per operator."""
+
+        lines = []
+
+        def describe(operator: Operator, depth: int):
+            line = '  ' * depth + str(operator)
+            stats = operator.stats
+            if stats is not None:
+                line += f' (time={stats.time * 1000:.3f}ms rows_in={operator.rows_in()} rows_out={stats.rows_out}' \
+                        f' gets={stats.io.gets} puts={stats.io.puts} bytes_read={stats.io.bytes_read})'
+            lines.append(line)
+
+            for child in operator.children:
+                describe(child, depth + 1)
+
+        describe(self.root, 0)
+        return lines
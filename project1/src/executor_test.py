@@ -0,0 +1,273 @@
+import csv
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from datatype import Column, Record, TableColumn, boolean, Aggregate, date, Row, CompOp, Params
+from db import DbApi
+from db_test import MockDbApi
+from encoder import RecordEncoder
+from error import InsertTypeMismatchError, LoadRejectLimitError, MemoryLimitError, WhereColumnNotExist, \
+    LoadFileError
+from executor import Scan, NestedLoopJoin, Filter, Project, Delete, Update, QueryPlan, HashAggregate, CountRecords, \
+    Sort, Limit, Operator, ParallelScan, ReadCsv, Convert, Encode, BulkInsert, MemoryBudget, estimate_size
+from expression import Condition, And, Or, Comparison, IsNull
+from util import ExpectException, Bytes
+
+
+class TestExecutor(TestCase):
+    def setUp(self):
+        self.db = MockDbApi()
+        self.db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+        self.db.create_table('bar', [Column('name', Column.Type.CHAR, 10)], [], [])
+        for i in range(3):
+            self.db.insert_record(Record.from_dict('foo', {'id': i}))
+        for name in ['a', 'b']:
+            self.db.insert_record(Record.from_dict('bar', {'name': name}))
+
+    def test_scan(self):
+        rows = list(Scan(self.db, 'foo'))
+        assert [{'id': {'foo': i}} for i in range(3)] == rows
+        assert [0, 1, 2] == [row.rec_idx for row in rows]
+
+    def test_join(self):
+        root = Project(NestedLoopJoin(Scan(self.db, 'foo'), Scan(self.db, 'bar')),
+                       [TableColumn('id'), TableColumn('name', 'bar')])
+        assert [[0, 'a'], [0, 'b'], [1, 'a'], [1, 'b'], [2, 'a'], [2, 'b']] == list(root)
+
+    def test_delete(self):
+        root = Delete(Filter(Scan(self.db, 'foo'), lambda row: boolean(row['id']['foo'] != 1)), self.db, 'foo')
+        assert [2] == list(root)
+        assert [1] == self.db.rec_idx('foo')
+
+    def test_profile(self):
+        output = []
+        plan = QueryPlan(Filter(Scan(self.db, 'foo'), lambda row: boolean(row['id']['foo'] > 0)), output.extend)
+        plan.profile(self.db.io)
+        assert 2 == len(output)
+
+        scan = plan.root.children[0]
+        assert (3, 2) == (plan.root.rows_in(), plan.root.stats.rows_out)
+        assert (0, 3) == (scan.rows_in(), scan.stats.rows_out)
+        assert 4 == scan.stats.io.gets  # rec_idx and 3 records
+        assert ['Filter', 'Scan foo'] == [line.split(' (')[0].strip() for line in plan.explain()]
+
+    def test_update(self):
+        root = Update(Filter(Scan(self.db, 'foo'), lambda row: boolean(row['id']['foo'] != 1)), self.db, 'foo', 'id',
+                      lambda: 1)
+        assert [2] == list(root)
+        assert [(0, {'id': 1}), (1, {'id': 1}), (2, {'id': 1})] == self.db.select_all_records('foo')
+
+    def test_hash_aggregate(self):
+        self.db.insert_record(Record.from_dict('foo', {'id': None}))
+        self.db.insert_record(Record.from_dict('foo', {'id': 1}))
+        count_star = Aggregate(Aggregate.Function.COUNT)
+        count, sum_, avg, min_, max_ = (Aggregate(function, TableColumn('id')) for function in (
+            Aggregate.Function.COUNT, Aggregate.Function.SUM, Aggregate.Function.AVG, Aggregate.Function.MIN,
+            Aggregate.Function.MAX))
+
+        root = HashAggregate(Scan(self.db, 'foo'), [], [count_star, count, sum_, avg, min_, max_])
+        assert [[5, 4, 4, 1.0, 0, 2]] == list(root)
+
+        root = HashAggregate(Scan(self.db, 'foo'), [TableColumn('id')], [0, count_star, count])
+        assert [[0, 1, 1], [1, 2, 2], [2, 1, 1], [None, 1, 0]] == list(root)
+
+    def test_hash_aggregate_empty(self):
+        empty = Filter(Scan(self.db, 'foo'), lambda row: boolean.false)
+        sum_ = Aggregate(Aggregate.Function.SUM, TableColumn('id'))
+        assert [[0, None]] == list(HashAggregate(empty, [], [Aggregate(Aggregate.Function.COUNT), sum_]))
+
+        empty = Filter(Scan(self.db, 'foo'), lambda row: boolean.false)
+        assert [] == list(HashAggregate(empty, [TableColumn('id')], [0, sum_]))
+
+    def test_count_records(self):
+        gets = self.db.io.gets
+        assert [[3, 3]] == list(CountRecords(self.db, 'foo', 2))
+        assert 1 == self.db.io.gets - gets  # no record is read
+
+    def test_sort(self):
+        rows = [[1, 'b', None], [None, 'a', date(2023, 1, 2)], [2, 'b', date(2022, 12, 31)], [0, None, None]]
+        sort = Sort(ListOperator(rows), [(1, True), (0, False)], None, lambda: None)
+        assert [[0, None, None], [1, 'b', None], [2, 'b', date(2022, 12, 31)], [None, 'a', date(2023, 1, 2)]] == \
+               list(sort)
+
+        sort = Sort(ListOperator(rows), [(2, False)], 1, lambda: 2)
+        assert [[2], [None]] == list(sort)
+
+    def test_sort_external(self):
+        rows = [[i % 7, i] for i in range(100)]
+        sort = Sort(ListOperator(rows), [(0, True)], None, lambda: None)
+        sort.BUFFER_ROWS = 16  # spill 7 runs
+        assert sorted(rows, key=lambda row: -row[0]) == list(sort)
+
+    def test_sort_budget(self):
+        rows = [[i % 7, i] for i in range(100)]
+        budget = MemoryBudget(4 * estimate_size(rows[0]))
+        sort = Sort(ListOperator(rows), [(0, True)], None, lambda: None, budget)
+        assert sorted(rows, key=lambda row: -row[0]) == list(sort)  # spills every 4 rows
+        assert (0, 4 * estimate_size(rows[0])) == (budget.used, budget.peak)
+
+    def test_sort_top_budget(self):
+        rows = [[i % 7, i] for i in range(100)]
+        size = estimate_size(rows[0])
+        budget = MemoryBudget(20 * size)
+        sort = Sort(ListOperator(rows), [(0, True)], None, lambda: 5, budget)
+        assert sorted(rows, key=lambda row: -row[0])[:5] == list(sort)
+        assert (0, 10 * size) == (budget.used, budget.peak)  # kept up to twice the number
+
+        budget = MemoryBudget(4 * size)
+        sort = Sort(ListOperator(rows), [(0, True)], None, lambda: 5, budget)
+        assert sorted(rows, key=lambda row: -row[0])[:5] == list(sort)  # sorted externally
+        assert (0, 4 * size) == (budget.used, budget.peak)
+
+    def test_join_budget(self):
+        budget = MemoryBudget(estimate_size(Row.from_dict({'name': {'bar': 'a'}})))  # only one row of the right fits
+        gets = self.db.io.gets
+        root = Project(NestedLoopJoin(Scan(self.db, 'foo'), Scan(self.db, 'bar'), budget),
+                       [TableColumn('id'), TableColumn('name', 'bar')])
+        assert [[0, 'a'], [0, 'b'], [1, 'a'], [1, 'b'], [2, 'a'], [2, 'b']] == list(root)
+        assert 4 + 3 * 3 == self.db.io.gets - gets  # right is read again for every row of the left
+        assert 0 == budget.used
+
+    def test_join_budget_scanned(self):
+        budget = MemoryBudget(estimate_size(Row.from_dict({'name': {'bar': 'a'}})))
+        plan = QueryPlan(NestedLoopJoin(Scan(self.db, 'foo'), Scan(self.db, 'bar'), budget),
+                         lambda rows: len(list(rows)))
+        for _ in range(2):  # once per execution
+            plan()
+            assert 3 + 3 * 2 == plan.rows_scanned()  # every pass of the right
+
+    @ExpectException(MemoryLimitError)
+    def test_hash_aggregate_budget(self):
+        budget = MemoryBudget(1)
+        list(HashAggregate(Scan(self.db, 'foo'), [TableColumn('id')], [0], budget))
+
+    def test_filter_condition(self):
+        def resolved(expression):
+            expression.resolve(lambda table_column: (('foo', 'id'), Column('id', Column.Type.INT)))
+            return Condition(expression, Params())
+
+        gets = self.db.io.gets
+        root = Filter(Scan(self.db, 'foo'), resolved(And([IsNull(TableColumn('id'), False),
+                                                          Comparison(CompOp.EQ, 1, 2)])))
+        assert [] == list(root)
+        assert 0 == self.db.io.gets - gets  # scan is skipped
+
+        root = Filter(Scan(self.db, 'foo'), resolved(Or([Comparison(CompOp.LT, TableColumn('id'), 1),
+                                                         Comparison(CompOp.EQ, 1, 1)])))
+        assert 3 == len(list(root))
+
+    @ExpectException(WhereColumnNotExist)
+    def test_filter_condition_unresolved(self):
+        # searched on the rows, even though the clause is always true
+        list(Filter(Scan(self.db, 'foo'), Condition(Or([Comparison(CompOp.EQ, 1, 1),
+                                                        Comparison(CompOp.EQ, TableColumn('nosuch'), 3)]), Params())))
+
+    def test_limit(self):
+        pulled = []
+        root = Limit(Filter(Scan(self.db, 'foo'), lambda row: pulled.append(row) or boolean.true), lambda: (1, 1))
+        assert [{'id': {'foo': 1}}] == list(root)
+        assert 2 == len(pulled)  # the rest is not pulled
+
+
+    def test_limit_join(self):
+        gets = self.db.io.gets
+        root = Limit(NestedLoopJoin(Scan(self.db, 'foo'), Scan(self.db, 'bar')), lambda: (1, 0))
+        assert 1 == len(list(root))
+        assert 4 == self.db.io.gets - gets  # rec_idx and the first record of each table
+
+        gets = self.db.io.gets
+        root = NestedLoopJoin(Filter(Scan(self.db, 'foo'), lambda row: boolean.false), Scan(self.db, 'bar'))
+        assert [] == list(root)
+        assert 4 == self.db.io.gets - gets  # right is not read if left is empty
+
+    def test_parallel_scan(self):
+        with TemporaryDirectory() as home:
+            db = DbApi(os.path.join(home, 'test.db'))
+            db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+            db.insert_records('foo', [Record.from_dict('foo', {'id': i}) for i in range(10)])
+
+            def odd(row):
+                return boolean(row['id']['foo'] % 2 == 1)
+
+            root = ParallelScan(db, 'foo', odd, [TableColumn('id')], 2, 0)
+            root.PARTITION_SIZE = 3
+            assert [[1], [3], [5], [7], [9]] == list(root)
+
+            root = ParallelScan(db, 'foo', odd, None, 2, 0, ordered=False)
+            root.PARTITION_SIZE = 3
+            assert [1, 3, 5, 7, 9] == sorted(row.rec_idx for row in root)
+
+            root = ParallelScan(db, 'foo', None, [TableColumn('id')], 2, 100)  # below the threshold
+            assert [[i] for i in range(10)] == list(root)
+
+    def test_load(self):
+        with TemporaryDirectory() as home:
+            path = os.path.join(home, 'foo.csv')
+            with open(path, 'w') as file:
+                file.write('id\n3\nx\n4\n')
+
+            rejected = []
+            root = BulkInsert(Convert(ReadCsv(path, csv.excel, True), self.convert, 1,
+                                      lambda row_number, e: rejected.append(row_number)), self.db, 'foo')
+            root.BATCH_SIZE = 1
+            assert [2] == list(root)
+            assert [2] == rejected
+            assert [0, 1, 2, 3, 4] == self.db.rec_idx('foo')
+
+    def test_load_malformed(self):
+        with TemporaryDirectory() as home:
+            path = os.path.join(home, 'foo.csv')
+            for content, reason in ((b'id\n3\n' + b'4' * (csv.field_size_limit() + 1) + b'\n', 'line 3'),
+                                    (b'id\n3\n\xff\xfe\n', 'not in UTF-8')):
+                with open(path, 'wb') as file:
+                    file.write(content)
+
+                root = BulkInsert(Convert(ReadCsv(path, csv.excel, True), self.convert, 1, lambda row_number, e: None),
+                                  self.db, 'foo')
+                root.BATCH_SIZE = 1
+                try:
+                    list(root)
+                    assert False, 'not raised'
+                except LoadFileError as e:
+                    assert reason in e.msg()
+                assert [0, 1, 2] == self.db.rec_idx('foo')  # nothing is inserted
+
+    @ExpectException(InsertTypeMismatchError)
+    def test_encode(self):
+        encoder = RecordEncoder([Column('id', Column.Type.INT)])
+        root = BulkInsert(Encode(ListOperator([[3], [4], ['x'], [5]]), encoder.encode), self.db, 'foo')
+        root.BATCH_SIZE = 2
+        try:
+            list(root)
+        finally:
+            assert [0, 1, 2] == self.db.rec_idx('foo')  # nothing is inserted
+            assert b'_foo_3' not in self.db.db  # written ones are discarded
+
+    @ExpectException(LoadRejectLimitError)
+    def test_load_reject_limit(self):
+        root = BulkInsert(Convert(ListOperator([['1'], ['x'], ['2']]), self.convert, 0, lambda row_number, e: None),
+                          self.db, 'foo')
+        root.BATCH_SIZE = 1
+        try:
+            list(root)
+        finally:
+            assert [0, 1, 2] == self.db.rec_idx('foo')  # nothing is inserted
+            assert b'_foo_3' not in self.db.db  # written one is discarded
+
+    @staticmethod
+    def convert(fields):
+        if not fields[0].isdigit():
+            raise InsertTypeMismatchError
+        return Bytes.from_obj(Record.from_dict('foo', {'id': int(fields[0])}))
+
+class ListOperator(Operator):
+    def __init__(self, rows: list):
+        super().__init__()
+        self.source = rows
+
+    def rows(self):
+        return iter(self.source)
+
+    def __str__(self):
+        return 'List'
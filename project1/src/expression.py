@@ -0,0 +1,302 @@
+"""
+Where clause as a tree, which is folded into the predicate on each execution.
+
+Placeholders are bound by then, so the comparisons of the values alone, including the literals which the plan cache
+turns into placeholders, are evaluated once rather than per row. NOT is pushed down to the comparisons on compile,
+thus no NOT is above AND and OR, where unknown and false make no difference to the rows passed.
+
+Columns resolved against the catalog on compile are read from the row directly, and compared by the comparator of
+their type. The others are searched and compared by CompOp.eval on each row, which raises the errors of the where
+clause as they are found. Terms with such columns are evaluated even if the clause is folded into a constant, so that
+none of the errors is missed.
+"""
+
+from abc import ABCMeta, abstractmethod
+from typing import List, Union, Callable, Optional, Tuple
+
+from datatype import Row, Value, Param, Params, TableColumn, CompOp, boolean, Predicate, Column, date
+from error import WhereIncomparableError
+
+Operand = Union[TableColumn, Param, Value]
+# (table name, column name) and the column definition of the column, or None if it is not resolved.
+Resolved = Optional[Tuple[Tuple[str, str], Column]]
+Resolver = Callable[[TableColumn], Resolved]
+
+# Type of the values of each column type.
+VALUE_TYPES = {Column.Type.INT: int, Column.Type.CHAR: str, Column.Type.DATE: date}
+
+
+def accessor(operand: Operand, resolved: Resolved) -> Callable[[Row], Value]:
+    """Reader of the column value of the row."""
+
+    if resolved is None:
+        return lambda row: row.search(operand)
+
+    (table_name, col_name), _ = resolved
+    return lambda row: row[col_name][table_name]
+
+
+class Expression(metaclass=ABCMeta):
+    """Boolean expression of the where clause."""
+
+    @abstractmethod
+    def negate(self) -> 'Expression':
+        """Expression of NOT of this, which is the same under the three valued logic."""
+
+    @abstractmethod
+    def resolve(self, resolver: Resolver):
+        """
+        Resolve the columns against the catalog.
+
+        :raise WhereIncomparableError: comparison of the columns of different types
+        """
+
+    @abstractmethod
+    def unresolved(self) -> bool:
+        """Whether any of the columns is not resolved, thus searched on each row."""
+
+    @abstractmethod
+    def fold(self, params: Params) -> Union[boolean, Predicate]:
+        """
+        :return: the constant if this does not depend on the row, otherwise the predicate
+        :raise WhereIncomparableError: comparison of the values of different types
+        """
+
+
+def constant(value: boolean, terms: List[Expression], folded: List[Union[boolean, Predicate]]) \
+        -> Union[boolean, Predicate]:
+    """Constant the terms are folded into, which still searches the unresolved columns of the predicates on each row."""
+
+    unresolved = [predicate for term, predicate in zip(terms, folded)
+                  if not isinstance(predicate, boolean) and term.unresolved()]
+    if len(unresolved) == 0:
+        return value
+
+    def predicate(row: Row) -> boolean:
+        for f in unresolved:
+            f(row)  # raises the errors of the where clause
+        return value
+
+    return predicate
+
+
+class Comparison(Expression):
+    def __init__(self, comp_op: CompOp, left: Operand, right: Operand):
+        self.comp_op = comp_op
+        self.left = left
+        self.right = right
+        self.left_resolved: Resolved = None
+        self.right_resolved: Resolved = None
+
+    def negate(self) -> Expression:
+        negated = Comparison(self.comp_op.negate(), self.left, self.right)
+        negated.left_resolved, negated.right_resolved = self.left_resolved, self.right_resolved
+        return negated
+
+    def resolve(self, resolver: Resolver):
+        if isinstance(self.left, TableColumn):
+            self.left_resolved = resolver(self.left)
+        if isinstance(self.right, TableColumn):
+            self.right_resolved = resolver(self.right)
+
+        if self.left_resolved is not None and self.right_resolved is not None and \
+                self.left_resolved[1].type is not self.right_resolved[1].type:
+            raise WhereIncomparableError
+
+    def unresolved(self) -> bool:
+        return (isinstance(self.left, TableColumn) and self.left_resolved is None) or \
+               (isinstance(self.right, TableColumn) and self.right_resolved is None)
+
+    def fold(self, params: Params) -> Union[boolean, Predicate]:
+        comp_op, left, right = self.comp_op, self.left, self.right
+        left_constant, right_constant = not isinstance(left, TableColumn), not isinstance(right, TableColumn)
+        if left_constant:
+            left = params.resolve(left)
+        if right_constant:
+            right = params.resolve(right)
+
+        if left_constant and right_constant:
+            return comp_op.eval(left, right)
+        elif (left_constant and left is None) or (right_constant and right is None):
+            if not self.unresolved():
+                return boolean.unknown
+            operand = accessor(right, None) if left_constant else accessor(left, None)
+
+            def unknown(row: Row) -> boolean:
+                operand(row)  # searched only for the errors
+                return boolean.unknown
+
+            return unknown
+
+        left_col = self.left_resolved[1] if self.left_resolved is not None else None
+        right_col = self.right_resolved[1] if self.right_resolved is not None else None
+        if left_constant:
+            compare = self.__comparator(right_col, left)
+            operand2 = accessor(right, self.right_resolved)
+            return lambda row: compare(left, operand2(row))
+        elif right_constant:
+            compare = self.__comparator(left_col, right)
+            operand1 = accessor(left, self.left_resolved)
+            return lambda row: compare(operand1(row), right)
+        elif left_col is None or right_col is None:
+            operand1, operand2 = accessor(left, self.left_resolved), accessor(right, self.right_resolved)
+            return lambda row: comp_op.eval(operand1(row), operand2(row))
+
+        compare = comp_op.comparator(left_col.type, left_col.null is Column.Null.NULL or
+                                     right_col.null is Column.Null.NULL)
+        operand1, operand2 = accessor(left, self.left_resolved), accessor(right, self.right_resolved)
+        return lambda row: compare(operand1(row), operand2(row))
+
+    def __comparator(self, col: Optional[Column], value: Value) -> Callable[[Value, Value], boolean]:
+        """Comparison of the column with the value, which is not None."""
+
+        if col is None:
+            return self.comp_op.eval
+        elif type(value) is not VALUE_TYPES[col.type]:
+            raise WhereIncomparableError
+        return self.comp_op.comparator(col.type, col.null is Column.Null.NULL)
+
+
+class IsNull(Expression):
+    def __init__(self, operand: Operand, require_null: bool):
+        self.operand = operand
+        self.require_null = require_null
+        self.resolved: Resolved = None
+
+    def negate(self) -> Expression:
+        negated = IsNull(self.operand, not self.require_null)
+        negated.resolved = self.resolved
+        return negated
+
+    def resolve(self, resolver: Resolver):
+        if isinstance(self.operand, TableColumn):
+            self.resolved = resolver(self.operand)
+
+    def unresolved(self) -> bool:
+        return isinstance(self.operand, TableColumn) and self.resolved is None
+
+    def fold(self, params: Params) -> Union[boolean, Predicate]:
+        operand = self.operand
+        if not isinstance(operand, TableColumn):
+            return boolean((params.resolve(operand) is None) == self.require_null)
+        elif self.resolved is not None and self.resolved[1].null is Column.Null.NOT_NULL:
+            return boolean(not self.require_null)
+
+        value = accessor(operand, self.resolved)
+        if self.require_null:
+            return lambda row: boolean.true if value(row) is None else boolean.false
+        else:
+            return lambda row: boolean.false if value(row) is None else boolean.true
+
+
+class And(Expression):
+    def __init__(self, terms: List[Expression]):
+        self.terms = terms
+
+    def negate(self) -> Expression:
+        return Or([term.negate() for term in self.terms])
+
+    def resolve(self, resolver: Resolver):
+        for term in self.terms:
+            term.resolve(resolver)
+
+    def unresolved(self) -> bool:
+        return any(term.unresolved() for term in self.terms)
+
+    def fold(self, params: Params) -> Union[boolean, Predicate]:
+        folded = [term.fold(params) for term in self.terms]  # every term, so that none of the errors is missed
+        if any(term is boolean.false or term is boolean.unknown for term in folded):
+            return constant(boolean.false, self.terms, folded)
+
+        predicates = [term for term in folded if not isinstance(term, boolean)]  # true ones are dropped
+        if len(predicates) == 0:
+            return boolean.true
+        elif len(predicates) == 1:
+            return predicates[0]
+
+        def conjunction(row: Row) -> boolean:
+            value = boolean.true
+            for predicate in predicates:  # stops at the first false, unknown is kept in case none is false
+                term = predicate(row)
+                if term is boolean.false:
+                    return term
+                elif term is boolean.unknown:
+                    value = term
+            return value
+
+        return conjunction
+
+
+class Or(Expression):
+    def __init__(self, terms: List[Expression]):
+        self.terms = terms
+
+    def negate(self) -> Expression:
+        return And([term.negate() for term in self.terms])
+
+    def resolve(self, resolver: Resolver):
+        for term in self.terms:
+            term.resolve(resolver)
+
+    def unresolved(self) -> bool:
+        return any(term.unresolved() for term in self.terms)
+
+    def fold(self, params: Params) -> Union[boolean, Predicate]:
+        folded = [term.fold(params) for term in self.terms]
+        if any(term is boolean.true for term in folded):
+            return constant(boolean.true, self.terms, folded)
+
+        predicates = [term for term in folded if not isinstance(term, boolean)]  # false and unknown ones are dropped
+        if len(predicates) == 0:
+            return boolean.false
+        elif len(predicates) == 1:
+            return predicates[0]
+
+        def disjunction(row: Row) -> boolean:
+            value = boolean.false
+            for predicate in predicates:  # stops at the first true, unknown is kept in case none is true
+                term = predicate(row)
+                if term is boolean.true:
+                    return term
+                elif term is boolean.unknown:
+                    value = term
+            return value
+
+        return disjunction
+
+
+class Condition:
+    """Where clause of a statement, along with the placeholders of the statement."""
+
+    __slots__ = 'expression', 'params'
+
+    def __init__(self, expression: Expression, params: Params):
+        self.expression = expression
+        self.params = params
+
+    def resolve(self, resolver: Resolver):
+        """
+        Resolve the columns against the catalog, so that they are compared by the comparators of their types.
+
+        :param resolver: columns it returns None for are searched on each row, which fail there if not found
+        :raise WhereIncomparableError: comparison of the columns of different types
+        """
+
+        self.expression.resolve(resolver)
+
+    def fold(self) -> Union[boolean, Predicate]:
+        """
+        Fold the expression with the values bound to the placeholders.
+
+        :return: the predicate, or either true or false if it does not depend on the row
+        :raise WhereIncomparableError: comparison of the values of different types
+        """
+
+        folded = self.expression.fold(self.params)
+        return boolean.false if folded is boolean.unknown else folded
+
+    def __call__(self, row: Row) -> boolean:
+        """Evaluate the condition on the row, which folds it every time. Operators fold it once instead."""
+
+        folded = self.fold()
+        return folded if isinstance(folded, boolean) else folded(row)
@@ -0,0 +1,119 @@
+from unittest import TestCase
+
+from datatype import CompOp, Param, Params, Row, TableColumn, boolean, date, Column
+from error import WhereIncomparableError, WhereColumnNotExist
+from expression import Comparison, IsNull, And, Or, Condition
+from util import ExpectException
+
+
+class TestExpression(TestCase):
+    def setUp(self):
+        self.id = TableColumn('id')
+        self.rows = [Row.from_dict({'id': {'foo': i}}) for i in (1, 2, None)]
+
+    def fold(self, expression, *values):
+        params = Params()
+        for _ in values:
+            params.new_param()
+        params.bind(values)
+        return Condition(expression, params).fold()
+
+    def resolved(self, expression):
+        expression.resolve(lambda table_column: (('foo', 'id'), Column('id', Column.Type.INT)))
+        return expression
+
+    def test_comparison(self):
+        assert boolean.true is self.fold(Comparison(CompOp.EQ, 1, 1))
+        assert boolean.false is self.fold(Comparison(CompOp.LT, date(2000, 1, 2), date(2000, 1, 1)))
+        assert boolean.false is self.fold(self.resolved(Comparison(CompOp.EQ, self.id, None)))  # unknown for every row
+
+        assert boolean.true is self.fold(Comparison(CompOp.NE, Param(0), 'b'), 'a')
+
+        predicate = self.fold(Comparison(CompOp.GT, self.id, 1))
+        assert [boolean.false, boolean.true, boolean.unknown] == list(map(predicate, self.rows))
+        predicate = self.fold(Comparison(CompOp.GT, 2, self.id))
+        assert [boolean.true, boolean.false, boolean.unknown] == list(map(predicate, self.rows))
+
+    @ExpectException(WhereIncomparableError)
+    def test_comparison_incomparable(self):
+        self.fold(Or([Comparison(CompOp.EQ, self.id, 1), Comparison(CompOp.EQ, Param(0), 'a')]), 1)
+
+    def test_is_null(self):
+        assert boolean.true is self.fold(IsNull(None, True))
+        assert boolean.false is self.fold(IsNull(1, True))
+
+        predicate = self.fold(IsNull(self.id, False))
+        assert [boolean.true, boolean.true, boolean.false] == list(map(predicate, self.rows))
+
+    def test_and(self):
+        greater = Comparison(CompOp.GT, self.id, 1)
+        assert boolean.false is self.fold(self.resolved(And([greater, Comparison(CompOp.EQ, 1, 2)])))
+        assert boolean.false is self.fold(self.resolved(And([greater, Comparison(CompOp.EQ, 1, None)])))
+        assert boolean.true is self.fold(And([Comparison(CompOp.EQ, 1, 1), IsNull(None, True)]))
+
+        predicate = self.fold(And([Comparison(CompOp.EQ, 1, 1), greater]))
+        assert [boolean.false, boolean.true, boolean.unknown] == list(map(predicate, self.rows))
+        predicate = self.fold(And([greater, Comparison(CompOp.LT, self.id, 3)]))
+        assert [boolean.false, boolean.true, boolean.unknown] == list(map(predicate, self.rows))
+        predicate = self.fold(And([greater, IsNull(self.id, False)]))  # false after unknown
+        assert [boolean.false, boolean.true, boolean.false] == list(map(predicate, self.rows))
+
+    def test_or(self):
+        greater = Comparison(CompOp.GT, self.id, 1)
+        assert boolean.true is self.fold(self.resolved(Or([greater, Comparison(CompOp.EQ, 1, 1)])))
+        assert boolean.false is self.fold(Or([Comparison(CompOp.EQ, 1, 2), Comparison(CompOp.EQ, 1, None)]))
+
+        predicate = self.fold(Or([Comparison(CompOp.EQ, 1, 2), greater, IsNull(self.id, True)]))
+        assert [boolean.false, boolean.true, boolean.true] == list(map(predicate, self.rows))
+        predicate = self.fold(Or([greater, Comparison(CompOp.GT, self.id, 0)]))
+        assert [boolean.true, boolean.true, boolean.unknown] == list(map(predicate, self.rows))
+
+    def test_resolve(self):
+        cols = {'id': Column('id', Column.Type.INT, null=Column.Null.NOT_NULL),
+                'name': Column('name', Column.Type.CHAR, 4)}
+        rows = [Row.from_dict({'id': {'foo': 1}, 'name': {'foo': 'a'}}),
+                Row.from_dict({'id': {'foo': 2}, 'name': {'foo': None}})]
+
+        def resolve(expression):
+            expression.resolve(lambda table_column: (('foo', table_column.col_name), cols[table_column.col_name]))
+            return expression
+
+        assert boolean.false is self.fold(resolve(IsNull(self.id, True)))  # not null column
+
+        predicate = self.fold(resolve(Comparison(CompOp.GE, TableColumn('name'), Param(0))), 'a')
+        assert [boolean.true, boolean.unknown] == list(map(predicate, rows))
+        predicate = self.fold(resolve(Comparison(CompOp.LT, self.id, TableColumn('id', 'foo'))))
+        assert [boolean.false, boolean.false] == list(map(predicate, rows))
+
+    def test_unresolved(self):
+        nosuch = TableColumn('nosuch')
+        for expression in (Comparison(CompOp.EQ, nosuch, None), And([Comparison(CompOp.EQ, 1, 2),
+                                                                    Comparison(CompOp.GT, nosuch, 3)]),
+                           Or([Comparison(CompOp.EQ, 1, 1), Comparison(CompOp.EQ, nosuch, 3)])):
+            predicate = self.fold(expression)  # not folded away, as the column is searched on each row
+            self.assertRaises(WhereColumnNotExist, predicate, self.rows[0])
+
+        predicate = self.fold(And([Comparison(CompOp.EQ, 1, 2), Comparison(CompOp.GT, self.id, 3)]))
+        assert [boolean.false] * 3 == list(map(predicate, self.rows))
+
+    @ExpectException(WhereIncomparableError)
+    def test_resolve_incomparable(self):
+        expression = Comparison(CompOp.EQ, self.id, Param(0))
+        expression.resolve(lambda table_column: (('foo', 'id'), Column('id', Column.Type.INT)))
+        self.fold(expression, 'a')  # found before any row
+
+    @ExpectException(WhereIncomparableError)
+    def test_resolve_incomparable_columns(self):
+        cols = {'id': Column('id', Column.Type.INT), 'name': Column('name', Column.Type.CHAR, 4)}
+        Comparison(CompOp.EQ, self.id, TableColumn('name')).resolve(
+            lambda table_column: (('foo', table_column.col_name), cols[table_column.col_name]))
+
+    def test_negate(self):
+        # not (id > 1 or id is null) = id <= 1 and id is not null
+        expression = Or([Comparison(CompOp.GT, self.id, 1), IsNull(self.id, True)]).negate()
+        assert isinstance(expression, And)
+        assert [CompOp.LE, False] == [expression.terms[0].comp_op, expression.terms[1].require_null]
+
+        predicate = self.fold(expression)
+        assert [boolean.true, boolean.false, boolean.false] == list(map(predicate, self.rows))
+        assert expression.terms[0].comp_op is expression.negate().terms[0].comp_op.negate()
@@ -1,3 +1,6 @@
+import re
+from typing import Iterable, Iterator
+
 from lark import Lark
 
 
@@ -33,3 +36,32 @@ class SqlParserInjector:
 
         with open(file) as file:
             return Lark(file.read(), start="command", lexer="basic")
+
+
+# Quoted string (maybe unterminated), comment, terminator, or the others.
+QUERY_TOKEN = re.compile(r"""'(?:[^'\\]|\\.)*'?|"(?:[^"\\]|\\.)*"?|--.*|;|[^'";-]+|-""")
+
+
+def split_queries(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Split the lines of a script into queries, each of them are terminated by ';'.
+
+    Terminators in quoted strings are not counted, and comments starting with '--' are removed.
+    The last query is yielded even if it is not terminated.
+
+    :param lines: lines of the script, which is read lazily
+    :return: An iterator of non-empty queries.
+    """
+
+    query = []
+    for line in lines:
+        for token in QUERY_TOKEN.findall(line):
+            if token == ';':
+                if len(''.join(query).strip()) != 0:
+                    yield ''.join(query)
+                query = []
+            elif not token.startswith('--'):
+                query.append(token)
+
+    if len(''.join(query).strip()) != 0:
+        yield ''.join(query)
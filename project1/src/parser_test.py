@@ -2,7 +2,7 @@ from unittest import TestCase
 
 from lark.exceptions import UnexpectedInput
 
-from parser import SqlParserInjector
+from parser import SqlParserInjector, split_queries
 from util import ExpectException
 
 
@@ -71,6 +71,26 @@ class TestSqlParser(TestCase):
         """
         parser.parse(sql)
 
+    @SqlParserInjector()
+    def test_insert_select(self, parser):
+        sql = """
+        insert into archive (id, name)
+            select id, name from student where dept_id = 3 order by id limit 10
+        """
+        parser.parse(sql)
+
+        sql = "insert into dept_count select dept_id, count(*) from student group by dept_id"
+        parser.parse(sql)
+
+        sql = "profile insert into archive select * from student"
+        parser.parse(sql)
+
+    @SqlParserInjector()
+    @ExpectException(UnexpectedInput)
+    def test_insert_select_fail(self, parser):
+        sql = "insert into archive select * from student into outfile 'student.csv'"
+        parser.parse(sql)
+
     @SqlParserInjector()
     def test_delete(self, parser):
         sql = "delete from student where id = 1"
@@ -87,6 +107,58 @@ class TestSqlParser(TestCase):
         sql = "select ID from student"
         parser.parse(sql)
 
+    @SqlParserInjector()
+    def test_select_aggregate(self, parser):
+        sql = "select dept_id, count(*), count(name), sum(id), min(id), max(id), avg(id) from student group by dept_id"
+        parser.parse(sql)
+
+    @SqlParserInjector()
+    @ExpectException(UnexpectedInput)
+    def test_select_aggregate_fail(self, parser):
+        sql = "select sum(*) from student"
+        parser.parse(sql)
+
+    @SqlParserInjector()
+    def test_select_order_by(self, parser):
+        sql = "select name from student order by dept_id desc, count(*), name asc limit 10 offset ?"
+        parser.parse(sql)
+
+    @SqlParserInjector()
+    @ExpectException(UnexpectedInput)
+    def test_select_order_by_fail(self, parser):
+        sql = "select name from student limit 10 order by name"
+        parser.parse(sql)
+
+    @SqlParserInjector()
+    def test_load(self, parser):
+        parser.parse("load data from 'student.csv' into student")
+        parser.parse("load data from 'student.tsv' into student format tsv header reject limit 10")
+
+    @SqlParserInjector()
+    def test_select_into_outfile(self, parser):
+        parser.parse("select * from student into outfile 'student.csv'")
+        parser.parse("select name from student where id > 1 order by name limit 10 into outfile 'a.jsonl' format jsonl")
+
+    @SqlParserInjector()
+    @ExpectException(UnexpectedInput)
+    def test_select_into_outfile_fail(self, parser):
+        parser.parse("select * from student into outfile 'student.csv' where id > 1")
+
+    @SqlParserInjector()
+    @ExpectException(UnexpectedInput)
+    def test_load_fail(self, parser):
+        parser.parse("load data from student.csv into student")
+
+    @SqlParserInjector()
+    def test_backup(self, parser):
+        parser.parse("backup to 'backup.db'")
+        parser.parse("backup to 'backup.db' incremental")
+
+    @SqlParserInjector()
+    def test_stats(self, parser):
+        parser.parse("show stats")
+        parser.parse("reset stats")
+
     @SqlParserInjector()
     def test_show_tables(self, parser):
         sql = "show tables"
@@ -113,3 +185,59 @@ class TestSqlParser(TestCase):
     def test_syntax_error(self, parser):
         sql = "asdf"
         parser.parse(sql)
+
+    @SqlParserInjector()
+    def test_prepare(self, parser):
+        sql = "prepare ins as insert into student values (?, ?, 3)"
+        parser.parse(sql)
+
+        sql = "prepare sel as select * from student where id = ? and name = ?"
+        parser.parse(sql)
+
+    @SqlParserInjector()
+    @ExpectException(UnexpectedInput)
+    def test_prepare_fail(self, parser):
+        sql = "prepare drp as drop table student"
+        parser.parse(sql)
+
+    @SqlParserInjector()
+    def test_execute(self, parser):
+        sql = "execute ins (1, 'John')"
+        parser.parse(sql)
+
+        sql = "execute sel"
+        parser.parse(sql)
+
+    @SqlParserInjector()
+    def test_profile(self, parser):
+        sql = "profile select * from student where id = 1"
+        parser.parse(sql)
+
+        sql = "explain analyze delete from student where id = 1"
+        parser.parse(sql)
+
+    @SqlParserInjector()
+    @ExpectException(UnexpectedInput)
+    def test_profile_fail(self, parser):
+        sql = "profile drop table student"
+        parser.parse(sql)
+
+
+class TestSplitQueries(TestCase):
+    def test_split(self):
+        lines = [
+            "-- comment; not a query\n",
+            "select * from foo; insert into foo\n",
+            "  values (1, 'a;b', \"--\");;\n",
+            "drop table foo -- trailing comment\n",
+        ]
+        queries = [query.strip() for query in split_queries(lines)]
+        assert queries == [
+            "select * from foo",
+            "insert into foo\n  values (1, 'a;b', \"--\")",
+            "drop table foo",
+        ]
+
+    def test_escape(self):
+        queries = list(split_queries(["insert into foo values ('it\\'s;');"]))
+        assert queries == ["insert into foo values ('it\\'s;')"]
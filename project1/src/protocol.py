@@ -0,0 +1,104 @@
+"""
+Client-server protocol.
+
+Every message is a frame, which is the 4-byte big-endian length of the payload followed by the payload, a UTF-8 JSON
+object. The client sends {"query": script}, and the server responds {"output": printed text, "error": message or null}
+to each of them, in order.
+"""
+
+import socket
+import struct
+from asyncio import StreamReader, StreamWriter, IncompleteReadError
+from typing import Optional
+
+from util import Bytes
+
+# Length of the payload.
+HEADER = struct.Struct('>I')
+# Maximum length of the payload.
+MAX_FRAME = 64 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    """Malformed frame, or the connection is closed in the middle of a frame."""
+
+
+def encode(message: dict) -> bytes:
+    payload = Bytes.from_obj(message)
+    return HEADER.pack(len(payload)) + payload
+
+
+def payload_length(header: bytes) -> int:
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ProtocolError(f'frame of {length} bytes exceeds the limit')
+    return length
+
+
+def decode(payload: bytes) -> dict:
+    try:
+        message = Bytes.to_obj(payload)
+    except ValueError:
+        raise ProtocolError('payload is not a JSON object')
+
+    if not isinstance(message, dict):
+        raise ProtocolError('payload is not a JSON object')
+    return message
+
+
+async def read_frame(reader: StreamReader) -> Optional[dict]:
+    """:return: the message, or None if the connection is closed"""
+
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except IncompleteReadError as e:
+        if len(e.partial) == 0:
+            return None
+        raise ProtocolError('connection is closed in the header')
+
+    try:
+        payload = await reader.readexactly(payload_length(header))
+    except IncompleteReadError:
+        raise ProtocolError('connection is closed in the payload')
+
+    return decode(payload)
+
+
+async def write_frame(writer: StreamWriter, message: dict):
+    writer.write(encode(message))
+    await writer.drain()
+
+
+def send_frame(sock: socket.socket, message: dict):
+    sock.sendall(encode(message))
+
+
+def recv_frame(sock: socket.socket) -> Optional[dict]:
+    """:return: the message, or None if the connection is closed"""
+
+    header = recv_exactly(sock, HEADER.size)
+    if len(header) == 0:
+        return None
+    elif len(header) != HEADER.size:
+        raise ProtocolError('connection is closed in the header')
+
+    length = payload_length(header)
+    payload = recv_exactly(sock, length)
+    if len(payload) != length:
+        raise ProtocolError('connection is closed in the payload')
+
+    return decode(payload)
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    """:return: the bytes received, which are fewer than the size only if the connection is closed"""
+
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 16))
+        if len(chunk) == 0:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
@@ -1,9 +1,16 @@
-from lark.exceptions import VisitError
+import sys
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from os import devnull
+from time import perf_counter
+from typing import Iterable, Optional
 
 from app import App
 from db import DbApi
 from error import SqlSyntaxError, SqlSemanticsError
-from parser import SqlParserInjector
+from parser import SqlParserInjector, split_queries
+from sink import SINKS, NullSink
+from slowlog import SlowLog
 from util import Print
 
 
@@ -35,22 +42,141 @@ def read_queries():
     return terminated_queries
 
 
-if __name__ == "__main__":
-    db = DbApi('myDB.db')
-    app = App(db)
-    parser = SqlParserInjector.create()
+def quote(text: str) -> Optional[str]:
+    """
+    String literal of the text, or None if it cannot be one.
+
+    Literals keep the backslashes as they are, with no way to escape their quote, thus the text is quoted by the one it
+    does not contain. It must not end with a backslash, which would escape the closing quote.
+    """
+
+    if text.endswith('\\'):
+        return None
+
+    quote_char = next((quote_char for quote_char in "'\"" if quote_char not in text), None)
+    return quote_char + text + quote_char if quote_char is not None else None
+
+
+def run_interactive(app: App):
+    """Read and execute queries from stdin, with prompt."""
 
     while True:
         try:
             for query in read_queries():
-                tree = parser.parse(query)
-                app.transform(tree)
+                app.run(query)
         except SqlSyntaxError:
             Print.with_prompt('Syntax error')
-        except VisitError as e:
-            # Since every exception raised by Transformer is wrapped with 'VisitError'
-            # so here we unwrap it.
+        except SqlSemanticsError as e:
+            Print.with_prompt(e)
+
+
+def run_batch(app: App, lines: Iterable[str], stop_on_error=False, quiet=False, progress=0) -> int:
+    """
+    Execute the queries of a script, without prompt.
+
+    Errors are reported to stderr with the statement number, followed by the summary.
+
+    :param stop_on_error: stop at the first failed statement, otherwise continue
+    :param quiet: do not print the results and the messages of the statements
+    :param progress: report the statement counter every this number of statements, 0 to disable
+    :return: number of failed statements
+    """
+
+    num_statements, num_errors = 0, 0
+    start = perf_counter()
+
+    if quiet:  # results are not even formatted
+        app.sink = NullSink()
+
+    with open(devnull, 'w') as null, redirect_stdout(null if quiet else sys.stdout):
+        for query in split_queries(lines):
+            num_statements += 1
             try:
-                raise e.orig_exc
+                app.run(query)
+            except SqlSyntaxError:
+                num_errors += 1
+                print(f'#{num_statements}: Syntax error', file=sys.stderr)
             except SqlSemanticsError as e:
-                Print.with_prompt(e)
+                num_errors += 1
+                print(f'#{num_statements}: {e}', file=sys.stderr)
+            except SystemExit:  # exit command
+                break
+
+            if num_errors != 0 and stop_on_error:
+                break
+
+            if progress != 0 and num_statements % progress == 0:
+                print(f'{num_statements} statement(s) executed', file=sys.stderr)
+
+    elapsed = perf_counter() - start
+    throughput = num_statements / elapsed if elapsed > 0 else 0.0
+    print(f'{num_statements} statement(s), {num_errors} error(s) in {elapsed:.3f}s ({throughput:.1f} statements/s)',
+          file=sys.stderr)
+
+    return num_errors
+
+
+if __name__ == "__main__":
+    arg_parser = ArgumentParser(description='SQL engine on BerkeleyDB. Interactive if no script is given on tty.')
+    arg_parser.add_argument('script', nargs='?', help="script to execute as a batch, '-' for stdin")
+    arg_parser.add_argument('--db', default='myDB.db', help='database file (default: myDB.db)')
+    arg_parser.add_argument('--stop-on-error', action='store_true', help='stop the batch at the first error')
+    arg_parser.add_argument('--quiet', action='store_true', help='do not print the results of the batch')
+    arg_parser.add_argument('--format', choices=SINKS, default='table', help='format of the select results')
+    arg_parser.add_argument('--progress', type=int, default=0, metavar='N',
+                            help='report the statement counter every N statements of the batch')
+    arg_parser.add_argument('--load', nargs=2, metavar=('FILE', 'TABLE'),
+                            help='load the rows of the CSV (or TSV by extension) file into the table, and exit')
+    arg_parser.add_argument('--header', action='store_true', help='skip the first line of the file to load')
+    arg_parser.add_argument('--reject-limit', type=int, default=0, metavar='N',
+                            help='number of the rows of the file allowed to be rejected')
+    arg_parser.add_argument('--parallel', type=int, default=0, metavar='N',
+                            help=f'scan tables of at least {App.PARALLEL_THRESHOLD} records in N processes')
+    arg_parser.add_argument('--stats', action='store_true', help='print the io of each table after every statement')
+    arg_parser.add_argument('--slow-log', metavar='FILE', help='log the slow statements to the file as JSON lines')
+    arg_parser.add_argument('--slow-ms', type=float, default=100, metavar='MS',
+                            help='latency of the statements to log as slow (default: 100)')
+    arg_parser.add_argument('--memory-limit', type=int, metavar='MB',
+                            help='memory of the rows held by a statement; joins and sorts stay within it by reading '
+                                 'again or spilling, and the others fail over it (default: unlimited)')
+    arg_parser.add_argument('--buffer-pool', type=int, default=0, metavar='MB',
+                            help='memory of the records kept decoded for the next reads (default: 0, disabled)')
+    arg_parser.add_argument('--backup', metavar='FILE', help='back up the database to the file, and exit')
+    arg_parser.add_argument('--incremental', action='store_true', help='update the existing backup incrementally')
+    arg_parser.add_argument('--restore', metavar='FILE',
+                            help='replace the database with the backup, and exit. The database must not be in use')
+    args = arg_parser.parse_args()
+
+    if args.restore is not None:
+        DbApi.restore(args.restore, args.db)
+        exit(0)
+
+    db = DbApi(args.db, buffer_pool_size=args.buffer_pool << 20)
+    parser = SqlParserInjector.create()
+    slow_log = SlowLog(args.slow_log, args.slow_ms / 1000) if args.slow_log is not None else None
+    app = App(db, parser, sink=SINKS[args.format](), parallel_workers=args.parallel, dump_stats=args.stats,
+              slow_log=slow_log, memory_limit=args.memory_limit << 20 if args.memory_limit is not None else None)
+
+    if args.load is not None:
+        path, table_name = args.load
+        if quote(path) is None:
+            arg_parser.error(f'path of the file to load cannot contain both quotes, or end with a backslash: {path}')
+        if not table_name.isidentifier() or not table_name.isascii():
+            arg_parser.error(f'invalid table name: {table_name}')
+
+        load = f"load data from {quote(path)} into {table_name}{' header' if args.header else ''}" \
+               f" reject limit {args.reject_limit};"
+        exit(1 if run_batch(app, [load]) else 0)
+    elif args.backup is not None:
+        if quote(args.backup) is None:
+            arg_parser.error(f'path of the backup cannot contain both quotes, or end with a backslash: {args.backup}')
+
+        backup = f"backup to {quote(args.backup)}{' incremental' if args.incremental else ''};"
+        exit(1 if run_batch(app, [backup]) else 0)
+    elif args.script is None and sys.stdin.isatty():
+        run_interactive(app)
+    elif args.script is None or args.script == '-':
+        exit(1 if run_batch(app, sys.stdin, args.stop_on_error, args.quiet, args.progress) else 0)
+    else:
+        with open(args.script) as script:
+            exit(1 if run_batch(app, script, args.stop_on_error, args.quiet, args.progress) else 0)
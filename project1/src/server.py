@@ -0,0 +1,145 @@
+import asyncio
+import sys
+import traceback
+from argparse import ArgumentParser
+from asyncio import StreamReader, StreamWriter, AbstractServer
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from typing import Optional, Tuple
+
+from lark import Lark
+
+from app import App
+from db import DbApi
+from error import SqlSyntaxError, SqlSemanticsError
+from parser import SqlParserInjector, split_queries
+from protocol import ProtocolError, read_frame, write_frame
+from slowlog import SlowLog
+from util import ThreadLocalOutput
+
+
+class Server:
+    """
+    SQL server sharing a database among the client sessions.
+
+    Each connection is a session, which has its own prepared statements and plan cache, while the database, its
+    catalog cache and the parser are shared. Read-only queries run concurrently on a thread pool, and the others run
+    one at a time on the writer thread.
+    """
+
+    def __init__(self, db: DbApi, parser: Lark = None, workers: Optional[int] = None,
+                 slow_log: Optional[SlowLog] = None, memory_limit: Optional[int] = None):
+        """:param memory_limit: bytes of the rows held by a statement, per session"""
+
+        self.db = db
+        self.parser = parser if parser is not None else SqlParserInjector.create()
+        self.slow_log = slow_log  # shared by the sessions
+        self.memory_limit = memory_limit
+        self.readers = ThreadPoolExecutor(workers, thread_name_prefix='reader')
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix='writer')
+
+        # What the queries print is captured per thread, until the server is closed.
+        self.stdout = sys.stdout
+        self.output = sys.stdout if isinstance(sys.stdout, ThreadLocalOutput) else ThreadLocalOutput(sys.stdout)
+        sys.stdout = self.output
+
+    async def start(self, host: str = 'localhost', port: int = 0, path: Optional[str] = None) -> AbstractServer:
+        """Listen on the Unix socket if the path is given, otherwise on the TCP port."""
+
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        else:
+            return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader: StreamReader, writer: StreamWriter):
+        """Serve the session until the client closes the connection or exits."""
+
+        app = App(self.db, self.parser, slow_log=self.slow_log, memory_limit=self.memory_limit)
+        try:
+            while True:
+                request = await read_frame(reader)
+                if request is None:
+                    break
+
+                response, exiting = await self.run(app, request.get('query', ''))
+                await write_frame(writer, response)
+                if exiting:
+                    break
+        except ProtocolError as e:
+            print(f'{writer.get_extra_info("peername")}: {e}', file=sys.stderr)
+        finally:
+            writer.close()
+
+    async def run(self, app: App, script: str) -> Tuple[dict, bool]:
+        """
+        Execute the queries of the script in order, until an error occurs.
+
+        :return: the response, and whether the session exits
+        """
+
+        loop = asyncio.get_running_loop()
+        output = StringIO()
+        error, exiting = None, False
+        query = script  # until the first query is split
+        try:
+            for query in split_queries(script.splitlines(keepends=True)):
+                executor = self.readers if app.is_read_only(query) else self.writer
+                await loop.run_in_executor(executor, self.run_query, app, query, output)
+        except SqlSyntaxError:
+            error = 'Syntax error'
+        except SqlSemanticsError as e:
+            error = str(e)
+        except SystemExit:  # exit command
+            exiting = True
+        except Exception as e:  # bug of the engine, which fails the script but not the session
+            print(f'{query!r}:', file=sys.stderr)
+            traceback.print_exc()
+            error = f'Internal error: {e!r}'
+
+        return {'output': output.getvalue(), 'error': error}, exiting
+
+    def run_query(self, app: App, query: str, output: StringIO):
+        with self.output.redirect(output):
+            app.run(query)
+
+    def close(self):
+        self.readers.shutdown()
+        self.writer.shutdown()
+        if sys.stdout is self.output:
+            sys.stdout = self.stdout
+
+
+async def serve(server: Server, host: str, port: int, path: Optional[str]):
+    listener = await server.start(host, port, path)
+    address = path if path is not None else f'{host}:{port}'
+    print(f'Listening on {address}', file=sys.stderr)
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == "__main__":
+    arg_parser = ArgumentParser(description='SQL engine on BerkeleyDB, shared by the clients over a socket.')
+    arg_parser.add_argument('--db', default='myDB.db', help='database file (default: myDB.db)')
+    arg_parser.add_argument('--host', default='localhost', help='TCP host (default: localhost)')
+    arg_parser.add_argument('--port', type=int, default=8023, help='TCP port (default: 8023)')
+    arg_parser.add_argument('--unix', metavar='PATH', help='listen on the Unix socket instead of TCP')
+    arg_parser.add_argument('--workers', type=int, help='number of the threads executing read-only queries')
+    arg_parser.add_argument('--slow-log', metavar='FILE', help='log the slow statements to the file as JSON lines')
+    arg_parser.add_argument('--slow-ms', type=float, default=100, metavar='MS',
+                            help='latency of the statements to log as slow (default: 100)')
+    arg_parser.add_argument('--memory-limit', type=int, metavar='MB',
+                            help='memory of the rows held by a statement; joins and sorts stay within it by reading '
+                                 'again or spilling, and the others fail over it (default: unlimited)')
+    arg_parser.add_argument('--buffer-pool', type=int, default=0, metavar='MB',
+                            help='memory of the records kept decoded for the next reads (default: 0, disabled)')
+    args = arg_parser.parse_args()
+
+    sql_server = Server(DbApi(args.db, buffer_pool_size=args.buffer_pool << 20), workers=args.workers,
+                        slow_log=SlowLog(args.slow_log, args.slow_ms / 1000) if args.slow_log is not None else None,
+                        memory_limit=args.memory_limit << 20 if args.memory_limit is not None else None)
+    try:
+        asyncio.run(serve(sql_server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sql_server.close()
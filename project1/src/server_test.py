@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sys
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+
+from app import App
+from client import Client, QueryError
+from db_test import MockDbApi
+from protocol import recv_frame
+from server import Server
+from util import ExpectException
+
+
+class TestServer(TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'db.sock')
+        self.stdout = sys.stdout
+        self.server = Server(MockDbApi())
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.listener = asyncio.run_coroutine_threadsafe(self.server.start(path=self.path), self.loop).result()
+
+    def tearDown(self):
+        async def stop():
+            self.listener.close()
+            await self.listener.wait_closed()
+            await asyncio.gather(*(task for task in asyncio.all_tasks() if task is not asyncio.current_task()))
+
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.server.close()
+        self.dir.cleanup()
+
+    def test_sessions(self):
+        with Client.unix(self.path) as foo, Client.unix(self.path) as bar:
+            foo.query("create table foo (id int); insert into foo values(1);")
+            foo.query("prepare ins as insert into foo values(?);")
+            bar.query("insert into foo values(2);")
+
+            output = bar.query("select * from foo;")
+            assert ['1', '2'] == [line.strip('|').strip() for line in output.splitlines()[3:-1]]
+
+    @ExpectException(QueryError)
+    def test_error(self):
+        with Client.unix(self.path) as client:
+            client.query("select * from foo;")
+
+    def test_internal_error(self):
+        def fail():
+            raise RuntimeError('bug')
+
+        self.server.db.table_names = fail
+        with Client.unix(self.path) as client:
+            try:
+                client.query("show tables;")
+                assert False, 'not raised'
+            except QueryError as e:
+                assert 'RuntimeError' in str(e)
+
+            del self.server.db.table_names
+            client.query("create table foo (id int);")  # the session is kept
+            assert 'foo' in client.query("show tables;")
+
+    def test_internal_error_script(self):
+        with Client.unix(self.path) as client:
+            try:
+                client.query(1)  # fails before the first query is split
+                assert False, 'not raised'
+            except QueryError as e:
+                assert 'AttributeError' in str(e)
+            client.query("create table foo (id int);")  # the session is kept
+            assert 'foo' in client.query("show tables;")
+
+    def test_exit(self):
+        with Client.unix(self.path) as client:
+            client.query("exit;")
+            assert None is recv_frame(client.sock)  # closed by the server
+
+    def test_close(self):
+        assert self.stdout is not sys.stdout
+        self.server.close()
+        assert self.stdout is sys.stdout
+
+    def test_read_only(self):
+        app = App(self.server.db, self.server.parser)
+        app.run('create table foo (id int)')
+        app.prepare('sel', 'select * from foo')
+        app.prepare('ins', 'insert into foo values(?)')
+
+        assert all(app.is_read_only(query) for query in [
+            'select * from foo', 'explain foo', 'desc foo', 'show tables', 'execute sel', 'profile select * from foo'])
+        assert not any(app.is_read_only(query) for query in [
+            'insert into foo values(1)', 'explain analyze delete from foo', 'drop table foo', 'execute ins'])
@@ -0,0 +1,145 @@
+import csv
+import sys
+from abc import ABCMeta, abstractmethod
+from json import JSONEncoder
+from typing import List, Iterable, TextIO, Optional, Callable
+
+from datatype import Value, date
+from util import Print
+
+
+class ResultSink(metaclass=ABCMeta):
+    """Consumer of the result rows of a query. Rows are written as they are produced."""
+
+    def __init__(self, file: Optional[TextIO] = None):
+        self.file = file  # stdout on write if None
+
+    def target(self) -> TextIO:
+        return self.file if self.file is not None else sys.stdout
+
+    @abstractmethod
+    def write(self, columns: List[str], rows: Iterable[List[Value]]) -> int:
+        """
+        Write the header and the rows.
+
+        :return: number of rows written
+        """
+
+
+class BufferedSink(ResultSink, metaclass=ABCMeta):
+    """Sink formatting each row into a string. Formatted rows are written through a buffer of bounded size."""
+
+    # Number of rows buffered before written to the file.
+    BUFFER_ROWS = 1024
+
+    def write(self, columns: List[str], rows: Iterable[List[Value]]) -> int:
+        file = self.target()
+        format_row = self.row_formatter(columns)
+
+        num_rows = 0
+        buffer = [self.header(columns)]
+        for row_values in rows:
+            buffer.append(format_row(row_values))
+            num_rows += 1
+
+            if len(buffer) >= self.BUFFER_ROWS:
+                file.write(''.join(buffer))
+                buffer.clear()
+
+        buffer.append(self.footer(columns))
+        file.write(''.join(buffer))
+
+        return num_rows
+
+    @abstractmethod
+    def header(self, columns: List[str]) -> str:
+        pass
+
+    @abstractmethod
+    def row_formatter(self, columns: List[str]) -> Callable[[List[Value]], str]:
+        pass
+
+    def footer(self, columns: List[str]) -> str:
+        return ''
+
+
+class TableSink(BufferedSink):
+    """ASCII table, identical to the one printed by **Print**."""
+
+    def header(self, columns: List[str]) -> str:
+        line = self.__line(len(columns))
+        return line + self.__format(len(columns)).format(*columns) + line
+
+    def row_formatter(self, columns: List[str]) -> Callable[[List[Value]], str]:
+        row_format = self.__format(len(columns))
+        return lambda row_values: row_format.format(*('null' if value is None else value for value in row_values))
+
+    def footer(self, columns: List[str]) -> str:
+        return self.__line(len(columns))
+
+    @staticmethod
+    def __format(num_cols: int) -> str:
+        padding = Print.DEFAULT_PADING
+        cell = f'{{:{padding.fill}{padding.align}{padding.width}}}'
+        return '|' + '|'.join([cell] * num_cols) + '|\n'
+
+    @staticmethod
+    def __line(num_cols: int) -> str:
+        return '+' + '+'.join(['-' * Print.WIDTH] * num_cols) + '+\n'
+
+
+class JsonLinesSink(BufferedSink):
+    """One JSON object per row. Dates are written in ISO format, and nulls as null."""
+
+    encoder = JSONEncoder()
+
+    def header(self, columns: List[str]) -> str:
+        return ''
+
+    def row_formatter(self, columns: List[str]) -> Callable[[List[Value]], str]:
+        encode = self.encoder.encode
+        return lambda row_values: encode(dict(zip(columns, (
+            str(value) if isinstance(value, date) else value for value in row_values)))) + '\n'
+
+
+class CsvSink(ResultSink):
+    """Comma separated values. Dates are written in ISO format, and nulls as empty fields."""
+
+    DIALECT = csv.excel
+
+    def write(self, columns: List[str], rows: Iterable[List[Value]]) -> int:
+        writer = csv.writer(self.target(), self.DIALECT, lineterminator='\n')
+        num_rows = 0
+
+        def count(row_values: List[Value]) -> List[Value]:
+            nonlocal num_rows
+            num_rows += 1
+            return row_values
+
+        # Writer formats dates by str, and nulls by empty fields.
+        writer.writerow(columns)
+        writer.writerows(map(count, rows))
+
+        return num_rows
+
+
+class TsvSink(CsvSink):
+    """Tab separated values. Dates are written in ISO format, and nulls as empty fields."""
+
+    DIALECT = csv.excel_tab
+
+
+class NullSink(ResultSink):
+    """Consume the rows without writing."""
+
+    def write(self, columns: List[str], rows: Iterable[List[Value]]) -> int:
+        return sum(1 for _ in rows)
+
+
+SINKS = {
+    'table': TableSink,
+    'csv': CsvSink,
+    'tsv': TsvSink,
+    'jsonl': JsonLinesSink,
+    'null': NullSink,
+}
@@ -0,0 +1,46 @@
+from io import StringIO
+from unittest import TestCase
+
+from datatype import date
+from sink import TableSink, CsvSink, TsvSink, JsonLinesSink, NullSink
+from util import Print
+
+
+class TestSink(TestCase):
+    COLUMNS = ['foo.id', 'name', 'dob']
+    ROWS = [[1, 'a,b', date(2023, 1, 2)], [2, None, None]]
+
+    def write(self, sink_class) -> str:
+        file = StringIO()
+        assert 2 == sink_class(file).write(self.COLUMNS, iter(self.ROWS))
+        return file.getvalue()
+
+    def test_table(self):
+        expected = StringIO()
+        Print.table_horizontal_line(3, file=expected)
+        Print.with_padding(*self.COLUMNS, sep='|', file=expected)
+        Print.table_horizontal_line(3, file=expected)
+        Print.with_padding(1, 'a,b', date(2023, 1, 2), sep='|', file=expected)
+        Print.with_padding(2, 'null', 'null', sep='|', file=expected)
+        Print.table_horizontal_line(3, file=expected)
+        assert expected.getvalue() == self.write(TableSink)
+
+    def test_table_buffer(self):
+        file = StringIO()
+        sink = TableSink(file)
+        sink.BUFFER_ROWS = 2
+        sink.write(['id'], ([i] for i in range(5)))
+        assert 5 + 4 == len(file.getvalue().splitlines())
+
+    def test_csv(self):
+        assert 'foo.id,name,dob\n1,"a,b",2023-01-02\n2,,\n' == self.write(CsvSink)
+
+    def test_tsv(self):
+        assert 'foo.id\tname\tdob\n1\ta,b\t2023-01-02\n2\t\t\n' == self.write(TsvSink)
+
+    def test_json_lines(self):
+        assert '{"foo.id": 1, "name": "a,b", "dob": "2023-01-02"}\n' \
+               '{"foo.id": 2, "name": null, "dob": null}\n' == self.write(JsonLinesSink)
+
+    def test_null(self):
+        assert '' == self.write(NullSink)
@@ -0,0 +1,61 @@
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List
+
+from datatype import date
+from db import IoStats
+from executor import QueryPlan
+
+
+class SlowLog:
+    """
+    Log of the statements taking at least the threshold, written as JSON lines to a rotating file.
+
+    Each entry has the statement, the literals bound to it, the elapsed time of each phase, the io, and for the
+    statements with an operator tree, the rows scanned and output and the plan.
+    """
+
+    # Size of the file rotated, and the number of the rotated files kept.
+    MAX_BYTES = 16 * 1024 * 1024
+    BACKUP_COUNT = 4
+
+    def __init__(self, filename: str, threshold: float, max_bytes: int = MAX_BYTES, backup_count: int = BACKUP_COUNT):
+        """:param threshold: in seconds"""
+
+        self.threshold = threshold
+        self.handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.logger = logging.Logger(f'slowlog.{filename}', logging.INFO)  # not registered, thus private to this log
+        self.logger.addHandler(self.handler)
+
+    def record(self, query: str, values: List, phases: Dict[str, float], plan: object, io: IoStats):
+        """Log the statement if it is slow. Nothing else is done for the fast one."""
+
+        elapsed = sum(phases.values())
+        if elapsed < self.threshold:
+            return
+
+        entry = {
+            'query': ' '.join(query.split()),
+            'values': [str(value) if isinstance(value, date) else value for value in values],  # iso form
+            'elapsed_ms': elapsed * 1000,
+            'phases_ms': {phase: time * 1000 for phase, time in phases.items()},
+            'io': {'gets': io.gets, 'puts': io.puts, 'deletes': io.deletes, 'bytes_read': io.bytes_read,
+                   'bytes_written': io.bytes_written, 'decode_ms': io.decode_time * 1000},
+        }
+        if isinstance(plan, QueryPlan):
+            entry['rows_scanned'] = plan.rows_scanned()
+            entry['rows_out'] = plan.rows_out
+            entry['plan'] = plan.explain()
+
+        self.logger.info(json.dumps(entry))
+
+    def close(self):
+        self.handler.close()
+
+    @staticmethod
+    def entries(filename: str) -> List[dict]:
+        """Read the entries of the log file."""
+
+        with open(filename, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
@@ -0,0 +1,56 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from datatype import Column, Record, boolean, date
+from db import IoStats
+from db_test import MockDbApi
+from executor import QueryPlan, Filter, Scan
+from slowlog import SlowLog
+
+
+class TestSlowLog(TestCase):
+    def setUp(self):
+        self.home = TemporaryDirectory()
+        self.path = os.path.join(self.home.name, 'slow.log')
+        self.db = MockDbApi()
+        self.db.create_table('foo', [Column('id', Column.Type.INT)], [], [])
+        self.db.insert_records('foo', [Record.from_dict('foo', {'id': i}) for i in range(3)])
+
+    def tearDown(self):
+        self.home.cleanup()
+
+    def test_record(self):
+        log = SlowLog(self.path, 0.0)
+        plan = QueryPlan(Filter(Scan(self.db, 'foo'), lambda row: boolean(row['id']['foo'] > 0)),
+                         lambda rows: len(list(rows)))
+        plan()
+        log.record("select * from foo\n where dob > 2000-01-01", [date(2000, 1, 1)], {'parse': 0.001, 'execute': 0.002},
+                   plan, IoStats(gets=4, bytes_read=36))
+        log.close()
+
+        [entry] = SlowLog.entries(self.path)
+        assert 'select * from foo where dob > 2000-01-01' == entry['query']
+        assert ['2000-01-01'] == entry['values']
+        assert 3.0 == round(entry['elapsed_ms'], 6)
+        assert (4, 36) == (entry['io']['gets'], entry['io']['bytes_read'])
+        assert (3, 2) == (entry['rows_scanned'], entry['rows_out'])
+        assert ['Filter', '  Scan foo'] == entry['plan']
+
+    def test_threshold(self):
+        log = SlowLog(self.path, 0.1)
+        log.record('show tables', [], {'parse': 0.01, 'execute': 0.01}, lambda: None, IoStats())
+        log.record('show tables', [], {'parse': 0.01, 'execute': 0.1}, lambda: None, IoStats())
+        log.close()
+
+        [entry] = SlowLog.entries(self.path)
+        assert 'plan' not in entry
+
+    def test_rotate(self):
+        log = SlowLog(self.path, 0.0, max_bytes=100, backup_count=1)
+        for _ in range(3):
+            log.record('show tables', [], {'execute': 1.0}, None, IoStats())
+        log.close()
+
+        assert os.path.exists(self.path + '.1')
+        assert not os.path.exists(self.path + '.2')
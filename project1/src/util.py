@@ -1,5 +1,10 @@
+import fcntl
+from collections import OrderedDict
+from contextlib import contextmanager
 from json import JSONEncoder, JSONDecoder
-from typing import Optional
+from threading import Condition, Lock, local
+from time import perf_counter
+from typing import Optional, Dict, TextIO
 
 
 class Padding:
@@ -67,6 +72,25 @@ class Print:
         cls.with_padding(*args, padding=padding, sep='+', file=file)
 
 
+class Stopwatch:
+    """Measures elapsed time of consecutive phases in seconds."""
+
+    __slots__ = 'phases', 'last'
+
+    def __init__(self):
+        self.phases: Dict[str, float] = dict()
+        self.last = perf_counter()
+
+    def lap(self, phase: str) -> float:
+        """End the phase, which started when the previous phase has ended."""
+
+        now = perf_counter()
+        elapsed = now - self.last
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed
+        self.last = now
+        return elapsed
+
+
 class ExpectException:
     """A decorator for unit tests that expects an exception."""
 
@@ -122,3 +146,165 @@ class Bytes:
         if b is not None:
             s = Bytes.to_str(b)
             return Bytes.decoder.decode(s)
+
+
+class LruCache:
+    """Least recently used cache of bounded size. It counts hits and misses."""
+
+    __slots__ = 'size', 'entries', 'hits', 'misses'
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Return the cached value, or None if it is not cached."""
+
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        return value
+
+    def put(self, key, value):
+        """Cache the value. The least recently used entry is evicted if the cache is full."""
+
+        if self.size <= 0:
+            return
+
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Invalidate all entries. Counters are not reset."""
+
+        self.entries.clear()
+
+
+class ReadWriteLock:
+    """
+    Lock shared by the readers, or held by a single writer.
+
+    Waiting writers block new readers, so that writers are not starved by a stream of readers.
+    """
+
+    __slots__ = 'condition', 'readers', 'writer', 'waiting_writers'
+
+    def __init__(self):
+        self.condition = Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.writer and self.waiting_writers == 0)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if self.readers == 0:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            self.condition.wait_for(lambda: not self.writer and self.readers == 0)
+            self.waiting_writers -= 1
+            self.writer = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writer = False
+                self.condition.notify_all()
+
+
+class FileLock:
+    """
+    Lock of the file, shared by the readers or held by a single writer among the processes.
+
+    The threads of the process share the file, thus the shared lock is taken by the first of the readers and released by
+    the last of them. The threads must not hold both at once, which the ReadWriteLock of the process takes care of.
+    """
+
+    __slots__ = 'file', 'mutex', 'readers'
+
+    def __init__(self, path: str):
+        """:param path: created if it does not exist"""
+
+        self.file = open(path, 'a')
+        self.mutex = Lock()
+        self.readers = 0
+
+    def close(self):
+        self.file.close()  # releases the lock, if held
+
+    @contextmanager
+    def read(self):
+        with self.mutex:
+            if self.readers == 0:
+                fcntl.flock(self.file, fcntl.LOCK_SH)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.mutex:
+                self.readers -= 1
+                if self.readers == 0:
+                    fcntl.flock(self.file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def write(self):
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+
+
+class ThreadLocalOutput:
+    """
+    Text stream writing to the file redirected by the current thread, or to the default one if not redirected.
+
+    Installed as stdout, it lets threads capture what they print without affecting each other.
+    """
+
+    def __init__(self, default: TextIO):
+        self.default = default
+        self.local = local()
+
+    @contextmanager
+    def redirect(self, file: TextIO):
+        """Redirect the output of the current thread to the file."""
+
+        previous = getattr(self.local, 'file', None)
+        self.local.file = file
+        try:
+            yield file
+        finally:
+            self.local.file = previous
+
+    def target(self) -> TextIO:
+        file = getattr(self.local, 'file', None)
+        return file if file is not None else self.default
+
+    def write(self, s: str) -> int:
+        return self.target().write(s)
+
+    def flush(self):
+        self.target().flush()
@@ -1,6 +1,10 @@
+import os
+from io import StringIO
+from tempfile import TemporaryDirectory
+from threading import Thread
 from unittest import TestCase
 
-from util import Bytes, ExpectException, Padding
+from util import Bytes, ExpectException, Padding, LruCache, Stopwatch, ReadWriteLock, FileLock, ThreadLocalOutput
 
 
 class TestPadding(TestCase):
@@ -10,6 +14,17 @@ class TestPadding(TestCase):
         assert 'xxbye' == Padding(5, fill='x', align='>').apply_to('bye')
 
 
+class TestStopwatch(TestCase):
+    def test_lap(self):
+        stopwatch = Stopwatch()
+        parse = stopwatch.lap('parse')
+        plan = stopwatch.lap('plan')
+        stopwatch.lap('parse')
+        assert ['parse', 'plan'] == list(stopwatch.phases)
+        assert 0 <= parse <= stopwatch.phases['parse']
+        assert plan == stopwatch.phases['plan']
+
+
 class TestExpectException(TestCase):
     class Foo(BaseException):
         ...
@@ -52,3 +67,90 @@ class TestBytes(TestCase):
 
         assert obj2 == Bytes.to_obj(bobj2)
         assert None is Bytes.to_obj(None)
+
+
+class TestLruCache(TestCase):
+    def test_lru(self):
+        cache = LruCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert 1 == cache.get('a')
+        cache.put('c', 3)  # evicts 'b'
+        assert None is cache.get('b')
+        assert 1 == cache.get('a')
+        assert 3 == cache.get('c')
+        assert 2 == len(cache)
+        assert (3, 1) == (cache.hits, cache.misses)
+
+        cache.clear()
+        assert 0 == len(cache)
+        assert None is cache.get('a')
+        assert (3, 2) == (cache.hits, cache.misses)
+
+    def test_disabled(self):
+        cache = LruCache(0)
+        cache.put('a', 1)
+        assert None is cache.get('a')
+
+
+class TestReadWriteLock(TestCase):
+    def test_lock(self):
+        lock = ReadWriteLock()
+        events = []
+
+        def write():
+            with lock.write():
+                events.append('write')
+
+        with lock.read(), lock.read():  # shared by the readers
+            writer = Thread(target=write)
+            writer.start()
+            writer.join(0.1)
+            assert [] == events  # blocked by the readers
+
+        writer.join()
+        assert ['write'] == events
+
+
+class TestFileLock(TestCase):
+    def test_lock(self):
+        with TemporaryDirectory() as home:
+            path = os.path.join(home, 'db.lock')
+            mine, theirs = FileLock(path), FileLock(path)  # as if of the other process
+            events = []
+
+            def write():
+                with theirs.write():
+                    events.append('write')
+
+            with mine.read():
+                with mine.read():  # shared by the threads
+                    pass
+                writer = Thread(target=write)
+                writer.start()
+                writer.join(0.1)
+                assert [] == events  # still held by the first reader
+
+            writer.join()
+            assert ['write'] == events
+            mine.close()
+            theirs.close()
+
+
+class TestThreadLocalOutput(TestCase):
+    def test_redirect(self):
+        default, mine, theirs = StringIO(), StringIO(), StringIO()
+        output = ThreadLocalOutput(default)
+
+        def write():
+            with output.redirect(theirs):
+                output.write('theirs')
+
+        with output.redirect(mine):
+            thread = Thread(target=write)
+            thread.start()
+            thread.join()
+            output.write('mine')
+        output.write('default')
+
+        assert ('default', 'mine', 'theirs') == (default.getvalue(), mine.getvalue(), theirs.getvalue())